@@ -0,0 +1,186 @@
+"""
+Batched forced alignment with Montreal Forced Aligner.
+
+Every `mfa align` run pays for loading the acoustic model and dictionary
+and for feature extraction setup, so incoming (audio, transcript) jobs are
+queued and a worker thread collects them into a temporary corpus: up to
+batch_size jobs, or whatever arrived within max_wait_seconds of the first.
+One MFA run aligns the whole corpus and each job's TextGrid is copied back
+to the caller's output_path.
+
+The command is configurable (MFA_COMMAND) so the service can run against
+stub_mfa.py when the MFA models are not installed.
+"""
+
+import logging
+import os
+import queue
+import shlex
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+
+logger = logging.getLogger("aligner")
+
+
+class AlignmentError(Exception):
+    pass
+
+
+class _Job:
+    __slots__ = ("job_id", "audio_path", "transcript_path", "output_path", "future")
+
+    def __init__(self, audio_path, transcript_path, output_path):
+        self.job_id = uuid.uuid4().hex
+        self.audio_path = audio_path
+        self.transcript_path = transcript_path
+        self.output_path = output_path
+        self.future = Future()
+
+
+class AlignmentBatcher:
+    """
+    Args:
+        command: MFA executable as a string or argv list (e.g. "mfa" or "python stub_mfa.py")
+        dictionary: Pronunciation dictionary name or path
+        acoustic_model: Acoustic model name or path
+        batch_size: Most jobs aligned in one MFA run
+        max_wait_seconds: How long to keep collecting after the first job arrives
+        work_dir: Parent directory for temporary corpora (default: system temp)
+        extra_args: Extra arguments appended to `align`
+        timeout: Seconds before an MFA run is killed
+    """
+
+    def __init__(self, command="mfa", dictionary="english_mfa", acoustic_model="english_mfa",
+                 batch_size=16, max_wait_seconds=2.0, work_dir=None, extra_args=(), timeout=1800):
+        self.command = shlex.split(command) if isinstance(command, str) else list(command)
+        self.dictionary = dictionary
+        self.acoustic_model = acoustic_model
+        self.batch_size = batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self.work_dir = work_dir
+        self.extra_args = list(extra_args)
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._jobs = 0
+        self._batches = 0
+        self._batched_jobs = 0
+        self._failed = 0
+        self._align_seconds = 0.0
+        self._thread = threading.Thread(target=self._run, name="mfa-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, audio_path, transcript_path, output_path):
+        """Queue a job; returns a concurrent.futures.Future resolving to output_path"""
+        job = _Job(audio_path, transcript_path, output_path)
+        self._queue.put(job)
+        with self._stats_lock:
+            self._jobs += 1
+        return job.future
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "jobs": self._jobs,
+                "batches": self._batches,
+                "failed_jobs": self._failed,
+                "avg_batch_size": self._batched_jobs / self._batches if self._batches else 0.0,
+                "avg_mfa_seconds": self._align_seconds / self._batches if self._batches else 0.0,
+                "batch_size": self.batch_size,
+                "max_wait_seconds": self.max_wait_seconds,
+            }
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait_seconds
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            try:
+                self._align_batch(batch)
+            except Exception as e:
+                logger.exception("Alignment batch of %d failed: %s", len(batch), e)
+                for job in batch:
+                    if not job.future.done():
+                        job.future.set_exception(e)
+            with self._stats_lock:
+                self._failed += sum(1 for job in batch if job.future.done() and job.future.exception() is not None)
+
+    def _build_corpus(self, batch, corpus_dir):
+        ready = []
+        for job in batch:
+            try:
+                ext = os.path.splitext(job.audio_path)[1] or ".wav"
+                audio_dest = os.path.join(corpus_dir, job.job_id + ext)
+                try:
+                    # Hard link when on the same filesystem, no copy needed
+                    os.link(job.audio_path, audio_dest)
+                except OSError:
+                    shutil.copyfile(job.audio_path, audio_dest)
+                shutil.copyfile(job.transcript_path, os.path.join(corpus_dir, job.job_id + ".lab"))
+                ready.append(job)
+            except OSError as e:
+                job.future.set_exception(AlignmentError(f"Could not stage job inputs: {e}"))
+        return ready
+
+    def _align_batch(self, batch):
+        with tempfile.TemporaryDirectory(prefix="mfa-batch-", dir=self.work_dir) as tmp:
+            corpus_dir = os.path.join(tmp, "corpus")
+            output_dir = os.path.join(tmp, "output")
+            os.makedirs(corpus_dir)
+            os.makedirs(output_dir)
+
+            jobs = self._build_corpus(batch, corpus_dir)
+            if not jobs:
+                return
+
+            cmd = self.command + ["align", corpus_dir, self.dictionary, self.acoustic_model, output_dir] + self.extra_args
+            logger.info("Aligning batch of %d: %s", len(jobs), " ".join(cmd))
+            started = time.perf_counter()
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=self.timeout)
+            elapsed = time.perf_counter() - started
+            with self._stats_lock:
+                self._batches += 1
+                self._batched_jobs += len(jobs)
+                self._align_seconds += elapsed
+            logger.info("MFA finished in %.1fs with code %d", elapsed, result.returncode)
+            if result.returncode != 0:
+                raise AlignmentError(f"mfa align failed ({result.returncode}): {result.stderr[-2000:]}")
+
+            # MFA may nest outputs under speaker folders; index by file stem
+            textgrids = {}
+            for root, _, files in os.walk(output_dir):
+                for name in files:
+                    if name.endswith(".TextGrid"):
+                        textgrids[name[:-len(".TextGrid")]] = os.path.join(root, name)
+
+            for job in jobs:
+                textgrid = textgrids.get(job.job_id)
+                if textgrid is None:
+                    job.future.set_exception(AlignmentError(
+                        f"MFA produced no alignment for {job.audio_path} (check transcript/dictionary coverage)"))
+                    continue
+                try:
+                    output_parent = os.path.dirname(job.output_path)
+                    if output_parent:
+                        os.makedirs(output_parent, exist_ok=True)
+                    shutil.copyfile(textgrid, job.output_path)
+                    job.future.set_result(job.output_path)
+                except OSError as e:
+                    job.future.set_exception(AlignmentError(f"Could not write {job.output_path}: {e}"))
@@ -0,0 +1,136 @@
+"""
+On-disk cache of alignment results.
+
+Keys hash the audio file's bytes, the normalized transcript and the
+dictionary/acoustic model names, so retrying an animation with the same
+narration skips MFA entirely. Each entry is a directory holding the
+TextGrid and the derived per-frame viseme timeline. Total size is bounded
+and least recently used entries are evicted first; directory mtimes record
+access order across restarts.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import shutil
+import string
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger("aligner")
+
+TEXTGRID_FILENAME = "alignment.TextGrid"
+VISEMES_FILENAME = "visemes.npy"
+
+_PUNCTUATION = str.maketrans('', '', string.punctuation)
+
+
+def normalize_transcript(text):
+    """Lowercase, drop punctuation and collapse whitespace so trivial edits share a key"""
+    return re.sub(r"\s+", " ", text.lower().translate(_PUNCTUATION)).strip()
+
+
+def alignment_key(audio_path, transcript, dictionary, acoustic_model, fps):
+    h = hashlib.sha256()
+    with open(audio_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    for part in (normalize_transcript(transcript), dictionary, acoustic_model, str(fps)):
+        h.update(b"\0")
+        h.update(part.encode("utf-8"))
+    return h.hexdigest()
+
+
+class AlignmentCache:
+    """
+    Args:
+        directory: Cache root (<directory>/<key>/{alignment.TextGrid,visemes.npy})
+        max_bytes: Total size above which least recently used entries are evicted
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size, oldest access first
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.directory, key)
+
+    def _load_index(self):
+        found = []
+        for key in os.listdir(self.directory):
+            entry = self._entry_dir(key)
+            if key.endswith(".tmp") or not os.path.isfile(os.path.join(entry, TEXTGRID_FILENAME)):
+                # Leftover from an interrupted put
+                shutil.rmtree(entry, ignore_errors=True)
+                continue
+            size = sum(os.path.getsize(os.path.join(entry, name)) for name in os.listdir(entry))
+            found.append((os.path.getmtime(entry), key, size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._bytes += size
+        logger.info("Alignment cache: %d entries, %.1f MB in %s",
+                    len(self._entries), self._bytes / (1024 * 1024), self.directory)
+
+    def get(self, key):
+        """Return (textgrid_path, visemes_path or None) for a cached entry, or None"""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        entry = self._entry_dir(key)
+        textgrid = os.path.join(entry, TEXTGRID_FILENAME)
+        if not os.path.exists(textgrid):
+            with self._lock:
+                self._bytes -= self._entries.pop(key, 0)
+            return None
+        now = time.time()
+        os.utime(entry, (now, now))
+        visemes = os.path.join(entry, VISEMES_FILENAME)
+        return textgrid, visemes if os.path.exists(visemes) else None
+
+    def put(self, key, textgrid_path, visemes=None):
+        """Store a TextGrid (copied) and optional viseme array; evict down to max_bytes"""
+        import numpy as np
+
+        entry = self._entry_dir(key)
+        tmp_entry = f"{entry}.{threading.get_ident()}.tmp"
+        os.makedirs(tmp_entry, exist_ok=True)
+        shutil.copyfile(textgrid_path, os.path.join(tmp_entry, TEXTGRID_FILENAME))
+        if visemes is not None:
+            np.save(os.path.join(tmp_entry, VISEMES_FILENAME), visemes)
+        size = sum(os.path.getsize(os.path.join(tmp_entry, name)) for name in os.listdir(tmp_entry))
+        shutil.rmtree(entry, ignore_errors=True)
+        os.replace(tmp_entry, entry)
+
+        evicted = []
+        with self._lock:
+            self._bytes -= self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, old_size = self._entries.popitem(last=False)
+                self._bytes -= old_size
+                evicted.append(old_key)
+        for old_key in evicted:
+            shutil.rmtree(self._entry_dir(old_key), ignore_errors=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
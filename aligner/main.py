@@ -1,17 +1,145 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response
 from pydantic import BaseModel
+import asyncio
+import logging
 import os
+import shlex
+import shutil
+import sys
+import time
+
+from batcher import AlignmentBatcher, AlignmentError
+from cache import AlignmentCache, alignment_key
+
+# metrics.py is copied next to main.py in the image and lives in ../shared locally
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shared"))
+import metrics
+
+logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+logger = logging.getLogger("aligner")
+
+# Set MFA_COMMAND="python stub_mfa.py" to run without the MFA models
+MFA_COMMAND = os.environ.get("MFA_COMMAND", "mfa")
+MFA_DICTIONARY = os.environ.get("MFA_DICTIONARY", "english_mfa")
+MFA_ACOUSTIC_MODEL = os.environ.get("MFA_ACOUSTIC_MODEL", "english_mfa")
+MFA_EXTRA_ARGS = shlex.split(os.environ.get("MFA_EXTRA_ARGS", "--clean"))
+ALIGN_BATCH_SIZE = int(os.environ.get("ALIGN_BATCH_SIZE", 16))
+ALIGN_BATCH_WAIT_SECONDS = float(os.environ.get("ALIGN_BATCH_WAIT_SECONDS", 2.0))
+
+batcher = AlignmentBatcher(
+    command=MFA_COMMAND,
+    dictionary=MFA_DICTIONARY,
+    acoustic_model=MFA_ACOUSTIC_MODEL,
+    batch_size=ALIGN_BATCH_SIZE,
+    max_wait_seconds=ALIGN_BATCH_WAIT_SECONDS,
+    extra_args=MFA_EXTRA_ARGS,
+)
+
+# Finished alignments keyed by audio bytes + normalized transcript + models
+ALIGN_CACHE_DIR = os.environ.get("ALIGN_CACHE_DIR", "/data/alignment-cache")
+ALIGN_CACHE_MAX_BYTES = int(os.environ.get("ALIGN_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+VISEME_FPS = int(os.environ.get("VISEME_FPS", 24))
+alignment_cache = AlignmentCache(ALIGN_CACHE_DIR, ALIGN_CACHE_MAX_BYTES)
 
 app = FastAPI()
 
+ALIGN_SECONDS = metrics.histogram("align_duration_seconds", "Time to answer an /align request", ["cached"])
+PHONES_ALIGNED = metrics.counter("phones_aligned_total", "Non-silent phone intervals produced by MFA")
+ALIGN_IN_FLIGHT = metrics.gauge("align_requests_in_flight", "Align requests being handled")
+metrics.gauge("align_queue_depth", "Alignments waiting for the next MFA batch",
+              fn=lambda: batcher.stats()["queue_depth"])
+
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    metrics.HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method,
+                                         endpoint=getattr(route, "path", "unmatched"),
+                                         status=response.status_code)
+    return response
+
 class AlignRequest(BaseModel):
     audio_path: str
     transcript_path: str
     output_path: str
 
+def visemes_path_for(output_path):
+    return f"{os.path.splitext(output_path)[0]}_visemes_{VISEME_FPS}fps.npy"
+
+def derive_visemes(textgrid_path):
+    """Per-frame viseme timeline for a TextGrid, or None if it cannot be parsed"""
+    try:
+        import mytextgrid
+        from process import compile_viseme_timeline, phone_intervals
+        xmin, xmax, labels = phone_intervals(mytextgrid.read_textgrid(textgrid_path))
+        PHONES_ALIGNED.inc(sum(1 for label in labels if label))
+        return compile_viseme_timeline(xmin, xmax, labels, fps=VISEME_FPS)
+    except Exception as e:
+        logger.warning("Could not derive visemes from %s: %s", textgrid_path, e)
+        return None
+
+def _read_text(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+def serve_cached(entry, output_path):
+    textgrid, visemes = entry
+    if os.path.dirname(output_path):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    shutil.copyfile(textgrid, output_path)
+    if visemes:
+        shutil.copyfile(visemes, visemes_path_for(output_path))
+        return visemes_path_for(output_path)
+    return None
+
+def store_result(key, output_path):
+    import numpy as np
+    visemes = derive_visemes(output_path)
+    alignment_cache.put(key, output_path, visemes)
+    if visemes is None:
+        return None
+    np.save(visemes_path_for(output_path), visemes)
+    return visemes_path_for(output_path)
+
 @app.post("/align")
-def align(req: AlignRequest):
-    # Replace with MFA logic
-    with open(req.output_path, "w") as f:
-        f.write("alignment placeholder")
-    return {"status": "ok"}
+async def align(req: AlignRequest):
+    with ALIGN_IN_FLIGHT.track_inprogress():
+        return await _align(req)
+
+async def _align(req):
+    started = time.perf_counter()
+    for path in (req.audio_path, req.transcript_path):
+        if not os.path.exists(path):
+            raise HTTPException(status_code=400, detail=f"File not found: {path}")
+    loop = asyncio.get_running_loop()
+
+    transcript = await loop.run_in_executor(None, _read_text, req.transcript_path)
+    key = await loop.run_in_executor(None, alignment_key, req.audio_path, transcript,
+                                     MFA_DICTIONARY, MFA_ACOUSTIC_MODEL, VISEME_FPS)
+    entry = await loop.run_in_executor(None, alignment_cache.get, key)
+    if entry is not None:
+        visemes_path = await loop.run_in_executor(None, serve_cached, entry, req.output_path)
+        logger.info("Alignment cache hit for %s", req.audio_path)
+        ALIGN_SECONDS.observe(time.perf_counter() - started, cached="true")
+        return {"status": "ok", "output_path": req.output_path, "visemes_path": visemes_path, "cached": True}
+
+    try:
+        # Queued with other requests; one MFA run aligns the whole batch
+        await asyncio.wrap_future(batcher.submit(req.audio_path, req.transcript_path, req.output_path))
+    except AlignmentError as e:
+        logger.error("Alignment failed for %s: %s", req.audio_path, e)
+        raise HTTPException(status_code=500, detail=str(e))
+    visemes_path = await loop.run_in_executor(None, store_result, key, req.output_path)
+    ALIGN_SECONDS.observe(time.perf_counter() - started, cached="false")
+    return {"status": "ok", "output_path": req.output_path, "visemes_path": visemes_path, "cached": False}
+
+@app.get("/stats")
+def stats():
+    return {**batcher.stats(), "alignment_cache": alignment_cache.stats()}
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
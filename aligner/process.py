@@ -1,11 +1,11 @@
 import mytextgrid
 import csv
 import subprocess
-# Load the TextGrid file
-subprocess.run(["mfa", "align", "data", "english_mfa", "english_mfa", "output"])
-tg = mytextgrid.read_textgrid('output\harvard.TextGrid')
+import numpy as np
 
-data = []
+# Video frame rate of the backend's extracted frames
+DEFAULT_FPS = 24
+SILENCE_VISEME = 12
 
 my_dict = {}
 
@@ -91,22 +91,137 @@ my_dict['u'] = 11
 my_dict['ʋ'] = 11
 
 
-for tier in tg:
-    if tier.name == "words": continue
-
-    if tier.is_interval():
-        for interval in tier:
-            if interval.text == "":
-                data.append([str(interval.xmin), str(interval.xmax), 12])
-            else:
-                if interval.text[0] in my_dict:
-                    data.append([str(interval.xmin), str(interval.xmax), my_dict[interval.text[0]]])
+def build_viseme_lookup(mapping=my_dict):
+    """
+    Precompile the phone->viseme table into an array indexed by code point.
+
+    Returns:
+        uint8 array where lookup[ord(first_char)] is the viseme, 0 = unknown phone
+    """
+    lookup = np.zeros(max(ord(ch) for ch in mapping) + 1, dtype=np.uint8)
+    for ch, viseme in mapping.items():
+        lookup[ord(ch)] = viseme
+    return lookup
+
+
+VISEME_LOOKUP = build_viseme_lookup()
+
+
+def phone_intervals(tg):
+    """
+    Collect the phone tier(s) of a TextGrid as arrays.
+
+    Returns:
+        (xmin, xmax, labels) with xmin/xmax float64 arrays and labels a list of str
+    """
+    xmin, xmax, labels = [], [], []
+    for tier in tg:
+        if tier.name == "words": continue
+
+        if tier.is_interval():
+            for interval in tier:
+                xmin.append(float(interval.xmin))
+                xmax.append(float(interval.xmax))
+                labels.append(interval.text)
+    return np.asarray(xmin, dtype=np.float64), np.asarray(xmax, dtype=np.float64), labels
+
+
+def viseme_codes(labels, lookup=VISEME_LOOKUP):
+    """
+    Map phone labels to visemes with one array lookup.
+
+    Empty labels are silence (12); unknown phones take the previous phone's
+    viseme, the same as extending its interval.
+    """
+    first = np.fromiter((ord(label[0]) if label else -1 for label in labels), dtype=np.int64, count=len(labels))
+    known_char = (first >= 0) & (first < len(lookup))
+    codes = np.zeros(len(labels), dtype=np.uint8)
+    codes[known_char] = lookup[first[known_char]]
+    codes[first < 0] = SILENCE_VISEME
+
+    # Forward-fill unknowns (code 0) from the last known interval
+    known = codes != 0
+    last_known = np.where(known, np.arange(len(codes)), -1)
+    np.maximum.accumulate(last_known, out=last_known)
+    filled = np.full(len(codes), SILENCE_VISEME, dtype=np.uint8)
+    has_prev = last_known >= 0
+    filled[has_prev] = codes[last_known[has_prev]]
+    return filled
+
+
+def compile_viseme_timeline(xmin, xmax, labels, fps=DEFAULT_FPS, duration=None):
+    """
+    Turn phone intervals into one viseme per video frame.
+
+    Each frame takes the viseme of the interval containing its center time
+    ((n + 0.5) / fps); frames outside every interval are silence.
+
+    Args:
+        xmin, xmax: Interval start/end times in seconds (sorted by xmin)
+        labels: Phone label per interval
+        fps: Video frame rate (default 24, the backend's extraction rate)
+        duration: Clip length in seconds (default: end of the last interval)
+
+    Returns:
+        uint8 array with one viseme code per frame
+    """
+    if duration is None:
+        duration = float(xmax[-1]) if len(xmax) else 0.0
+    n_frames = int(np.ceil(duration * fps - 1e-9))
+    if n_frames <= 0 or len(xmin) == 0:
+        return np.full(max(n_frames, 0), SILENCE_VISEME, dtype=np.uint8)
+
+    codes = viseme_codes(labels)
+    centers = (np.arange(n_frames) + 0.5) / fps
+    idx = np.searchsorted(xmin, centers, side='right') - 1
+    inside = (idx >= 0) & (centers < xmax[np.clip(idx, 0, None)])
+    timeline = np.full(n_frames, SILENCE_VISEME, dtype=np.uint8)
+    timeline[inside] = codes[idx[inside]]
+    return timeline
+
+
+def textgrid_to_visemes(tg, fps=DEFAULT_FPS, duration=None):
+    """Compile a TextGrid's phone tier into a per-frame viseme array"""
+    xmin, xmax, labels = phone_intervals(tg)
+    return compile_viseme_timeline(xmin, xmax, labels, fps=fps, duration=duration)
+
+
+def viseme_rows(tg):
+    """Build the [start, end, viseme] CSV rows, merging unknown phones into the previous row"""
+    data = []
+    for tier in tg:
+        if tier.name == "words": continue
+
+        if tier.is_interval():
+            for interval in tier:
+                if interval.text == "":
+                    data.append([str(interval.xmin), str(interval.xmax), SILENCE_VISEME])
                 else:
-                    data[len(data) - 1][1] = str(interval.xmax)
-                
-with open('../csvfiles/output.csv', 'w', newline='') as csvfile:
-    # Create a CSV writer object
-    writer = csv.writer(csvfile)
-    
-    # Write all rows at once
-    writer.writerows(data)
\ No newline at end of file
+                    if interval.text[0] in my_dict:
+                        data.append([str(interval.xmin), str(interval.xmax), my_dict[interval.text[0]]])
+                    elif data:
+                        data[len(data) - 1][1] = str(interval.xmax)
+    return data
+
+
+def save_visemes(path, timeline):
+    """Write the per-frame viseme array as a .npy file of uint8"""
+    np.save(path, timeline.astype(np.uint8, copy=False))
+
+
+if __name__ == "__main__":
+    # Load the TextGrid file
+    subprocess.run(["mfa", "align", "data", "english_mfa", "english_mfa", "output"])
+    tg = mytextgrid.read_textgrid('output\\harvard.TextGrid')
+
+    data = viseme_rows(tg)
+
+    with open('../csvfiles/output.csv', 'w', newline='') as csvfile:
+        # Create a CSV writer object
+        writer = csv.writer(csvfile)
+
+        # Write all rows at once
+        writer.writerows(data)
+
+    # Dense per-frame timeline next to the CSV, one byte per frame
+    save_visemes(f'../csvfiles/output_visemes_{DEFAULT_FPS}fps.npy', textgrid_to_visemes(tg, fps=DEFAULT_FPS))
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Stand-in for the `mfa` executable, for exercising the aligner service
+without the MFA models.
+
+    python stub_mfa.py align CORPUS_DIR DICTIONARY ACOUSTIC_MODEL OUTPUT_DIR [...]
+
+For every <name>.lab in CORPUS_DIR it writes OUTPUT_DIR/<name>.TextGrid with
+a "words" and a "phones" tier, spreading the words evenly over the audio
+duration (read from the WAV header, 1s per word otherwise) and using each
+letter as a phone.
+"""
+
+import os
+import sys
+import wave
+
+STUB_DELAY_SECONDS = float(os.environ.get("STUB_MFA_DELAY", 0))
+
+
+def _duration(audio_path, n_words):
+    try:
+        with wave.open(audio_path, "rb") as w:
+            return w.getnframes() / float(w.getframerate())
+    except (OSError, wave.Error, EOFError):
+        return float(max(n_words, 1))
+
+
+def _tier(name, intervals, xmax):
+    lines = [
+        '        class = "IntervalTier"',
+        f'        name = "{name}"',
+        '        xmin = 0',
+        f'        xmax = {xmax}',
+        f'        intervals: size = {len(intervals)}',
+    ]
+    for i, (start, end, text) in enumerate(intervals, 1):
+        lines += [
+            f'        intervals [{i}]:',
+            f'            xmin = {start}',
+            f'            xmax = {end}',
+            f'            text = "{text}"',
+        ]
+    return lines
+
+
+def write_textgrid(path, words, duration):
+    word_intervals = []
+    phone_intervals = []
+    if words:
+        step = duration / len(words)
+        for i, word in enumerate(words):
+            start, end = i * step, (i + 1) * step
+            word_intervals.append((start, end, word))
+            letters = [ch for ch in word if ch.isalpha()] or [""]
+            phone_step = (end - start) / len(letters)
+            for j, letter in enumerate(letters):
+                phone_intervals.append((start + j * phone_step, start + (j + 1) * phone_step, letter))
+    else:
+        word_intervals.append((0, duration, ""))
+        phone_intervals.append((0, duration, ""))
+
+    lines = [
+        'File type = "ooTextFile"',
+        'Object class = "TextGrid"',
+        '',
+        'xmin = 0',
+        f'xmax = {duration}',
+        'tiers? <exists>',
+        'size = 2',
+        'item []:',
+        '    item [1]:',
+    ]
+    lines += _tier("words", word_intervals, duration)
+    lines.append('    item [2]:')
+    lines += _tier("phones", phone_intervals, duration)
+    # Praat ends every value line with a space; TextGrid readers match on it
+    lines = [line + " " if ("=" in line or "<exists>" in line or line == "item []:") and "File type" not in line
+             and "Object class" not in line else line for line in lines]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def main(argv):
+    if len(argv) < 5 or argv[0] != "align":
+        print("usage: stub_mfa.py align CORPUS_DIR DICTIONARY ACOUSTIC_MODEL OUTPUT_DIR", file=sys.stderr)
+        return 2
+    corpus_dir, output_dir = argv[1], argv[4]
+    os.makedirs(output_dir, exist_ok=True)
+
+    if STUB_DELAY_SECONDS:
+        # Simulate MFA's startup cost
+        import time
+        time.sleep(STUB_DELAY_SECONDS)
+
+    for name in sorted(os.listdir(corpus_dir)):
+        stem, ext = os.path.splitext(name)
+        if ext not in (".lab", ".txt"):
+            continue
+        with open(os.path.join(corpus_dir, name), encoding="utf-8") as f:
+            words = f.read().lower().split()
+        audio_path = next((os.path.join(corpus_dir, stem + e) for e in (".wav", ".flac", ".mp3")
+                           if os.path.exists(os.path.join(corpus_dir, stem + e))), "")
+        write_textgrid(os.path.join(output_dir, stem + ".TextGrid"), words, _duration(audio_path, len(words)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,47 +1,216 @@
-from fastapi import FastAPI, UploadFile, File
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, UploadFile, File, BackgroundTasks, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response
+import asyncio
+import logging
 import shutil
-import requests
+import sys
+import time
+import httpx
 import uuid
 import os
 
-app = FastAPI()
+# metrics.py is copied next to main.py in the image and lives in ../shared locally
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shared"))
+import metrics
+
+logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+logger = logging.getLogger("api")
 
 DATA_DIR = "/data"
-WHISPER_URL = "http://whisper:8001/transcribe"
-ALIGNER_URL = "http://aligner:8002/align"
+WHISPER_URL = os.environ.get("WHISPER_URL", "http://whisper:8001/transcribe")
+# Compose maps host 8002 to the aligner's container port 8000; service-to-service calls use 8000
+ALIGNER_URL = os.environ.get("ALIGNER_URL", "http://aligner:8000/align")
+
+# Per-stage limits: transcription and alignment can take minutes on CPU
+STAGE_TIMEOUTS = {
+    "whisper": float(os.environ.get("WHISPER_TIMEOUT", 600)),
+    "aligner": float(os.environ.get("ALIGNER_TIMEOUT", 900)),
+}
+STAGE_RETRIES = int(os.environ.get("STAGE_RETRIES", 2))
+RETRY_BACKOFF_SECONDS = 1.0
+# Jobs allowed to be calling downstream services at once; the rest wait their turn
+MAX_CONCURRENT_JOBS = int(os.environ.get("MAX_CONCURRENT_JOBS", 8))
+
+JOB_QUEUED = "queued"
+JOB_TRANSCRIBING = "transcribing"
+JOB_ALIGNING = "aligning"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+# job_id -> job record; in-memory, lost on restart
+jobs = {}
+# Finished jobs are forgotten after this long (their files in DATA_DIR stay)
+JOB_TTL_SECONDS = float(os.environ.get("JOB_TTL_SECONDS", 3600))
+client = None
+job_slots = None
+
+
+def _count_jobs(*statuses):
+    return sum(1 for job in list(jobs.values()) if job["status"] in statuses)
+
+
+def _prune_finished():
+    cutoff = time.time() - JOB_TTL_SECONDS
+    stale = [job_id for job_id, job in jobs.items()
+             if job["finished_at"] is not None and job["finished_at"] < cutoff]
+    for job_id in stale:
+        del jobs[job_id]
+
+
+STAGE_SECONDS = metrics.histogram("pipeline_stage_duration_seconds",
+                                  "Wall-clock time of each downstream stage, retries included", ["stage"])
+STAGE_CALLS = metrics.counter("pipeline_stage_calls_total", "Downstream calls by stage and outcome",
+                              ["stage", "outcome"])
+JOBS_FINISHED = metrics.counter("jobs_finished_total", "Pipeline jobs that finished", ["status"])
+metrics.gauge("jobs_in_flight", "Jobs calling whisper or the aligner",
+              fn=lambda: _count_jobs(JOB_TRANSCRIBING, JOB_ALIGNING))
+metrics.gauge("job_queue_depth", "Jobs waiting for a free job slot", fn=lambda: _count_jobs(JOB_QUEUED))
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global client, job_slots
+    # One pooled client for every downstream call so connections are reused
+    client = httpx.AsyncClient(limits=httpx.Limits(max_connections=MAX_CONCURRENT_JOBS * 2,
+                                                   max_keepalive_connections=MAX_CONCURRENT_JOBS))
+    job_slots = asyncio.Semaphore(MAX_CONCURRENT_JOBS)
+    yield
+    await client.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # The route pattern, not the URL, so job ids don't explode the label set
+    route = request.scope.get("route")
+    metrics.HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method,
+                                         endpoint=getattr(route, "path", "unmatched"),
+                                         status=response.status_code)
+    return response
+
+
+class StageError(Exception):
+    pass
 
-@app.post("/process")
-def process_audio(file: UploadFile = File(...)):
+
+async def call_stage(stage, url, payload):
+    """POST payload to a downstream service with a per-stage timeout and retries on transient errors"""
+    attempts = STAGE_RETRIES + 1
+    for attempt in range(1, attempts + 1):
+        try:
+            response = await client.post(url, json=payload, timeout=STAGE_TIMEOUTS[stage])
+        except httpx.TransportError as e:
+            # Connection refused, reset, timed out: the service may be restarting
+            error = f"{stage} request failed: {e!r}"
+        else:
+            if response.status_code < 400:
+                STAGE_CALLS.inc(stage=stage, outcome="ok")
+                return response.json()
+            error = f"{stage} returned {response.status_code}: {response.text[:500]}"
+            if response.status_code < 500:
+                # Client errors (missing file, bad payload) will not succeed on retry
+                STAGE_CALLS.inc(stage=stage, outcome="client_error")
+                raise StageError(error)
+        STAGE_CALLS.inc(stage=stage, outcome="retryable_error")
+        logger.warning("%s (attempt %d/%d)", error, attempt, attempts)
+        if attempt < attempts:
+            await asyncio.sleep(RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+    raise StageError(error)
+
+
+def _set_job(job_id, **fields):
+    jobs[job_id].update(fields, updated_at=time.time())
+
+
+async def run_pipeline(job_id):
+    job = jobs[job_id]
+    async with job_slots:
+        try:
+            # Call Whisper
+            _set_job(job_id, status=JOB_TRANSCRIBING)
+            started = time.perf_counter()
+            whisper_result = await call_stage("whisper", WHISPER_URL, {
+                "audio_path": job["audio_path"],
+                "output_path": job["transcript_path"]
+            })
+            job["stages"]["whisper"] = {"seconds": time.perf_counter() - started,
+                                        "cached": whisper_result.get("cached", False)}
+            STAGE_SECONDS.observe(job["stages"]["whisper"]["seconds"], stage="whisper")
+
+            # Call Aligner
+            _set_job(job_id, status=JOB_ALIGNING)
+            started = time.perf_counter()
+            await call_stage("aligner", ALIGNER_URL, {
+                "audio_path": job["audio_path"],
+                "transcript_path": job["transcript_path"],
+                "output_path": job["alignment_path"]
+            })
+            job["stages"]["aligner"] = {"seconds": time.perf_counter() - started}
+            STAGE_SECONDS.observe(job["stages"]["aligner"]["seconds"], stage="aligner")
+
+            _set_job(job_id, status=JOB_DONE, finished_at=time.time())
+            JOBS_FINISHED.inc(status=JOB_DONE)
+            logger.info("Job %s done", job_id)
+        except Exception as e:
+            logger.exception("Job %s failed: %s", job_id, e)
+            _set_job(job_id, status=JOB_FAILED, error=str(e), finished_at=time.time())
+            JOBS_FINISHED.inc(status=JOB_FAILED)
+
+
+@app.post("/process", status_code=202)
+async def process_audio(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
     job_id = str(uuid.uuid4())
 
     audio_path = f"{DATA_DIR}/{job_id}.wav"
     transcript_path = f"{DATA_DIR}/{job_id}.txt"
     alignment_path = f"{DATA_DIR}/{job_id}.json"
 
-    with open(audio_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-
-    # Call Whisper
-    requests.post(
-        WHISPER_URL,
-        json={
-            "audio_path": audio_path,
-            "output_path": transcript_path
-        }
-    )
-
-    # Call Aligner
-    requests.post(
-        ALIGNER_URL,
-        json={
-            "audio_path": audio_path,
-            "transcript_path": transcript_path,
-            "output_path": alignment_path
-        }
-    )
+    def save_upload():
+        with open(audio_path, "wb") as buffer:
+            shutil.copyfileobj(file.file, buffer)
+
+    await run_in_threadpool(save_upload)
+
+    _prune_finished()
+    now = time.time()
+    jobs[job_id] = {
+        "job_id": job_id,
+        "status": JOB_QUEUED,
+        "audio_path": audio_path,
+        "transcript_path": transcript_path,
+        "alignment_path": alignment_path,
+        "stages": {},
+        "error": None,
+        "created_at": now,
+        "updated_at": now,
+        "finished_at": None,
+    }
+    background_tasks.add_task(run_pipeline, job_id)
 
     return {
         "job_id": job_id,
+        "status": JOB_QUEUED,
+        "status_url": f"/jobs/{job_id}",
         "transcript": transcript_path,
         "alignment": alignment_path
     }
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    _prune_finished()
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
@@ -1,11 +1,33 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, send_file, g
 from flask_cors import CORS
+import gzip
+import hashlib
 import os
-import sqlite3
+import sys
 from datetime import datetime
 import uuid
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from werkzeug.utils import secure_filename
 
+import artifact_cache
+import audio_ingest
+import db
+import frame_cache
+import frame_store
+import jobs
+import mouth_roi
+import stage_graph
+import storage
+import upload_sessions
+
+# metrics.py is shared by every service and lives in ../shared
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'shared'))
+import metrics
+
 try:
     import cv2
     CV2_AVAILABLE = True
@@ -31,48 +53,47 @@ app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 ALLOWED_VIDEO_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv'}
 ALLOWED_AUDIO_EXTENSIONS = {'mp3', 'wav', 'm4a', 'aac'}
 ALLOWED_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+ALLOWED_LANDMARK_EXTENSIONS = {'csv'}
+
+# Video frame extraction settings
+FRAME_IMAGE_FORMATS = {'png', 'jpg', 'webp', 'bmp'}
+EXTRACTION_WORKERS = int(os.environ.get('EXTRACTION_WORKERS', min(8, os.cpu_count() or 1)))
+FRAME_PNG_COMPRESSION = int(os.environ.get('FRAME_PNG_COMPRESSION', 3))  # 0 (fast) - 9 (small)
+# 'eager' writes every frame to video_frames/, 'store' writes one frame store file,
+# 'lazy' decodes frames on demand, 'roi' stores only a crop around the mouth per frame
+# (needs a mouth_centers upload) and decodes full frames on demand
+FRAME_EXTRACTION_MODE = os.environ.get('FRAME_EXTRACTION_MODE', 'eager')
+FRAME_STORE_COMPRESSION = os.environ.get('FRAME_STORE_COMPRESSION', 'zlib')  # 'raw' or 'zlib'
+# Settings that change each mode's output; part of the artifact cache key
+FRAME_ARTIFACT_PARAMS = {
+    'eager': {'fps': 24, 'image_format': 'png', 'png_compression': FRAME_PNG_COMPRESSION},
+    'store': {'compression': FRAME_STORE_COMPRESSION},
+    'lazy': {},
+    'roi': {'compression': FRAME_STORE_COMPRESSION, 'roi_width': mouth_roi.ROI_WIDTH,
+            'roi_height': mouth_roi.ROI_HEIGHT, 'smoothing_window': mouth_roi.SMOOTHING_WINDOW},
+}
+
+# Threads shared by the ingest stage graphs of all animations
+STAGE_WORKERS = int(os.environ.get('STAGE_WORKERS', 8))
+
+# Resumable uploads: each PUT carries one chunk, so MAX_CONTENT_LENGTH only bounds a chunk
+UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))
+MAX_UPLOAD_FILE_BYTES = int(os.environ.get('MAX_UPLOAD_FILE_BYTES', 4 * 1024 * 1024 * 1024))
+
+# aligner/data, where ingest links each animation's WAV for MFA
+ALIGNER_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'aligner', 'data')
+
+# Frame listings are paginated; ?limit= is capped at MAX_FRAME_PAGE_SIZE
+FRAME_PAGE_SIZE = int(os.environ.get('FRAME_PAGE_SIZE', 200))
+MAX_FRAME_PAGE_SIZE = 1000
+# JSON responses at least this large are gzip-compressed when the client accepts it
+GZIP_MIN_BYTES = 1024
 
 # Create main upload directory
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-# Database setup
-def init_db():
-    conn = sqlite3.connect('animations.db')
-    c = conn.cursor()
-    
-    # Create tables if they don't exist
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS animations (
-            id TEXT PRIMARY KEY,
-            video_path TEXT NOT NULL,
-            audio_path TEXT NOT NULL,
-            face_reference_path TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            status TEXT DEFAULT 'processing'
-        )
-    ''')
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS frames (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            animation_id TEXT NOT NULL,
-            frame_path TEXT NOT NULL,
-            frame_order INTEGER NOT NULL,
-            FOREIGN KEY (animation_id) REFERENCES animations (id)
-        )
-    ''')
-    
-    # Migrate existing database: add face_reference_path column if it doesn't exist
-    try:
-        # Check if column exists by trying to select it
-        c.execute('SELECT face_reference_path FROM animations LIMIT 1')
-    except sqlite3.OperationalError:
-        # Column doesn't exist, add it
-        print("Migrating database: adding face_reference_path column...")
-        c.execute('ALTER TABLE animations ADD COLUMN face_reference_path TEXT')
-        print("Migration complete!")
-    
-    conn.commit()
-    conn.close()
+class UploadSaveError(Exception):
+    """An uploaded file could not be written to the animation folder"""
 
 def allowed_file(filename, file_type):
     """Check if file extension is allowed"""
@@ -82,55 +103,85 @@ def allowed_file(filename, file_type):
         return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_AUDIO_EXTENSIONS
     elif file_type == 'image':
         return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_IMAGE_EXTENSIONS
+    elif file_type == 'landmarks':
+        return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_LANDMARK_EXTENSIONS
     return False
 
+def upload_destination(filename, file_type, animation_folder, frame_index=None):
+    """Final path for an uploaded file inside the animation folder (subfolder is created)"""
+    filename = secure_filename(filename)
+    file_ext = filename.rsplit('.', 1)[1].lower()
+    
+    # Create subfolder based on file type
+    if file_type == 'video':
+        subfolder = 'video'
+        save_filename = f"video.{file_ext}"
+    elif file_type == 'audio':
+        subfolder = 'audio'
+        save_filename = f"audio.{file_ext}"
+    elif file_type == 'face_reference':
+        subfolder = 'face_reference'
+        save_filename = f"face_reference.{file_ext}"
+    elif file_type == 'frame':
+        subfolder = 'frames'
+        # For frames, use numbered filenames: frame_001.png, frame_002.png, etc.
+        if frame_index is not None:
+            save_filename = f"frame_{frame_index:03d}.{file_ext}"
+        else:
+            save_filename = filename  # Fallback to original name
+    else:
+        subfolder = file_type
+        save_filename = f"{file_type}.{file_ext}"
+    
+    # Create subfolder if it doesn't exist
+    type_folder = os.path.join(animation_folder, subfolder)
+    os.makedirs(type_folder, exist_ok=True)
+    
+    return os.path.join(type_folder, save_filename)
+
 def save_file(file, file_type, animation_id, animation_folder, frame_index=None):
     """Save file to disk and return the path"""
     if file and file.filename:
-        filename = secure_filename(file.filename)
-        file_ext = filename.rsplit('.', 1)[1].lower()
-        
-        # Create subfolder based on file type
-        if file_type == 'video':
-            subfolder = 'video'
-            save_filename = f"video.{file_ext}"
-        elif file_type == 'audio':
-            subfolder = 'audio'
-            save_filename = f"audio.{file_ext}"
-        elif file_type == 'face_reference':
-            subfolder = 'face_reference'
-            save_filename = f"face_reference.{file_ext}"
-        elif file_type == 'frame':
-            subfolder = 'frames'
-            # For frames, use numbered filenames: frame_001.png, frame_002.png, etc.
-            if frame_index is not None:
-                save_filename = f"frame_{frame_index:03d}.{file_ext}"
-            else:
-                save_filename = filename  # Fallback to original name
-        else:
-            subfolder = file_type
-            save_filename = f"{file_type}.{file_ext}"
-        
-        # Create subfolder if it doesn't exist
-        type_folder = os.path.join(animation_folder, subfolder)
-        os.makedirs(type_folder, exist_ok=True)
-        
-        file_path = os.path.join(type_folder, save_filename)
+        file_path = upload_destination(file.filename, file_type, animation_folder, frame_index)
         file.save(file_path)
         return file_path
     return None
 
-def extract_video_frames(video_path, output_folder, fps=24):
+def _frame_encode_params(image_format, png_compression, jpeg_quality):
+    """Build the cv2.imwrite parameter list for the selected frame codec"""
+    if image_format == 'png':
+        return [cv2.IMWRITE_PNG_COMPRESSION, int(png_compression)]
+    elif image_format in ('jpg', 'jpeg'):
+        return [cv2.IMWRITE_JPEG_QUALITY, int(jpeg_quality)]
+    elif image_format == 'webp':
+        # Quality above 100 makes libwebp encode losslessly
+        return [cv2.IMWRITE_WEBP_QUALITY, int(jpeg_quality)]
+    return []
+
+def extract_video_frames(video_path, output_folder, fps=24, workers=None, image_format='png',
+                         png_compression=FRAME_PNG_COMPRESSION, jpeg_quality=95, queue_size=None,
+                         progress_callback=None, cancel_event=None):
     """
-    Extract all frames from a video and save them as PNG files.
+    Extract all frames from a video and save them as image files.
+    
+    Decoding runs on the calling thread and feeds a bounded queue that a pool
+    of encoder threads drains, so PNG compression (which releases the GIL in
+    OpenCV) is spread over several cores while the next frames are decoded.
     
     Args:
         video_path: Path to the video file
         output_folder: Folder to save extracted frames
         fps: Frames per second of the video (default 24)
+        workers: Number of encoder threads (default EXTRACTION_WORKERS, 0 = encode inline)
+        image_format: Output codec, one of FRAME_IMAGE_FORMATS (default 'png')
+        png_compression: PNG compression level 0-9 (default FRAME_PNG_COMPRESSION)
+        jpeg_quality: Quality for jpg/webp output (default 95)
+        queue_size: Max decoded frames waiting for an encoder (default workers * 4)
+        progress_callback: Optional callable(frames_extracted, total_frames) called per saved frame
+        cancel_event: Optional threading.Event; decoding stops early once it is set
     
     Returns:
-        List of paths to extracted frame files
+        List of paths to extracted frame files, in frame order
     """
     frame_paths = []
     
@@ -138,6 +189,17 @@ def extract_video_frames(video_path, output_folder, fps=24):
         print("Error: opencv-python is not installed. Cannot extract frames.")
         return frame_paths
     
+    image_format = image_format.lower()
+    if image_format not in FRAME_IMAGE_FORMATS:
+        print(f"Error: Unsupported frame format '{image_format}'. Allowed: {FRAME_IMAGE_FORMATS}")
+        return frame_paths
+    
+    if workers is None:
+        workers = EXTRACTION_WORKERS
+    if queue_size is None:
+        queue_size = max(1, workers) * 4
+    encode_params = _frame_encode_params(image_format, png_compression, jpeg_quality)
+    
     try:
         # Create output folder if it doesn't exist
         os.makedirs(output_folder, exist_ok=True)
@@ -163,36 +225,80 @@ def extract_video_frames(video_path, output_folder, fps=24):
         print(f"  - Expected FPS: {fps}")
         print(f"  - Total frames in video: {total_frames}")
         print(f"  - Duration: {duration_seconds:.2f} seconds")
+        print(f"  - Output: {image_format}, {workers} encoder worker(s)")
         
-        frame_count = 0
-        frame_number = 0
+        # Encoded paths keyed by 0-based decode index; reassembled in order at the end
+        results = {}
+        results_lock = threading.Lock()
+        encoded_count = [0]
         
-        while True:
-            ret, frame = cap.read()
-            
-            if not ret:
-                break
-            
-            # Save frame as PNG
-            frame_filename = f"frame_{frame_number+1:06d}.png"
+        def encode_frame(frame_number, frame):
+            frame_filename = f"frame_{frame_number+1:06d}.{image_format}"
             frame_path = os.path.join(output_folder, frame_filename)
-            success = cv2.imwrite(frame_path, frame)
-            
-            if success and os.path.exists(frame_path):
-                frame_paths.append(frame_path)
-                frame_number += 1
+            if cv2.imwrite(frame_path, frame, encode_params):
+                with results_lock:
+                    results[frame_number] = frame_path
+                    encoded_count[0] += 1
+                    done = encoded_count[0]
+                    if progress_callback:
+                        progress_callback(done, total_frames)
                 # Print progress every 30 frames
-                if frame_number % 30 == 0:
-                    print(f"  Extracted {frame_number} frames...")
+                if done % 30 == 0:
+                    print(f"  Extracted {done} frames...")
             else:
                 print(f"Warning: Failed to save frame {frame_number+1}")
-            
-            frame_count += 1
+        
+        def encoder_worker(frame_queue):
+            while True:
+                item = frame_queue.get()
+                if item is None:
+                    break
+                try:
+                    encode_frame(*item)
+                except Exception as e:
+                    print(f"Warning: Failed to encode frame {item[0]+1}: {e}")
+        
+        start_time = time.perf_counter()
+        frame_count = 0
+        
+        if workers > 0:
+            frame_queue = queue.Queue(maxsize=queue_size)
+            threads = [
+                threading.Thread(target=encoder_worker, args=(frame_queue,), daemon=True)
+                for _ in range(workers)
+            ]
+            for thread in threads:
+                thread.start()
+            try:
+                while True:
+                    ret, frame = cap.read()
+                    if not ret or (cancel_event is not None and cancel_event.is_set()):
+                        break
+                    # Blocks when encoders fall behind, bounding memory use
+                    frame_queue.put((frame_count, frame))
+                    frame_count += 1
+            finally:
+                for _ in threads:
+                    frame_queue.put(None)
+                for thread in threads:
+                    thread.join()
+        else:
+            while True:
+                ret, frame = cap.read()
+                if not ret or (cancel_event is not None and cancel_event.is_set()):
+                    break
+                encode_frame(frame_count, frame)
+                frame_count += 1
         
         cap.release()
         
+        elapsed = time.perf_counter() - start_time
+        frame_paths = [results[i] for i in range(frame_count) if i in results]
+        frames_per_second = len(frame_paths) / elapsed if elapsed > 0 else 0
+        
         print(f"✓ Successfully extracted {len(frame_paths)} frames from video")
         print(f"  - Saved to: {output_folder}")
+        print(f"  - Took {elapsed:.2f} seconds ({frames_per_second:.1f} frames/sec)")
         if total_frames > 0:
             extraction_rate = (len(frame_paths) / total_frames) * 100
             print(f"  - Extraction rate: {extraction_rate:.1f}% ({len(frame_paths)}/{total_frames} frames)")
@@ -205,6 +311,97 @@ def extract_video_frames(video_path, output_folder, fps=24):
         traceback.print_exc()
         return frame_paths
 
+def extract_video_frames_to_store(video_path, store_file, compression='raw', level=1, workers=None,
+                                  queue_size=None, progress_callback=None, cancel_event=None):
+    """
+    Extract all frames from a video into a single frame store file.
+    
+    Same decode-ahead pipeline as extract_video_frames, but frames are
+    appended to one container (see frame_store) instead of one PNG each.
+    zlib compression runs on the worker pool; frames are written in order.
+    
+    Args:
+        video_path: Path to the video file
+        store_file: Path of the frame store to create
+        compression: 'raw' (zero-copy reads) or 'zlib' (lossless, smaller)
+        level: zlib compression level 1-9 (default 1)
+        workers: Number of compression threads (default EXTRACTION_WORKERS)
+        queue_size: Max frames being compressed ahead of the writer (default workers * 4)
+        progress_callback: Optional callable(frames_extracted, total_frames) called per frame
+        cancel_event: Optional threading.Event; decoding stops early once it is set
+    
+    Returns:
+        Number of frames written (0 on failure)
+    """
+    if not CV2_AVAILABLE:
+        print("Error: opencv-python is not installed. Cannot extract frames.")
+        return 0
+    
+    if workers is None:
+        workers = EXTRACTION_WORKERS
+    if queue_size is None:
+        queue_size = max(1, workers) * 4
+    
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        print(f"Error: Could not open video file {video_path}")
+        return 0
+    
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    video_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    video_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    print(f"Extracting frames from video into frame store: {video_path}")
+    print(f"  - Resolution: {video_width}x{video_height}, {total_frames} frames")
+    print(f"  - Compression: {compression}")
+    
+    start_time = time.perf_counter()
+    writer = frame_store.FrameStoreWriter(store_file, video_width, video_height, 3,
+                                          compression=compression, level=level)
+    try:
+        if compression == 'raw' or workers == 0:
+            while True:
+                ret, frame = cap.read()
+                if not ret or (cancel_event is not None and cancel_event.is_set()):
+                    break
+                writer.append(frame)
+                if progress_callback:
+                    progress_callback(len(writer), total_frames)
+        else:
+            pending = deque()
+            
+            def flush(until):
+                while len(pending) > until:
+                    writer.append_encoded(pending.popleft().result())
+                    if progress_callback:
+                        progress_callback(len(writer), total_frames)
+            
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                while True:
+                    ret, frame = cap.read()
+                    if not ret or (cancel_event is not None and cancel_event.is_set()):
+                        break
+                    pending.append(executor.submit(writer.encode, frame))
+                    # Bound the frames held in memory while compression catches up
+                    flush(queue_size)
+                flush(0)
+        writer.close()
+    except Exception as e:
+        writer.abort()
+        print(f"Error extracting frames into store: {e}")
+        import traceback
+        traceback.print_exc()
+        return 0
+    finally:
+        cap.release()
+    
+    elapsed = time.perf_counter() - start_time
+    frame_count = len(writer)
+    frames_per_second = frame_count / elapsed if elapsed > 0 else 0
+    store_size = os.path.getsize(store_file) / (1024 * 1024)
+    print(f"✓ Stored {frame_count} frames in {store_file} ({store_size:.1f} MB)")
+    print(f"  - Took {elapsed:.2f} seconds ({frames_per_second:.1f} frames/sec)")
+    return frame_count
+
 def convert_audio_to_wav(input_audio_path, output_wav_path, sample_rate=44100, channels=2):
     """
     Convert audio file to WAV format using ffmpeg.
@@ -282,6 +479,355 @@ def convert_audio_to_wav(input_audio_path, output_wav_path, sample_rate=44100, c
 def request_entity_too_large(error):
     return jsonify({'error': 'File too large. Maximum size is 500MB'}), 413
 
+def probe_video_info(video_path):
+    """Read fps, frame count and dimensions from the video's container (no decoding)"""
+    if not CV2_AVAILABLE:
+        return None
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            return None
+        return {
+            'fps': float(cap.get(cv2.CAP_PROP_FPS)),
+            'frame_count': int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+            'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        }
+    finally:
+        cap.release()
+
+def set_animation_status(animation_id, status, **fields):
+    """Update the animation's status column (and any other given columns)"""
+    db.update_animation(animation_id, status=status, **fields)
+    job_queue.update(animation_id, stage=status)
+
+def process_animation(animation_id, animation_folder, video_path, audio_path, original_audio_filename,
+                      mouth_centers_path=None):
+    """
+    Background job: extract video frames, convert audio and store frame rows.
+    
+    Runs on the job queue after submit_files has persisted the uploads. Frame
+    extraction and audio decoding don't depend on each other, so they run as
+    concurrent stages of a StageGraph on stage_executor; storing the frame rows
+    waits for both. Status is written to animations.status and progress is
+    reported through job_queue so /api/animations/<id>/status can be polled.
+    
+    mouth_centers_path is the optional mouth centers / OpenFace CSV used by
+    the 'roi' extraction mode.
+    
+    Stage outputs come from artifact_store, keyed by the hashes of the
+    stage's inputs: an upload whose video (or audio) matches an earlier one
+    links the earlier frames (or decoded audio) into its folder instead of
+    running the stage again.
+    """
+    graph = stage_graph.StageGraph(animation_id)
+    
+    def on_frame_progress(frames_extracted, total_frames):
+        job_queue.update(animation_id, frames_extracted=frames_extracted, total_frames=total_frames)
+    
+    def extract_frames(_):
+        mode = FRAME_EXTRACTION_MODE
+        if mode == 'roi' and not mouth_centers_path:
+            print(f"[{animation_id}] Warning: roi frame mode without mouth centers, keeping frames lazy")
+            mode = 'lazy'
+        
+        # Frames depend only on the video bytes (plus the mouth centers in roi mode),
+        # so a re-submitted video reuses the earlier extraction
+        inputs = {'video': artifact_cache.file_digest(video_path)}
+        if mode == 'roi':
+            inputs['mouth_centers'] = artifact_cache.file_digest(mouth_centers_path)
+        kind = f'frames_{mode}'
+        key = artifact_cache.artifact_key(kind, inputs, FRAME_ARTIFACT_PARAMS[mode])
+        
+        def build(work_dir):
+            # Extract exactly as into the animation folder, but inside the cache entry
+            os.makedirs(os.path.join(work_dir, 'video'), exist_ok=True)
+            frame_names = []
+            if mode == 'roi':
+                # Only the mouth crop is stored; the seek index lets full frames be decoded on demand
+                print(f"[{animation_id}] Extracting mouth crops (roi frame mode)...")
+                frame_cache.build_seek_index(video_path, work_dir)
+                frame_count = mouth_roi.extract_mouth_rois(
+                    video_path, mouth_centers_path, work_dir, compression=FRAME_STORE_COMPRESSION,
+                    progress_callback=on_frame_progress, cancel_event=graph.cancel_event
+                )
+            elif mode == 'store':
+                # One container file with an offset index instead of a PNG per frame
+                print(f"[{animation_id}] Extracting frames into frame store...")
+                frame_count = extract_video_frames_to_store(
+                    video_path, frame_store.store_path(work_dir), compression=FRAME_STORE_COMPRESSION,
+                    progress_callback=on_frame_progress, cancel_event=graph.cancel_event
+                )
+            elif mode == 'lazy':
+                # Keep only the source video; frames are decoded on demand by frame_cache
+                print(f"[{animation_id}] Building seek index (lazy frame mode)...")
+                seek_index = frame_cache.build_seek_index(video_path, work_dir)
+                frame_count = seek_index['frame_count'] if seek_index else 0
+            else:
+                print(f"[{animation_id}] Extracting frames from video...")
+                frame_paths = extract_video_frames(
+                    video_path, os.path.join(work_dir, 'video_frames'), fps=24,
+                    progress_callback=on_frame_progress, cancel_event=graph.cancel_event
+                )
+                frame_names = [os.path.basename(path) for path in frame_paths]
+                frame_count = len(frame_names)
+            
+            FRAMES_EXTRACTED.inc(frame_count)
+            if graph.cancelled:
+                raise stage_graph.StageCancelled('frame extraction cancelled')
+            if frame_count == 0:
+                # Nothing worth keeping; a later submit of the same video tries again
+                return None
+            return {'frame_count': frame_count, 'frames': frame_names, 'video_info': probe_video_info(video_path)}
+        
+        # The cached seek index / ROI metadata name the first uploader's files; point them at ours
+        entry_dir, meta, hit = artifact_store.fetch(kind, key, build, inputs, materialize_into=animation_folder,
+                                                    rewrite_json={'video_path': video_path,
+                                                                  'centers_csv': mouth_centers_path})
+        ARTIFACT_LOOKUPS.inc(kind=kind, result='hit' if hit else 'miss')
+        extracted_frame_paths = []
+        frame_count = 0
+        if entry_dir:
+            frame_count = meta['frame_count']
+            video_frames_folder = os.path.join(animation_folder, 'video_frames')
+            extracted_frame_paths = [os.path.join(video_frames_folder, name) for name in meta['frames']]
+            if hit:
+                print(f"[{animation_id}] Reused {frame_count} cached frames ({kind} {key[:12]})")
+            if meta.get('video_info'):
+                # Stored once so frame listings never have to open the video
+                db.set_video_info(animation_id, **meta['video_info'])
+        job_queue.update(animation_id, frames_extracted=frame_count, frames_cached=hit)
+        if mode == 'lazy':
+            job_queue.update(animation_id, total_frames=frame_count)
+        
+        if frame_count == 0:
+            print(f"[{animation_id}] Warning: No frames extracted from video")
+        elif mode == 'eager':
+            print(f"[{animation_id}] Successfully extracted {len(extracted_frame_paths)} frames from video")
+        
+        if not graph.is_done('audio'):
+            set_animation_status(animation_id, jobs.STATUS_CONVERTING_AUDIO)
+        return extracted_frame_paths
+    
+    def prepare_audio(_):
+        # Decode audio once into the canonical 16 kHz mono buffer, shared by every
+        # animation uploaded with the same audio bytes
+        audio_folder = os.path.join(animation_folder, 'audio')
+        
+        def build(work_dir):
+            print(f"[{animation_id}] Decoding audio to 16 kHz mono buffer...")
+            buffer_path, duration_seconds = audio_ingest.ingest_audio(audio_path, os.path.join(work_dir, 'audio'))
+            print(f"✓ Decoded {duration_seconds:.2f} seconds of audio to {buffer_path}")
+            # MFA reads WAV files, so this is the one consumer that gets a WAV on disk
+            audio_ingest.ensure_wav(buffer_path, os.path.join(work_dir, 'audio', 'audio.wav'))
+            AUDIO_SECONDS_INGESTED.inc(duration_seconds)
+            return {'duration_seconds': duration_seconds}
+        
+        conversion_success = False
+        try:
+            inputs = {'audio': artifact_cache.file_digest(audio_path)}
+            key = artifact_cache.artifact_key('audio', inputs, {'sample_rate': audio_ingest.SAMPLE_RATE})
+            # An uploaded audio.wav is kept as is, like before the cache
+            entry_dir, meta, hit = artifact_store.fetch('audio', key, build, inputs, materialize_into=animation_folder)
+            ARTIFACT_LOOKUPS.inc(kind='audio', result='hit' if hit else 'miss')
+            if hit:
+                print(f"[{animation_id}] Reused cached audio ({meta['duration_seconds']:.2f} seconds, {key[:12]})")
+            buffer_path = os.path.join(audio_folder, audio_ingest.AUDIO_BUFFER_FILENAME)
+            wav_path = os.path.join(audio_folder, 'audio.wav')
+            conversion_success = True
+            job_queue.update(animation_id, audio_buffer_path=buffer_path,
+                             audio_duration_seconds=meta['duration_seconds'], audio_cached=hit)
+        except FileNotFoundError:
+            print("Error: ffmpeg not found. Please install ffmpeg to decode audio.")
+        except Exception as e:
+            print(f"Error decoding audio: {e}")
+        job_queue.update(animation_id, audio_converted=conversion_success)
+        
+        if graph.cancelled:
+            raise stage_graph.StageCancelled('audio conversion cancelled')
+        
+        if not conversion_success:
+            print("Warning: Audio conversion to WAV failed. Using original audio file.")
+            # Continue with original file if conversion fails
+            return audio_path
+        
+        # Use the WAV file path instead of original
+        print(f"Using converted WAV file: {wav_path}")
+        
+        # Get the project root directory (one level up from backend/)
+        backend_dir = os.path.dirname(os.path.abspath(__file__))
+        project_root = os.path.dirname(backend_dir)
+        aligner_data_dir = os.path.join(project_root, 'aligner', 'data')
+        
+        # Create aligner/data directory if it doesn't exist
+        os.makedirs(aligner_data_dir, exist_ok=True)
+        
+        # Link (not copy) the WAV into aligner/data with animation_id as filename
+        aligner_wav_filename = f"{animation_id}.wav"
+        aligner_wav_path = os.path.join(aligner_data_dir, aligner_wav_filename)
+        audio_ingest.link_or_copy(wav_path, aligner_wav_path)
+        print(f"✓ Linked WAV file into aligner/data: {aligner_wav_path}")
+        
+        # Create a text file with the audio file name
+        audio_txt_filename = f"{animation_id}.txt"
+        audio_txt_path = os.path.join(aligner_data_dir, audio_txt_filename)
+        with open(audio_txt_path, 'w') as f:
+            f.write(f"{aligner_wav_filename}\n")
+        print(f"✓ Created text file: {audio_txt_path}")
+        
+        # Write original audio file name to audionames.txt (overwrite with single line)
+        audionames_file = os.path.join(project_root, 'audionames.txt')
+        if original_audio_filename:
+            with open(audionames_file, 'w') as f:
+                f.write(f"{original_audio_filename}\n")
+            print(f"✓ Updated audionames.txt with: {original_audio_filename}")
+        else:
+            print("Warning: Could not get original audio filename")
+        return wav_path
+    
+    def store_frames(results):
+        # Store extracted frame metadata in database
+        extracted_frame_paths = results['frames']
+        set_animation_status(animation_id, jobs.STATUS_STORING_FRAMES, audio_path=results['audio'])
+        # Contiguous frame_NNNNNN runs are stored as range rows, not one row per frame
+        range_count, single_count = db.insert_extracted_frames(
+            animation_id, extracted_frame_paths, start_order=db.EXTRACTED_FRAME_ORDER_START
+        )
+        print(f"[{animation_id}] Stored {len(extracted_frame_paths)} extracted frames "
+              f"as {range_count} range(s) and {single_count} single row(s)")
+    
+    graph.add('frames', extract_frames)
+    graph.add('audio', prepare_audio)
+    graph.add('store_frames', store_frames, deps=('frames', 'audio'))
+    
+    try:
+        # Both first stages are in flight, so report the first of them
+        set_animation_status(animation_id, jobs.STATUS_EXTRACTING_FRAMES)
+        graph.run(stage_executor)
+        set_animation_status(animation_id, jobs.STATUS_READY)
+        ANIMATIONS_FINISHED.inc(status=jobs.STATUS_READY)
+        print(f"[{animation_id}] Processing completed successfully")
+    except Exception:
+        set_animation_status(animation_id, jobs.STATUS_FAILED)
+        ANIMATIONS_FINISHED.inc(status=jobs.STATUS_FAILED)
+        raise
+    finally:
+        graph.log_timings()
+        observe_stage_graph(graph, 'process')
+        try:
+            storage_manager.record_size(animation_id)
+        except Exception as e:
+            print(f"[{animation_id}] Could not record storage size: {e}")
+
+job_queue = jobs.JobQueue()
+# Stage outputs keyed by input content, shared by every animation
+artifact_store = artifact_cache.ArtifactCache()
+# Runs the independent ingest stages of each animation side by side
+stage_executor = ThreadPoolExecutor(max_workers=STAGE_WORKERS, thread_name_prefix='stage')
+
+# Prometheus metrics, served on /metrics
+STAGE_SECONDS = metrics.histogram('ingest_stage_duration_seconds', 'Wall-clock time of each ingest stage', ['stage'])
+CRITICAL_PATH_SECONDS = metrics.histogram('ingest_critical_path_seconds',
+                                          'Stage time along the critical path of an ingest graph', ['graph'])
+FRAMES_EXTRACTED = metrics.counter('frames_extracted_total', 'Video frames extracted, stored or indexed')
+AUDIO_SECONDS_INGESTED = metrics.counter('audio_seconds_ingested_total', 'Seconds of uploaded audio decoded')
+UPLOAD_BYTES = metrics.counter('upload_chunk_bytes_total', 'Bytes received through resumable upload chunks')
+ANIMATIONS_FINISHED = metrics.counter('animations_finished_total', 'Animations that finished processing', ['status'])
+ARTIFACT_LOOKUPS = metrics.counter('artifact_cache_lookups_total', 'Ingest stage outputs reused or built',
+                                   ['kind', 'result'])
+metrics.gauge('jobs_in_flight', 'Animation jobs running on a worker', fn=lambda: job_queue.running_count())
+metrics.gauge('job_queue_depth', 'Animation jobs waiting for a worker',
+              fn=lambda: job_queue.pending_count() - job_queue.running_count())
+metrics.gauge('frame_cache_bytes', 'Decoded frames held by the lazy frame cache',
+              fn=lambda: lazy_frames.stats()['cached_bytes'])
+
+def observe_stage_graph(graph, kind):
+    """Record a finished StageGraph's stage and critical-path times"""
+    for name, (stage_start, stage_end) in graph.timings.items():
+        STAGE_SECONDS.observe(stage_end - stage_start, stage=name)
+    if graph.timings:
+        CRITICAL_PATH_SECONDS.observe(graph.critical_path_seconds(), graph=kind)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    started = g.get('request_started')
+    if started is not None:
+        # The route pattern, not the URL, so animation ids don't explode the label set
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method,
+                                             endpoint=endpoint, status=response.status_code)
+    if request.view_args and 'animation_id' in request.view_args:
+        # Last access drives the storage manager's LRU eviction
+        storage_manager.touch(request.view_args['animation_id'])
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus text exposition of this process's metrics"""
+    return Response(metrics.render(), mimetype=metrics.CONTENT_TYPE)
+lazy_frames = frame_cache.FrameCache()
+upload_store = upload_sessions.UploadSessionStore(UPLOAD_FOLDER, UPLOAD_CHUNK_SIZE)
+
+def animation_busy(animation_id):
+    """True while a job for the animation is queued or running"""
+    progress = job_queue.get(animation_id)
+    return progress is not None and progress['finished_at'] is None
+
+# Disk quota, LRU eviction of derived files and orphan cleanup, swept in the background
+storage_manager = storage.StorageManager(UPLOAD_FOLDER, artifact_store, ALIGNER_DATA_DIR, is_busy=animation_busy)
+metrics.gauge('storage_usage_bytes', 'Disk used by uploads, artifacts and aligner files at the last sweep',
+              fn=lambda: (storage_manager.stats()['last_sweep'] or {}).get('usage_bytes', 0))
+
+@app.route('/api/storage', methods=['GET'])
+def get_storage():
+    """Quota settings and the result of the last storage sweep"""
+    return jsonify(storage_manager.stats())
+
+def queue_animation(animation_id, animation_folder, video_path, audio_path, face_reference_path,
+                    frame_paths, original_audio_filename, mouth_centers_path=None):
+    """
+    Record a fully uploaded animation and hand its processing to the job queue.
+    
+    Args:
+        frame_paths: List of (frame_path, frame_order) for the user-uploaded frames
+        mouth_centers_path: Optional mouth centers CSV for the 'roi' frame mode
+    
+    Returns:
+        Flask response (202 on success)
+    """
+    # Store metadata in database
+    print("Storing metadata in database...")
+    try:
+        # Insert animation record and user-uploaded frame records
+        db.insert_animation(animation_id, video_path, audio_path, face_reference_path,
+                            jobs.STATUS_QUEUED, frames=frame_paths)
+        print(f"Database updated successfully. Animation ID: {animation_id}")
+    except Exception as db_error:
+        print(f"Database error: {db_error}")
+        return jsonify({'error': f'Database error: {str(db_error)}'}), 500
+    
+    # Hand the slow stages (frame extraction, audio conversion) to the job queue
+    try:
+        job_queue.submit(animation_id, process_animation, animation_id, animation_folder,
+                         video_path, audio_path, original_audio_filename, mouth_centers_path)
+    except jobs.QueueFullError as e:
+        print(f"Rejecting submit: {e}")
+        set_animation_status(animation_id, jobs.STATUS_FAILED)
+        return jsonify({'error': 'Server is busy, please retry shortly'}), 503
+    
+    print(f"Request accepted, processing queued for {animation_id}")
+    return jsonify({
+        'success': True,
+        'animation_id': animation_id,
+        'status': jobs.STATUS_QUEUED,
+        'status_url': f'/api/animations/{animation_id}/status',
+        'message': 'Files uploaded, processing queued'
+    }), 202
+
 @app.route('/api/submit', methods=['POST'])
 def submit_files():
     try:
@@ -302,6 +848,8 @@ def submit_files():
         audio_file = request.files.get('audio')
         face_reference_file = request.files.get('face_reference')
         frame_files = request.files.getlist('frames')
+        # Optional: per-frame mouth centers (or OpenFace landmarks) for the 'roi' frame mode
+        mouth_centers_file = request.files.get('mouth_centers')
         
         # Store original audio filename for later use
         original_audio_filename = audio_file.filename if audio_file and audio_file.filename else None
@@ -336,144 +884,64 @@ def submit_files():
         if not allowed_file(face_reference_file.filename, 'image'):
             return jsonify({'error': f'Invalid face reference file type. Allowed: {ALLOWED_IMAGE_EXTENSIONS}'}), 400
         
-        # Save files to disk in the animation folder
-        print("Saving video file...")
-        video_path = save_file(video_file, 'video', animation_id, animation_folder)
-        print(f"Video saved to: {video_path}")
+        if mouth_centers_file and mouth_centers_file.filename and not allowed_file(mouth_centers_file.filename, 'landmarks'):
+            return jsonify({'error': f'Invalid mouth centers file type. Allowed: {ALLOWED_LANDMARK_EXTENSIONS}'}), 400
         
-        if not video_path:
-            return jsonify({'error': 'Failed to save video file'}), 500
+        # Save files to disk in the animation folder; the saves are independent
+        # disk writes, so they run as concurrent stages
+        def save_required(field, file_type):
+            def save(_):
+                print(f"Saving {field.replace('_', ' ')} file...")
+                path = save_file(request_files[field], file_type, animation_id, animation_folder)
+                if not path:
+                    raise UploadSaveError(f"Failed to save {field.replace('_', ' ')} file")
+                print(f"{field.replace('_', ' ').capitalize()} saved to: {path}")
+                return path
+            return save
         
-        # Extract frames from video (24 fps)
-        print("Extracting frames from video...")
-        video_frames_folder = os.path.join(animation_folder, 'video_frames')
-        extracted_frame_paths = extract_video_frames(video_path, video_frames_folder, fps=24)
-        
-        if len(extracted_frame_paths) == 0:
-            print("Warning: No frames extracted from video")
-        else:
-            print(f"Successfully extracted {len(extracted_frame_paths)} frames from video")
-        
-        print("Saving audio file...")
-        audio_path = save_file(audio_file, 'audio', animation_id, animation_folder)
-        print(f"Audio saved to: {audio_path}")
-        
-        if not audio_path:
-            return jsonify({'error': 'Failed to save audio file'}), 500
-        
-        # Convert audio to WAV format
-        print("Converting audio to WAV format...")
-        audio_folder = os.path.join(animation_folder, 'audio')
-        wav_path = os.path.join(audio_folder, 'audio.wav')
-        
-        conversion_success = convert_audio_to_wav(audio_path, wav_path)
+        def save_frames(_):
+            print("Saving frame files...")
+            frame_paths = []
+            for idx, frame_file in enumerate(frame_files):
+                if frame_file and frame_file.filename:
+                    if allowed_file(frame_file.filename, 'image'):
+                        # Use idx+1 for frame numbering (frame_001, frame_002, etc.)
+                        frame_path = save_file(frame_file, 'frame', animation_id, animation_folder, frame_index=idx+1)
+                        if frame_path:
+                            frame_paths.append((frame_path, idx))
+                            print(f"Frame {idx+1} saved to: {frame_path}")
+                    else:
+                        print(f"Frame {idx} has invalid extension: {frame_file.filename}")
+            return frame_paths
         
-        if conversion_success:
-            # Use the WAV file path instead of original
-            audio_path = wav_path
-            print(f"Using converted WAV file: {audio_path}")
-            
-            # Copy WAV file to aligner/data directory
-            import shutil
-            
-            # Get the project root directory (one level up from backend/)
-            backend_dir = os.path.dirname(os.path.abspath(__file__))
-            project_root = os.path.dirname(backend_dir)
-            aligner_data_dir = os.path.join(project_root, 'aligner', 'data')
-            
-            # Create aligner/data directory if it doesn't exist
-            os.makedirs(aligner_data_dir, exist_ok=True)
-            
-            # Copy WAV file to aligner/data with animation_id as filename
-            aligner_wav_filename = f"{animation_id}.wav"
-            aligner_wav_path = os.path.join(aligner_data_dir, aligner_wav_filename)
-            shutil.copy2(wav_path, aligner_wav_path)
-            print(f"✓ Copied WAV file to aligner/data: {aligner_wav_path}")
-            
-            # Create a text file with the audio file name
-            audio_txt_filename = f"{animation_id}.txt"
-            audio_txt_path = os.path.join(aligner_data_dir, audio_txt_filename)
-            with open(audio_txt_path, 'w') as f:
-                f.write(f"{aligner_wav_filename}\n")
-            print(f"✓ Created text file: {audio_txt_path}")
-            
-            # Write original audio file name to audionames.txt (overwrite with single line)
-            audionames_file = os.path.join(project_root, 'audionames.txt')
-            if original_audio_filename:
-                with open(audionames_file, 'w') as f:
-                    f.write(f"{original_audio_filename}\n")
-                print(f"✓ Updated audionames.txt with: {original_audio_filename}")
-            else:
-                print("Warning: Could not get original audio filename")
-        else:
-            print("Warning: Audio conversion to WAV failed. Using original audio file.")
-            # Continue with original file if conversion fails
+        request_files = {'video': video_file, 'audio': audio_file, 'face_reference': face_reference_file}
+        graph = stage_graph.StageGraph(animation_id)
+        graph.add('save_video', save_required('video', 'video'))
+        graph.add('save_audio', save_required('audio', 'audio'))
+        graph.add('save_face_reference', save_required('face_reference', 'face_reference'))
+        graph.add('save_frames', save_frames)
+        if mouth_centers_file and mouth_centers_file.filename:
+            request_files['mouth_centers'] = mouth_centers_file
+            graph.add('save_mouth_centers', save_required('mouth_centers', 'mouth_centers'))
+        try:
+            saved = graph.run(stage_executor)
+        except UploadSaveError as e:
+            return jsonify({'error': str(e)}), 500
+        finally:
+            graph.log_timings()
+            observe_stage_graph(graph, 'submit')
         
-        print("Saving face reference file...")
-        face_reference_path = save_file(face_reference_file, 'face_reference', animation_id, animation_folder)
-        print(f"Face reference saved to: {face_reference_path}")
-        
-        if not face_reference_path:
-            return jsonify({'error': 'Failed to save face reference file'}), 500
-        
-        # Save frame files
-        print("Saving frame files...")
-        frame_paths = []
-        for idx, frame_file in enumerate(frame_files):
-            if frame_file and frame_file.filename:
-                if allowed_file(frame_file.filename, 'image'):
-                    # Use idx+1 for frame numbering (frame_001, frame_002, etc.)
-                    frame_path = save_file(frame_file, 'frame', animation_id, animation_folder, frame_index=idx+1)
-                    if frame_path:
-                        frame_paths.append((frame_path, idx))
-                        print(f"Frame {idx+1} saved to: {frame_path}")
-                else:
-                    print(f"Frame {idx} has invalid extension: {frame_file.filename}")
+        video_path = saved['save_video']
+        audio_path = saved['save_audio']
+        face_reference_path = saved['save_face_reference']
+        frame_paths = saved['save_frames']
+        mouth_centers_path = saved.get('save_mouth_centers')
         
         if len(frame_paths) == 0:
             return jsonify({'error': 'No valid frame files. Allowed extensions: ' + ', '.join(ALLOWED_IMAGE_EXTENSIONS)}), 400
         
-        # Store metadata in database
-        print("Storing metadata in database...")
-        conn = sqlite3.connect('animations.db')
-        c = conn.cursor()
-        
-        try:
-            # Insert animation record
-            c.execute('''
-                INSERT INTO animations (id, video_path, audio_path, face_reference_path, status)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (animation_id, video_path, audio_path, face_reference_path, 'uploaded'))
-            
-            # Insert frame records (user-uploaded frames)
-            for frame_path, frame_order in frame_paths:
-                c.execute('''
-                    INSERT INTO frames (animation_id, frame_path, frame_order)
-                    VALUES (?, ?, ?)
-                ''', (animation_id, frame_path, frame_order))
-            
-            # Insert extracted video frame records
-            for idx, extracted_frame_path in enumerate(extracted_frame_paths):
-                c.execute('''
-                    INSERT INTO frames (animation_id, frame_path, frame_order)
-                    VALUES (?, ?, ?)
-                ''', (animation_id, extracted_frame_path, idx + 10000))  # Use high order number to distinguish from user frames
-            
-            conn.commit()
-            print(f"Database updated successfully. Animation ID: {animation_id}")
-        except Exception as db_error:
-            conn.rollback()
-            print(f"Database error: {db_error}")
-            return jsonify({'error': f'Database error: {str(db_error)}'}), 500
-        finally:
-            conn.close()
-        
-        print("Request completed successfully")
-        return jsonify({
-            'success': True,
-            'animation_id': animation_id,
-            'message': 'Files uploaded and stored successfully'
-        }), 200
+        return queue_animation(animation_id, animation_folder, video_path, audio_path,
+                               face_reference_path, frame_paths, original_audio_filename, mouth_centers_path)
         
     except Exception as e:
         import traceback
@@ -482,6 +950,257 @@ def submit_files():
         print(f"Traceback: {error_trace}")
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
+# Upload fields and the allowed_file() type each one is checked against
+UPLOAD_FIELDS = {'video': 'video', 'audio': 'audio', 'face_reference': 'image', 'frames': 'image',
+                 'mouth_centers': 'landmarks'}
+
+@app.route('/api/uploads', methods=['POST'])
+def create_upload():
+    """
+    Open a resumable upload session.
+    
+    Body: {"files": [{"field": "video"|"audio"|"face_reference"|"frames"|"mouth_centers",
+                      "filename": str, "size": int, "sha256": optional hex digest}, ...]}
+    Frames are numbered in the order they are listed; mouth_centers is optional.
+    """
+    try:
+        spec = (request.get_json(silent=True) or {}).get('files') or []
+        counts = {field: 0 for field in UPLOAD_FIELDS}
+        for entry in spec:
+            field = entry.get('field')
+            filename = entry.get('filename') or ''
+            size = entry.get('size')
+            if field not in UPLOAD_FIELDS:
+                return jsonify({'error': f'Unknown upload field: {field}'}), 400
+            if not allowed_file(secure_filename(filename), UPLOAD_FIELDS[field]):
+                return jsonify({'error': f'Invalid {field} file type: {filename}'}), 400
+            if not isinstance(size, int) or size < 0 or size > MAX_UPLOAD_FILE_BYTES:
+                return jsonify({'error': f'Invalid size for {filename}'}), 400
+            counts[field] += 1
+        for field in ('video', 'audio', 'face_reference'):
+            if counts[field] != 1:
+                return jsonify({'error': f'Exactly one {field} file is required'}), 400
+        if counts['frames'] == 0:
+            return jsonify({'error': 'No frame files provided'}), 400
+        if counts['mouth_centers'] > 1:
+            return jsonify({'error': 'At most one mouth_centers file is allowed'}), 400
+        
+        upload_id = str(uuid.uuid4())
+        animation_folder = os.path.join(UPLOAD_FOLDER, upload_id)
+        os.makedirs(animation_folder, exist_ok=True)
+        
+        files = []
+        frame_index = 0
+        for entry in spec:
+            if entry['field'] == 'frames':
+                frame_index += 1
+                path = upload_destination(entry['filename'], 'frame', animation_folder, frame_index)
+            else:
+                path = upload_destination(entry['filename'], entry['field'], animation_folder)
+            files.append({
+                'field': entry['field'],
+                'filename': entry['filename'],
+                'size': entry['size'],
+                'sha256': entry.get('sha256'),
+                'path': path,
+            })
+        
+        session = upload_store.create(upload_id, animation_folder, files)
+        print(f"Opened upload {upload_id}: {len(files)} files, "
+              f"{sum(f['size'] for f in files) / (1024 * 1024):.1f} MB")
+        return jsonify(session.to_dict()), 201
+    except Exception as e:
+        print(f"Error in create_upload: {e}")
+        return jsonify({'error': f'Server error: {str(e)}'}), 500
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+    """Session state, including the chunks still missing per file (used to resume)"""
+    session = upload_store.get(upload_id)
+    if session is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    return jsonify(session.to_dict())
+
+def _read_body(limit):
+    """Read up to limit + 1 bytes of the raw request body"""
+    parts = []
+    remaining = limit + 1
+    while remaining > 0:
+        block = request.stream.read(min(remaining, 1024 * 1024))
+        if not block:
+            break
+        parts.append(block)
+        remaining -= len(block)
+    return b''.join(parts)
+
+@app.route('/api/uploads/<upload_id>/files/<int:file_id>/chunks/<int:chunk_index>', methods=['PUT'])
+def put_upload_chunk(upload_id, file_id, chunk_index):
+    """Write one chunk (raw request body) at its offset in the destination file"""
+    session = upload_store.get(upload_id)
+    if session is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    try:
+        data = _read_body(session.chunk_size)
+        received, complete = session.write_chunk(file_id, chunk_index, data)
+    except upload_sessions.UploadError as e:
+        return jsonify({'error': str(e)}), 400
+    UPLOAD_BYTES.inc(len(data))
+    return jsonify({'file_id': file_id, 'chunk': chunk_index, 'received': received, 'complete': complete})
+
+@app.route('/api/uploads/<upload_id>/finalize', methods=['POST'])
+def finalize_upload(upload_id):
+    """Verify the upload and start processing it, like /api/submit"""
+    session = upload_store.get(upload_id)
+    if session is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    fields = {f['field'] for f in session.files}
+    missing = [field for field in ('video', 'audio', 'face_reference', 'frames') if field not in fields]
+    if missing:
+        return jsonify({'error': f"Upload is missing required files: {', '.join(missing)}"}), 400
+    try:
+        results = session.finish()
+    except upload_sessions.UploadError as e:
+        return jsonify({'error': str(e)}), 409
+    
+    paths = {}
+    frame_paths = []
+    for field, path, digest in results:
+        print(f"  {field}: {path} (sha256 {digest[:12]})")
+        if field == 'frames':
+            frame_paths.append((path, len(frame_paths)))
+        else:
+            paths[field] = path
+    original_audio_filename = next(f['filename'] for f in session.files if f['field'] == 'audio')
+    
+    try:
+        response = queue_animation(upload_id, session.folder, paths['video'], paths['audio'],
+                                   paths['face_reference'], frame_paths, original_audio_filename,
+                                   paths.get('mouth_centers'))
+    except Exception as e:
+        print(f"Error finalizing upload {upload_id}: {e}")
+        response = jsonify({'error': str(e)}), 500
+    if response[1] != 202:
+        # Keep the session and its chunks so the client can retry finalize without re-uploading
+        try:
+            if db.get_animation(upload_id) is not None:
+                db.delete_animation(upload_id)
+        except Exception as e:
+            print(f"Error removing animation record {upload_id}: {e}")
+        session.reopen()
+        return response
+    upload_store.discard(upload_id)
+    return response
+
+def cacheable_json(payload, status=200):
+    """
+    JSON response with a weak ETag, conditional GET and gzip.
+    
+    A repeat poll whose If-None-Match still matches gets an empty 304; larger
+    bodies are gzip-compressed for clients that accept it.
+    """
+    response = jsonify(payload)
+    response.status_code = status
+    response.set_etag(hashlib.sha1(response.get_data()).hexdigest(), weak=True)
+    # Status and progress change, so clients may keep the body but must revalidate
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    response.make_conditional(request)
+    if (response.status_code == 200 and request.accept_encodings['gzip']
+            and len(response.get_data()) >= GZIP_MIN_BYTES):
+        response.set_data(gzip.compress(response.get_data(), compresslevel=5))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+def frame_page_args(allow_none=False):
+    """
+    Parse the ?frames=, ?after= and ?limit= listing parameters.
+    
+    Returns:
+        (kind, after, limit)
+    
+    Raises:
+        ValueError: with a message for a 400 response
+    """
+    kinds = db.FRAME_KINDS + (('none',) if allow_none else ())
+    kind = request.args.get('frames', 'all')
+    if kind not in kinds:
+        raise ValueError(f"frames must be one of: {', '.join(kinds)}")
+    try:
+        after = int(request.args['after']) if request.args.get('after') else None
+        limit = int(request.args.get('limit', FRAME_PAGE_SIZE))
+    except ValueError:
+        raise ValueError('after and limit must be integers')
+    if not 1 <= limit <= MAX_FRAME_PAGE_SIZE:
+        raise ValueError(f'limit must be between 1 and {MAX_FRAME_PAGE_SIZE}')
+    return kind, after, limit
+
+def frame_page(animation_id, kind, after, limit):
+    """One page of frames plus the cursor and URL of the next page"""
+    frames, next_after = db.get_frames_page(animation_id, kind, after, limit)
+    next_url = None
+    if next_after is not None:
+        next_url = f'{request.path}?frames={kind}&after={next_after}&limit={limit}'
+    return {
+        'frames': [{'path': path, 'order': order} for path, order in frames],
+        'next_after': next_after,
+        'next_url': next_url,
+    }
+
+def stored_video_info(animation):
+    """
+    Video metadata from the animations row.
+    
+    Animations ingested before it was recorded are probed once here and the
+    result is stored, so the video is never opened twice.
+    """
+    if animation.get('video_fps') is None:
+        video_path = animation['video_path']
+        info = probe_video_info(video_path) if video_path and os.path.exists(video_path) else None
+        if not info:
+            return {}
+        db.set_video_info(animation['id'], **info)
+    else:
+        info = {
+            'fps': animation['video_fps'],
+            'frame_count': animation['video_frame_count'],
+            'width': animation['video_width'],
+            'height': animation['video_height'],
+        }
+    return {
+        'fps': info['fps'],
+        'total_frames': info['frame_count'],
+        'width': info['width'],
+        'height': info['height'],
+        'duration_seconds': info['frame_count'] / info['fps'] if info['fps'] > 0 else 0
+    }
+
+@app.route('/api/animations/<animation_id>/status', methods=['GET'])
+def get_animation_status(animation_id):
+    """Get the processing stage and per-stage progress for an animation"""
+    status = db.get_status(animation_id)
+    
+    if status is None:
+        return jsonify({'error': 'Animation not found'}), 404
+    
+    # In-memory progress is lost on restart; the DB status is authoritative
+    progress = job_queue.get(animation_id) or {}
+    
+    return cacheable_json({
+        'animation_id': animation_id,
+        'status': status,
+        'stages': jobs.STAGES,
+        'done': status in (jobs.STATUS_READY, jobs.STATUS_FAILED),
+        'progress': {
+            'frames_extracted': progress.get('frames_extracted', 0),
+            'total_frames': progress.get('total_frames'),
+            'audio_converted': progress.get('audio_converted', False),
+        },
+        'error': progress.get('error'),
+        'queued_at': progress.get('queued_at'),
+        'started_at': progress.get('started_at'),
+        'finished_at': progress.get('finished_at'),
+    })
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint to verify server is running"""
@@ -489,95 +1208,216 @@ def health_check():
 
 @app.route('/api/animations/<animation_id>/frames', methods=['GET'])
 def get_video_frames(animation_id):
-    """Get information about extracted video frames for an animation"""
+    """
+    Get information about extracted video frames for an animation.
+    
+    Eagerly extracted frames are listed one keyset page at a time from the
+    database (?after=<order>&limit=N); video metadata comes from the
+    animations row instead of opening the video.
+    """
     animation_folder = os.path.join(UPLOAD_FOLDER, animation_id)
     video_frames_folder = os.path.join(animation_folder, 'video_frames')
     
-    if not os.path.exists(video_frames_folder):
-        return jsonify({'error': 'Video frames folder not found'}), 404
+    # Store-mode animations keep every frame in one file; only the header is read
+    store_file = frame_store.store_path(animation_folder)
+    if os.path.exists(store_file):
+        frame_count, width, height, channels, compression = frame_store.read_header(store_file)
+        animation = db.get_animation_info(animation_id)
+        return cacheable_json({
+            'animation_id': animation_id,
+            'mode': 'store',
+            'extracted_frame_count': frame_count,
+            'frame_url': f'/api/animations/{animation_id}/frames/<n>',
+            'frame_store': store_file,
+            'frame_shape': [height, width, channels],
+            'compression': 'zlib' if compression == frame_store.COMPRESSION_ZLIB else 'raw',
+            'video_info': stored_video_info(animation) if animation else {}
+        })
     
-    # Get all frame files
-    frame_files = sorted([f for f in os.listdir(video_frames_folder) if f.endswith('.png')])
-    frame_count = len(frame_files)
+    # ROI-mode animations store mouth crops; full frames are decoded on demand
+    roi_meta = mouth_roi.load_roi_meta(animation_folder)
+    if roi_meta:
+        return cacheable_json({
+            'animation_id': animation_id,
+            'mode': 'roi',
+            'extracted_frame_count': roi_meta['frame_count'],
+            'frame_url': f'/api/animations/{animation_id}/frames/<n>',
+            'mouth_roi_url': f'/api/animations/{animation_id}/mouth_roi',
+            'roi_size': [roi_meta['roi_width'], roi_meta['roi_height']],
+            'video_info': {
+                'fps': roi_meta['fps'],
+                'total_frames': roi_meta['frame_count'],
+                'width': roi_meta['frame_width'],
+                'height': roi_meta['frame_height'],
+                'duration_seconds': roi_meta['frame_count'] / roi_meta['fps'] if roi_meta['fps'] > 0 else 0
+            }
+        })
     
-    # Get video file info
-    video_folder = os.path.join(animation_folder, 'video')
-    video_files = [f for f in os.listdir(video_folder) if f.startswith('video.')] if os.path.exists(video_folder) else []
-    video_path = os.path.join(video_folder, video_files[0]) if video_files else None
+    # Lazy-mode animations have a seek index instead of extracted frames
+    seek_index = frame_cache.load_seek_index(animation_folder)
+    if seek_index and not os.path.exists(video_frames_folder):
+        return cacheable_json({
+            'animation_id': animation_id,
+            'mode': 'lazy',
+            'extracted_frame_count': seek_index['frame_count'],
+            'frame_url': f'/api/animations/{animation_id}/frames/<n>',
+            'video_info': {
+                'fps': seek_index['fps'],
+                'total_frames': seek_index['frame_count'],
+                'width': seek_index['width'],
+                'height': seek_index['height'],
+                'duration_seconds': seek_index['frame_count'] / seek_index['fps'] if seek_index['fps'] > 0 else 0
+            }
+        })
     
-    video_info = {}
-    if video_path and CV2_AVAILABLE and os.path.exists(video_path):
-        try:
-            cap = cv2.VideoCapture(video_path)
-            if cap.isOpened():
-                video_info = {
-                    'fps': float(cap.get(cv2.CAP_PROP_FPS)),
-                    'total_frames': int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
-                    'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
-                    'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
-                    'duration_seconds': int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) / cap.get(cv2.CAP_PROP_FPS) if cap.get(cv2.CAP_PROP_FPS) > 0 else 0
-                }
-                cap.release()
-        except Exception as e:
-            print(f"Error getting video info: {e}")
+    animation = db.get_animation_info(animation_id)
+    if animation is None or not os.path.exists(video_frames_folder):
+        return jsonify({'error': 'Video frames folder not found'}), 404
     
-    return jsonify({
+    try:
+        _, after, limit = frame_page_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Extracted frame rows, one page at a time; the folder itself is never listed
+    page = frame_page(animation_id, 'extracted', after, limit)
+    _, frame_count = db.count_frames(animation_id)
+    
+    return cacheable_json({
         'animation_id': animation_id,
+        'mode': 'eager',
         'extracted_frame_count': frame_count,
-        'frame_files': frame_files[:10],  # First 10 frame filenames
-        'video_info': video_info,
+        'frame_files': [os.path.basename(frame['path']) for frame in page['frames']],
+        **page,
+        'video_info': stored_video_info(animation),
         'frames_folder': video_frames_folder
+    })
+
+@app.route('/api/animations/<animation_id>/frames/<int:frame_number>', methods=['GET'])
+def get_video_frame(animation_id, frame_number):
+    """Return a single video frame (0-based) as PNG from the frame store, seek index or video_frames/"""
+    animation_folder = os.path.join(UPLOAD_FOLDER, animation_id)
+    store_file = frame_store.store_path(animation_folder)
+    
+    if os.path.exists(store_file):
+        if not CV2_AVAILABLE:
+            return jsonify({'error': 'opencv-python is not installed'}), 500
+        with frame_store.FrameStore(store_file) as store:
+            if frame_number < 0 or frame_number >= len(store):
+                return jsonify({'error': f"Frame {frame_number} out of range (0-{len(store) - 1})"}), 404
+            ok, encoded = cv2.imencode('.png', store[frame_number])
+        if not ok:
+            return jsonify({'error': f'Failed to encode frame {frame_number}'}), 500
+        return Response(encoded.tobytes(), mimetype='image/png', headers={'Cache-Control': 'public, max-age=86400'})
+    
+    seek_index = frame_cache.load_seek_index(animation_folder)
+    
+    if not seek_index:
+        # Eagerly extracted animations already have the frame on disk
+        frame_path = os.path.join(animation_folder, 'video_frames', f"frame_{frame_number+1:06d}.png")
+        if os.path.exists(frame_path):
+            return send_file(os.path.abspath(frame_path), mimetype='image/png')
+        return jsonify({'error': 'Frame not found'}), 404
+    
+    if frame_number < 0 or frame_number >= seek_index['frame_count']:
+        return jsonify({'error': f"Frame {frame_number} out of range (0-{seek_index['frame_count'] - 1})"}), 404
+    
+    if not CV2_AVAILABLE:
+        return jsonify({'error': 'opencv-python is not installed'}), 500
+    
+    data = lazy_frames.get_frame(animation_id, frame_number, seek_index)
+    if data is None:
+        return jsonify({'error': f'Failed to decode frame {frame_number}'}), 500
+    
+    return Response(data, mimetype='image/png', headers={'Cache-Control': 'public, max-age=86400'})
+
+@app.route('/api/animations/<animation_id>/mouth_roi', methods=['GET'])
+def get_mouth_roi(animation_id):
+    """Mouth crop size and the per-frame crop offsets (top-left x, y) of an roi-mode animation"""
+    animation_folder = os.path.join(UPLOAD_FOLDER, animation_id)
+    roi_meta = mouth_roi.load_roi_meta(animation_folder)
+    if not roi_meta:
+        return jsonify({'error': 'Animation has no mouth ROI'}), 404
+    return jsonify({
+        'animation_id': animation_id,
+        'frame_count': roi_meta['frame_count'],
+        'roi_size': [roi_meta['roi_width'], roi_meta['roi_height']],
+        'frame_size': [roi_meta['frame_width'], roi_meta['frame_height']],
+        'smoothing_window': roi_meta['smoothing_window'],
+        'offsets': mouth_roi.load_offsets(animation_folder).tolist(),
+        'crop_url': f'/api/animations/{animation_id}/mouth_roi/<n>'
     }), 200
 
+@app.route('/api/animations/<animation_id>/mouth_roi/<int:frame_number>', methods=['GET'])
+def get_mouth_roi_frame(animation_id, frame_number):
+    """One mouth crop (0-based) as PNG; X-ROI-X / X-ROI-Y give its position in the full frame"""
+    animation_folder = os.path.join(UPLOAD_FOLDER, animation_id)
+    store_file = mouth_roi.roi_paths(animation_folder)[0]
+    if not os.path.exists(store_file):
+        return jsonify({'error': 'Animation has no mouth ROI'}), 404
+    if not CV2_AVAILABLE:
+        return jsonify({'error': 'opencv-python is not installed'}), 500
+    with frame_store.FrameStore(store_file) as store:
+        if frame_number < 0 or frame_number >= len(store):
+            return jsonify({'error': f"Frame {frame_number} out of range (0-{len(store) - 1})"}), 404
+        ok, encoded = cv2.imencode('.png', store[frame_number])
+    if not ok:
+        return jsonify({'error': f'Failed to encode crop {frame_number}'}), 500
+    x, y = mouth_roi.load_offsets(animation_folder)[frame_number]
+    return Response(encoded.tobytes(), mimetype='image/png', headers={
+        'Cache-Control': 'public, max-age=86400',
+        'X-ROI-X': str(int(x)),
+        'X-ROI-Y': str(int(y))
+    })
+
 @app.route('/api/animations/<animation_id>', methods=['GET'])
 def get_animation(animation_id):
-    """Get animation details from database"""
-    conn = sqlite3.connect('animations.db')
-    c = conn.cursor()
+    """
+    Get animation details from database.
     
-    c.execute('SELECT * FROM animations WHERE id = ?', (animation_id,))
-    animation = c.fetchone()
+    Frames are returned one keyset page at a time: ?frames=all|user|extracted|none
+    picks the uploaded mouth frames, the extracted video frames, both or
+    neither; ?after=<order> continues from a page's next_after and ?limit=
+    sets the page size.
+    """
+    try:
+        kind, after, limit = frame_page_args(allow_none=True)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    animation = db.get_animation_info(animation_id)
     
     if not animation:
-        conn.close()
         return jsonify({'error': 'Animation not found'}), 404
     
-    c.execute('SELECT frame_path, frame_order FROM frames WHERE animation_id = ? ORDER BY frame_order', (animation_id,))
-    frames = c.fetchall()
-    
-    conn.close()
-    
-    # Handle both old and new database schemas
-    if len(animation) >= 6:
-        # New schema with face_reference_path
-        return jsonify({
-            'id': animation[0],
-            'video_path': animation[1],
-            'audio_path': animation[2],
-            'face_reference_path': animation[3],
-            'created_at': animation[4],
-            'status': animation[5],
-            'frames': [{'path': f[0], 'order': f[1]} for f in frames]
-        }), 200
-    else:
-        # Old schema without face_reference_path
-        return jsonify({
-            'id': animation[0],
-            'video_path': animation[1],
-            'audio_path': animation[2],
-            'face_reference_path': None,
-            'created_at': animation[3],
-            'status': animation[4],
-            'frames': [{'path': f[0], 'order': f[1]} for f in frames]
-        }), 200
+    user_count, extracted_count = db.count_frames(animation_id)
+    payload = {
+        'id': animation['id'],
+        'video_path': animation['video_path'],
+        'audio_path': animation['audio_path'],
+        # Old databases may predate face_reference_path
+        'face_reference_path': animation.get('face_reference_path'),
+        'created_at': animation['created_at'],
+        'status': animation['status'],
+        'video_info': stored_video_info(animation),
+        'frame_counts': {'user': user_count, 'extracted': extracted_count},
+    }
+    if kind != 'none':
+        payload.update(frame_page(animation_id, kind, after, limit))
+    return cacheable_json(payload)
 
 if __name__ == '__main__':
     # Change this port if needed
     PORT = 5001
     
     print("Initializing database...")
-    init_db()
+    db.init_db()
     print("Database initialized!")
+    # The debug reloader runs the server in a child process; only that one sweeps
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        storage_manager.start()
+        print(f"Storage sweeper running every {storage_manager.sweep_seconds:.0f}s "
+              f"(quota: {storage_manager.quota_bytes or 'unlimited'} bytes)")
     print(f"Starting Flask server on http://localhost:{PORT}")
     print("Make sure your frontend is running on http://localhost:8000")
     try:
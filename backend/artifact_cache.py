@@ -0,0 +1,248 @@
+"""
+Content-keyed cache of ingest artifacts shared across animations.
+
+Each ingest stage output (extracted frames, the frame store, the decoded
+audio buffer and WAV, ...) is stored once under a key hashed from the
+contents of the stage's inputs and its parameters:
+
+    artifacts/<kind>/<key>/
+        artifact.json        kind, key, inputs, stage metadata
+        video_frames/...     files laid out as they appear in an animation folder
+
+A new animation whose video (or audio) bytes match an earlier upload gets
+the cached files hard-linked into its own folder instead of running the
+stage again, so a re-submission that only changes the mouth frames skips
+frame extraction and audio decoding entirely, and one that changes only the
+audio re-runs only the audio stage. Transcripts and alignments downstream of
+the WAV are cached by the whisper and aligner services, keyed by the same
+audio content.
+
+Entries are built in a temporary directory and renamed into place, so a
+partially written artifact is never visible and concurrent builds of the
+same key (threads or processes) end with a single winner.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+import audio_ingest
+
+ARTIFACT_CACHE_DIR = os.environ.get('ARTIFACT_CACHE_DIR', 'artifacts')
+MANIFEST_FILENAME = 'artifact.json'
+# Bump when a stage's output format changes so old entries stop matching
+ARTIFACT_VERSION = 1
+
+
+def file_digest(path, block_size=1024 * 1024):
+    """sha256 hex digest of a file's contents"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def artifact_key(kind, inputs, params=None):
+    """
+    Key for a stage output.
+
+    Args:
+        kind: Stage name ('frames_eager', 'audio', ...)
+        inputs: Dict of input name -> content digest
+        params: Dict of parameters that change the output (fps, format, ...)
+    """
+    payload = json.dumps({'kind': kind, 'version': ARTIFACT_VERSION, 'inputs': inputs, 'params': params or {}},
+                         sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ArtifactCache:
+    """
+    Args:
+        root: Cache root (<root>/<kind>/<key>/); keep it on the same filesystem
+              as the upload folder so artifacts can be hard-linked, not copied
+    """
+
+    def __init__(self, root=ARTIFACT_CACHE_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, kind, key):
+        return os.path.join(self.root, kind, key)
+
+    def _key_lock(self, kind, key):
+        with self._lock:
+            return self._key_locks.setdefault((kind, key), threading.Lock())
+
+    def get(self, kind, key):
+        """Return the manifest of a finished entry, or None"""
+        try:
+            with open(os.path.join(self.path(kind, key), MANIFEST_FILENAME)) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def fetch(self, kind, key, build, inputs=None, materialize_into=None, rewrite_json=None):
+        """
+        Return a cached entry, building it on a miss.
+
+        build(work_dir) writes the stage output into work_dir using the
+        animation-folder layout and returns a metadata dict to keep it, or
+        None to discard it (nothing is cached, e.g. when no frames could be
+        decoded). Exceptions propagate and leave nothing behind.
+
+        With materialize_into, the entry's files are linked into that
+        animation folder (see materialize) before the key lock is released,
+        so remove() can't delete the entry while they are being linked.
+
+        Returns:
+            (entry_dir, metadata, hit); entry_dir and metadata are None when
+            build discarded its output
+        """
+        with self._key_lock(kind, key):
+            entry_dir, meta, hit = self._fetch_locked(kind, key, build, inputs)
+            if entry_dir and materialize_into:
+                materialize(entry_dir, materialize_into, rewrite_json)
+            return entry_dir, meta, hit
+
+    def _fetch_locked(self, kind, key, build, inputs):
+        manifest = self.get(kind, key)
+        if manifest is not None:
+            entry_dir = self.path(kind, key)
+            # Directory mtime records last use for the storage manager's LRU eviction
+            os.utime(entry_dir)
+            with self._lock:
+                self.hits += 1
+            return entry_dir, manifest['meta'], True
+
+        with self._lock:
+            self.misses += 1
+        kind_dir = os.path.join(self.root, kind)
+        os.makedirs(kind_dir, exist_ok=True)
+        work_dir = os.path.join(kind_dir, f'.tmp-{key}-{uuid.uuid4().hex}')
+        os.makedirs(work_dir)
+        try:
+            meta = build(work_dir)
+            if meta is None:
+                return None, None, False
+            with open(os.path.join(work_dir, MANIFEST_FILENAME), 'w') as f:
+                json.dump({'kind': kind, 'key': key, 'inputs': inputs or {}, 'meta': meta,
+                           'created_at': time.time()}, f)
+            entry_dir = self.path(kind, key)
+            try:
+                os.rename(work_dir, entry_dir)
+            except OSError:
+                # Another process finished the same key first; its entry is identical
+                if self.get(kind, key) is None:
+                    raise
+            return entry_dir, meta, False
+        finally:
+            if os.path.isdir(work_dir):
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+    def entries(self):
+        """Yield (kind, key, entry_dir, last_used) for every finished entry"""
+        if not os.path.isdir(self.root):
+            return
+        for kind in os.listdir(self.root):
+            kind_dir = os.path.join(self.root, kind)
+            if not os.path.isdir(kind_dir):
+                continue
+            for key in os.listdir(kind_dir):
+                entry_dir = os.path.join(kind_dir, key)
+                if key.startswith('.tmp-') or not os.path.isdir(entry_dir):
+                    continue
+                try:
+                    yield kind, key, entry_dir, os.stat(entry_dir).st_mtime
+                except FileNotFoundError:
+                    continue
+
+    def remove(self, kind, key):
+        """
+        Delete an entry; animations keep their hard-linked copies.
+
+        Returns:
+            Bytes freed on disk (files no animation still links to)
+        """
+        with self._key_lock(kind, key):
+            entry_dir = self.path(kind, key)
+            if not os.path.isdir(entry_dir):
+                return 0
+            # Rename first so a concurrent fetch never sees a half-deleted entry
+            doomed = os.path.join(self.root, kind, f'.tmp-{key}-{uuid.uuid4().hex}')
+            os.rename(entry_dir, doomed)
+        return remove_tree(doomed)
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+
+def remove_tree(path):
+    """
+    Delete a file or directory tree.
+
+    Returns:
+        Bytes actually freed: hard-linked files only count once their last link goes
+    """
+    freed = 0
+    if os.path.isfile(path) or os.path.islink(path):
+        st = os.lstat(path)
+        os.remove(path)
+        return st.st_size if st.st_nlink == 1 else 0
+    for dirpath, _, filenames in os.walk(path, topdown=False):
+        for filename in filenames:
+            file_path = os.path.join(dirpath, filename)
+            try:
+                st = os.lstat(file_path)
+                os.remove(file_path)
+            except FileNotFoundError:
+                continue
+            if st.st_nlink == 1:
+                freed += st.st_size
+        shutil.rmtree(dirpath, ignore_errors=True)
+    return freed
+
+
+def materialize(entry_dir, animation_folder, rewrite_json=None):
+    """
+    Hard-link every file of a cache entry into an animation folder.
+
+    JSON files are copied instead, with the keys in rewrite_json replaced
+    (e.g. the seek index's video_path must name this animation's video).
+    Files already in the folder, such as an upload named audio.wav, are kept.
+
+    Returns:
+        Number of files placed
+    """
+    placed = 0
+    for dirpath, _, filenames in os.walk(entry_dir):
+        relative = os.path.relpath(dirpath, entry_dir)
+        target_dir = animation_folder if relative == '.' else os.path.join(animation_folder, relative)
+        os.makedirs(target_dir, exist_ok=True)
+        for filename in filenames:
+            if relative == '.' and filename == MANIFEST_FILENAME:
+                continue
+            source = os.path.join(dirpath, filename)
+            target = os.path.join(target_dir, filename)
+            if os.path.exists(target):
+                continue
+            if filename.endswith('.json') and rewrite_json:
+                with open(source) as f:
+                    data = json.load(f)
+                data.update({k: v for k, v in rewrite_json.items() if k in data})
+                with open(target, 'w') as f:
+                    json.dump(data, f)
+            else:
+                audio_ingest.link_or_copy(source, target)
+            placed += 1
+    return placed
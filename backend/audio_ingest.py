@@ -0,0 +1,107 @@
+"""
+Decode-once audio ingest shared by every consumer of an upload.
+
+The uploaded audio is decoded a single time through an ffmpeg pipe into a
+NumPy float32 buffer at the canonical 16 kHz mono rate (what Whisper and MFA
+both work at) and persisted as one .npy file. Consumers either memory-map
+that file (load_audio) or, when they need a real WAV on disk (MFA), ask for
+one with ensure_wav, which writes 16-bit PCM straight from the buffer
+without another ffmpeg run.
+"""
+
+import os
+import subprocess
+import wave
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+AUDIO_BUFFER_FILENAME = 'audio_16k.npy'
+
+
+def decode_audio(input_path, sample_rate=SAMPLE_RATE, timeout=300):
+    """
+    Decode any ffmpeg-readable file to mono float32 samples in [-1, 1].
+
+    Args:
+        input_path: Path to the uploaded audio file
+        sample_rate: Output sample rate (default 16000 Hz)
+        timeout: Seconds before ffmpeg is killed (default 5 minutes)
+
+    Returns:
+        1-D float32 NumPy array
+
+    Raises:
+        RuntimeError: if ffmpeg fails
+        FileNotFoundError: if ffmpeg is not installed
+    """
+    ffmpeg_cmd = [
+        'ffmpeg',
+        '-nostdin',
+        '-i', input_path,
+        '-ac', '1',
+        '-ar', str(sample_rate),
+        '-f', 'f32le',
+        '-'
+    ]
+    result = subprocess.run(ffmpeg_cmd, capture_output=True, timeout=timeout)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to decode {input_path}: {result.stderr.decode(errors='replace')[-2000:]}")
+    return np.frombuffer(result.stdout, dtype=np.float32)
+
+
+def ingest_audio(input_path, output_folder, sample_rate=SAMPLE_RATE):
+    """
+    Decode an upload once and persist the canonical buffer.
+
+    Args:
+        input_path: Path to the uploaded audio file
+        output_folder: Folder to write audio_16k.npy into
+        sample_rate: Canonical sample rate (default 16000 Hz)
+
+    Returns:
+        (buffer_path, duration_seconds)
+    """
+    samples = decode_audio(input_path, sample_rate)
+    os.makedirs(output_folder, exist_ok=True)
+    buffer_path = os.path.join(output_folder, AUDIO_BUFFER_FILENAME)
+    np.save(buffer_path, samples)
+    return buffer_path, len(samples) / sample_rate
+
+
+def load_audio(buffer_path):
+    """Memory-map a canonical audio buffer (read-only, no copy)"""
+    return np.load(buffer_path, mmap_mode='r')
+
+
+def ensure_wav(buffer_path, wav_path, sample_rate=SAMPLE_RATE):
+    """
+    Write a 16-bit PCM mono WAV from the canonical buffer if it doesn't exist yet.
+
+    Returns:
+        wav_path
+    """
+    if os.path.exists(wav_path):
+        return wav_path
+    samples = load_audio(buffer_path)
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype('<i2')
+    tmp_path = wav_path + '.tmp'
+    with wave.open(tmp_path, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(pcm.tobytes())
+    os.replace(tmp_path, wav_path)
+    return wav_path
+
+
+def link_or_copy(src_path, dest_path):
+    """Hard-link src to dest (same filesystem), falling back to a copy"""
+    if os.path.exists(dest_path):
+        os.remove(dest_path)
+    try:
+        os.link(src_path, dest_path)
+    except OSError:
+        import shutil
+        shutil.copyfile(src_path, dest_path)
+    return dest_path
@@ -0,0 +1,401 @@
+"""
+SQLite data-access layer for the backend.
+
+Connections are pooled per thread and opened in WAL mode so the job workers
+can write while request threads read. Extracted video frames are stored as
+range rows (one row per contiguous frame_NNNNNN run) instead of one row per
+frame; get_frames() expands them back into the same (path, order) list and
+get_frames_page() reads one keyset page without expanding the rest.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+DB_PATH = os.environ.get('ANIMATIONS_DB', 'animations.db')
+
+# frame_order values from here up are extracted video frames, below are user frames
+EXTRACTED_FRAME_ORDER_START = 10000
+
+# Probed from the source video at ingest so listings never open the video
+VIDEO_INFO_COLUMNS = (
+    ('video_fps', 'REAL'),
+    ('video_frame_count', 'INTEGER'),
+    ('video_width', 'INTEGER'),
+    ('video_height', 'INTEGER'),
+)
+
+# Disk accounting for the storage manager
+STORAGE_COLUMNS = (
+    ('size_bytes', 'INTEGER'),
+    ('last_accessed_at', 'REAL'),
+    ('artifacts_evicted_at', 'REAL'),
+)
+
+# Frame listing filters accepted by get_frames_page
+FRAME_KINDS = ('all', 'user', 'extracted')
+
+_local = threading.local()
+
+# Matches extracted frame filenames written by extract_video_frames
+_EXTRACTED_FRAME_RE = re.compile(r'^frame_(\d+)\.(\w+)$')
+
+
+def get_connection():
+    """Return this thread's connection, opening it on first use"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        # WAL makes NORMAL durable across application crashes, only power loss can drop a commit
+        conn.execute('PRAGMA synchronous=NORMAL')
+        _local.conn = conn
+    return conn
+
+
+def close_connection():
+    """Close this thread's connection, if any"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+
+@contextmanager
+def transaction():
+    """Yield a cursor on this thread's connection; commit on success, roll back on error"""
+    conn = get_connection()
+    c = conn.cursor()
+    try:
+        yield c
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        c.close()
+
+
+def init_db():
+    with transaction() as c:
+        # Create tables if they don't exist
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS animations (
+                id TEXT PRIMARY KEY,
+                video_path TEXT NOT NULL,
+                audio_path TEXT NOT NULL,
+                face_reference_path TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                status TEXT DEFAULT 'processing'
+            )
+        ''')
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS frames (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                animation_id TEXT NOT NULL,
+                frame_path TEXT NOT NULL,
+                frame_order INTEGER NOT NULL,
+                FOREIGN KEY (animation_id) REFERENCES animations (id)
+            )
+        ''')
+        # A run of frame_count files folder/frame_{first_number + i:06d}.ext
+        # stored at frame_order start_order + i
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS frame_ranges (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                animation_id TEXT NOT NULL,
+                start_order INTEGER NOT NULL,
+                frame_count INTEGER NOT NULL,
+                folder TEXT NOT NULL,
+                first_number INTEGER NOT NULL,
+                extension TEXT NOT NULL,
+                FOREIGN KEY (animation_id) REFERENCES animations (id)
+            )
+        ''')
+        c.execute('''
+            CREATE INDEX IF NOT EXISTS idx_frames_animation_order
+            ON frames (animation_id, frame_order)
+        ''')
+        c.execute('''
+            CREATE INDEX IF NOT EXISTS idx_frame_ranges_animation_order
+            ON frame_ranges (animation_id, start_order)
+        ''')
+
+        # Migrate existing database: add face_reference_path column if it doesn't exist
+        try:
+            # Check if column exists by trying to select it
+            c.execute('SELECT face_reference_path FROM animations LIMIT 1')
+        except sqlite3.OperationalError:
+            # Column doesn't exist, add it
+            print("Migrating database: adding face_reference_path column...")
+            c.execute('ALTER TABLE animations ADD COLUMN face_reference_path TEXT')
+            print("Migration complete!")
+
+        # Migrate existing database: video metadata probed once at ingest, storage accounting
+        columns = {row[1] for row in c.execute('PRAGMA table_info(animations)')}
+        for column, column_type in VIDEO_INFO_COLUMNS + STORAGE_COLUMNS:
+            if column not in columns:
+                print(f"Migrating database: adding {column} column...")
+                c.execute(f'ALTER TABLE animations ADD COLUMN {column} {column_type}')
+
+
+def encode_frame_ranges(frame_paths, start_order):
+    """
+    Compress an ordered list of extracted frame paths into contiguous ranges.
+
+    Args:
+        frame_paths: Frame paths in order, as returned by extract_video_frames
+        start_order: frame_order of the first path
+
+    Returns:
+        (ranges, leftovers) where ranges is a list of
+        (start_order, frame_count, folder, first_number, extension) tuples and
+        leftovers is a list of (frame_path, frame_order) for paths that do not
+        follow the frame_NNNNNN.ext naming scheme
+    """
+    ranges = []
+    leftovers = []
+    current = None  # [start_order, frame_count, folder, first_number, extension]
+
+    for offset, frame_path in enumerate(frame_paths):
+        order = start_order + offset
+        folder, filename = os.path.split(frame_path)
+        match = _EXTRACTED_FRAME_RE.match(filename)
+        if not match:
+            leftovers.append((frame_path, order))
+            if current:
+                ranges.append(tuple(current))
+                current = None
+            continue
+
+        number = int(match.group(1))
+        extension = match.group(2)
+        if (current and current[2] == folder and current[4] == extension
+                and current[0] + current[1] == order and current[3] + current[1] == number):
+            current[1] += 1
+        else:
+            if current:
+                ranges.append(tuple(current))
+            current = [order, 1, folder, number, extension]
+
+    if current:
+        ranges.append(tuple(current))
+    return ranges, leftovers
+
+
+def _expand_range(start_order, frame_count, folder, first_number, extension):
+    return [
+        (os.path.join(folder, f"frame_{first_number + i:06d}.{extension}"), start_order + i)
+        for i in range(frame_count)
+    ]
+
+
+def insert_animation(animation_id, video_path, audio_path, face_reference_path, status, frames=()):
+    """Insert an animation row and its user frames in one transaction"""
+    with transaction() as c:
+        c.execute('''
+            INSERT INTO animations (id, video_path, audio_path, face_reference_path, status)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (animation_id, video_path, audio_path, face_reference_path, status))
+        c.executemany('''
+            INSERT INTO frames (animation_id, frame_path, frame_order)
+            VALUES (?, ?, ?)
+        ''', [(animation_id, frame_path, frame_order) for frame_path, frame_order in frames])
+
+
+def insert_extracted_frames(animation_id, frame_paths, start_order=EXTRACTED_FRAME_ORDER_START):
+    """Store extracted video frames as range rows, falling back to per-frame rows"""
+    ranges, leftovers = encode_frame_ranges(frame_paths, start_order)
+    with transaction() as c:
+        c.executemany('''
+            INSERT INTO frame_ranges (animation_id, start_order, frame_count, folder, first_number, extension)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [(animation_id, *r) for r in ranges])
+        c.executemany('''
+            INSERT INTO frames (animation_id, frame_path, frame_order)
+            VALUES (?, ?, ?)
+        ''', [(animation_id, frame_path, frame_order) for frame_path, frame_order in leftovers])
+    return len(ranges), len(leftovers)
+
+
+def update_animation(animation_id, **fields):
+    """Update columns of an animation row"""
+    assignments = ', '.join(f"{column} = ?" for column in fields)
+    with transaction() as c:
+        c.execute(f'UPDATE animations SET {assignments} WHERE id = ?', (*fields.values(), animation_id))
+
+
+def get_animation(animation_id):
+    """Return the animation row as a tuple, or None"""
+    c = get_connection().cursor()
+    try:
+        c.execute('SELECT * FROM animations WHERE id = ?', (animation_id,))
+        return c.fetchone()
+    finally:
+        c.close()
+
+
+def get_animation_info(animation_id):
+    """Return the animation row as a dict keyed by column name, or None"""
+    c = get_connection().cursor()
+    try:
+        c.execute('SELECT * FROM animations WHERE id = ?', (animation_id,))
+        row = c.fetchone()
+        return dict(zip([d[0] for d in c.description], row)) if row else None
+    finally:
+        c.close()
+
+
+def set_video_info(animation_id, fps, frame_count, width, height):
+    """Store the probed video metadata of an animation"""
+    update_animation(animation_id, video_fps=fps, video_frame_count=frame_count,
+                     video_width=width, video_height=height)
+
+
+def get_status(animation_id):
+    """Return the animation's status, or None if it does not exist"""
+    c = get_connection().cursor()
+    try:
+        c.execute('SELECT status FROM animations WHERE id = ?', (animation_id,))
+        row = c.fetchone()
+        return row[0] if row else None
+    finally:
+        c.close()
+
+
+def get_frames(animation_id):
+    """Return every (frame_path, frame_order) for an animation, ordered by frame_order"""
+    c = get_connection().cursor()
+    try:
+        c.execute('SELECT frame_path, frame_order FROM frames WHERE animation_id = ? ORDER BY frame_order',
+                  (animation_id,))
+        frames = c.fetchall()
+        c.execute('''
+            SELECT start_order, frame_count, folder, first_number, extension
+            FROM frame_ranges WHERE animation_id = ? ORDER BY start_order
+        ''', (animation_id,))
+        ranges = c.fetchall()
+    finally:
+        c.close()
+
+    if not ranges:
+        return frames
+    for r in ranges:
+        frames.extend(_expand_range(*r))
+    frames.sort(key=lambda f: f[1])
+    return frames
+
+
+def _order_bounds(kind):
+    """[low, high) frame_order range covered by a listing filter"""
+    if kind == 'user':
+        return 0, EXTRACTED_FRAME_ORDER_START
+    if kind == 'extracted':
+        return EXTRACTED_FRAME_ORDER_START, 2 ** 62
+    return -2 ** 62, 2 ** 62
+
+
+def get_frames_page(animation_id, kind='all', after=None, limit=100):
+    """
+    One keyset page of an animation's frames, ordered by frame_order.
+
+    Only the rows and ranges the page touches are read, so a page costs the
+    same at the start and at the end of a long extraction.
+
+    Args:
+        kind: 'all', 'user' (uploaded mouth frames) or 'extracted' (video frames)
+        after: Return frames with frame_order > after (None starts at the beginning)
+        limit: Page size
+
+    Returns:
+        (frames, next_after) where frames is a list of (frame_path, frame_order)
+        and next_after is the cursor for the next page, or None on the last page
+    """
+    low, high = _order_bounds(kind)
+    if after is not None:
+        low = max(low, after + 1)
+    c = get_connection().cursor()
+    try:
+        c.execute('''
+            SELECT frame_path, frame_order FROM frames
+            WHERE animation_id = ? AND frame_order >= ? AND frame_order < ?
+            ORDER BY frame_order LIMIT ?
+        ''', (animation_id, low, high, limit + 1))
+        frames = c.fetchall()
+        # Every range holds at least one frame, so limit + 1 ranges always fill the page
+        c.execute('''
+            SELECT start_order, frame_count, folder, first_number, extension
+            FROM frame_ranges
+            WHERE animation_id = ? AND start_order + frame_count > ? AND start_order < ?
+            ORDER BY start_order LIMIT ?
+        ''', (animation_id, low, high, limit + 1))
+        ranges = c.fetchall()
+    finally:
+        c.close()
+
+    for start_order, frame_count, folder, first_number, extension in ranges:
+        # Expand only the part of the range at or after low, at most one page of it
+        skip = max(0, low - start_order)
+        count = min(frame_count - skip, high - start_order - skip, limit + 1)
+        if count > 0:
+            frames.extend(_expand_range(start_order + skip, count, folder, first_number + skip, extension))
+    frames.sort(key=lambda f: f[1])
+
+    if len(frames) > limit:
+        frames = frames[:limit]
+        return frames, frames[-1][1]
+    return frames, None
+
+
+def count_frames(animation_id):
+    """Return (user_frame_count, extracted_frame_count) without listing them"""
+    c = get_connection().cursor()
+    try:
+        c.execute('''
+            SELECT COALESCE(SUM(frame_order < ?), 0), COALESCE(SUM(frame_order >= ?), 0)
+            FROM frames WHERE animation_id = ?
+        ''', (EXTRACTED_FRAME_ORDER_START, EXTRACTED_FRAME_ORDER_START, animation_id))
+        user_count, extracted_count = c.fetchone()
+        c.execute('SELECT COALESCE(SUM(frame_count), 0) FROM frame_ranges WHERE animation_id = ?', (animation_id,))
+        extracted_count += c.fetchone()[0]
+    finally:
+        c.close()
+    return user_count, extracted_count
+
+
+def list_storage_rows():
+    """Return a dict per animation with the columns the storage manager needs"""
+    c = get_connection().cursor()
+    try:
+        c.execute('''
+            SELECT id, status, created_at, audio_path, video_path, size_bytes, last_accessed_at, artifacts_evicted_at
+            FROM animations
+        ''')
+        return [dict(zip([d[0] for d in c.description], row)) for row in c.fetchall()]
+    finally:
+        c.close()
+
+
+def set_last_accessed(access_times):
+    """Store last access times, a dict of animation_id -> epoch seconds"""
+    with transaction() as c:
+        c.executemany('UPDATE animations SET last_accessed_at = ? WHERE id = ?',
+                      [(accessed_at, animation_id) for animation_id, accessed_at in access_times.items()])
+
+
+def delete_animation(animation_id):
+    """Remove an animation row with all its frame rows"""
+    with transaction() as c:
+        c.execute('DELETE FROM frame_ranges WHERE animation_id = ?', (animation_id,))
+        c.execute('DELETE FROM frames WHERE animation_id = ?', (animation_id,))
+        c.execute('DELETE FROM animations WHERE id = ?', (animation_id,))
+
+
+def delete_extracted_frames(animation_id):
+    """Remove an animation's extracted frame rows (user frames are kept)"""
+    with transaction() as c:
+        c.execute('DELETE FROM frame_ranges WHERE animation_id = ?', (animation_id,))
+        c.execute('DELETE FROM frames WHERE animation_id = ? AND frame_order >= ?',
+                  (animation_id, EXTRACTED_FRAME_ORDER_START))
@@ -0,0 +1,244 @@
+"""
+Lazy, on-demand video frame decoding.
+
+Instead of writing every frame to video_frames/, lazy mode keeps only the
+source video plus a seek index (frame count, keyframe positions) built at
+ingest. Frames are decoded when requested, encoded once and kept in a
+memory-bounded LRU cache. Each video keeps an open cv2.VideoCapture so
+sequential reads continue decoding forward instead of re-seeking.
+"""
+
+import json
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+
+try:
+    import cv2
+    CV2_AVAILABLE = True
+except ImportError:
+    CV2_AVAILABLE = False
+
+SEEK_INDEX_FILENAME = 'seek_index.json'
+FRAME_CACHE_BYTES = int(os.environ.get('FRAME_CACHE_BYTES', 256 * 1024 * 1024))  # 256MB
+MAX_OPEN_READERS = int(os.environ.get('MAX_OPEN_READERS', 8))
+
+
+def seek_index_path(animation_folder):
+    return os.path.join(animation_folder, 'video', SEEK_INDEX_FILENAME)
+
+
+def _probe_keyframes(video_path):
+    """
+    List keyframe positions (presentation order) using ffprobe.
+
+    Returns:
+        (frame_count, keyframes) or None if ffprobe is unavailable or fails
+    """
+    ffprobe_cmd = [
+        'ffprobe',
+        '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,flags',
+        '-of', 'csv=p=0',
+        video_path
+    ]
+    try:
+        result = subprocess.run(ffprobe_cmd, capture_output=True, text=True, timeout=300)
+    except (FileNotFoundError, subprocess.TimeoutExpired) as e:
+        print(f"Warning: ffprobe unavailable for seek index ({e})")
+        return None
+    if result.returncode != 0:
+        print(f"Warning: ffprobe failed: {result.stderr}")
+        return None
+
+    # Packets come in decode order; sort by pts to get presentation order
+    packets = []
+    for line in result.stdout.splitlines():
+        parts = line.strip().split(',')
+        if len(parts) < 2 or parts[0] in ('', 'N/A'):
+            continue
+        packets.append((float(parts[0]), 'K' in parts[1]))
+    packets.sort(key=lambda p: p[0])
+    keyframes = [i for i, (_, is_key) in enumerate(packets) if is_key]
+    return len(packets), keyframes
+
+
+def build_seek_index(video_path, animation_folder):
+    """
+    Probe the video once at ingest and write its seek index next to it.
+
+    Args:
+        video_path: Path to the source video
+        animation_folder: uploads/<animation_id> folder
+
+    Returns:
+        The seek index dict, or None if the video could not be opened
+    """
+    if not CV2_AVAILABLE:
+        print("Error: opencv-python is not installed. Cannot build seek index.")
+        return None
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        print(f"Error: Could not open video file {video_path}")
+        return None
+    fps = float(cap.get(cv2.CAP_PROP_FPS))
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
+
+    probed = _probe_keyframes(video_path)
+    if probed:
+        # Packet count is exact, CAP_PROP_FRAME_COUNT is only an estimate from the container
+        frame_count, keyframes = probed
+    else:
+        keyframes = []
+
+    index = {
+        'video_path': video_path,
+        'fps': fps,
+        'frame_count': frame_count,
+        'width': width,
+        'height': height,
+        'keyframes': keyframes,
+    }
+    with open(seek_index_path(animation_folder), 'w') as f:
+        json.dump(index, f)
+    print(f"✓ Built seek index: {frame_count} frames, {len(keyframes)} keyframes")
+    return index
+
+
+def load_seek_index(animation_folder):
+    """Return the seek index for an animation, or None if it has none"""
+    path = seek_index_path(animation_folder)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _keyframe_before(keyframes, frame_number):
+    """Largest keyframe <= frame_number (binary search), 0 if unknown"""
+    lo, hi = 0, len(keyframes) - 1
+    best = 0
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        if keyframes[mid] <= frame_number:
+            best = keyframes[mid]
+            lo = mid + 1
+        else:
+            hi = mid - 1
+    return best
+
+
+class _VideoReader:
+    """An open VideoCapture plus the index of the frame its next read() returns"""
+
+    def __init__(self, video_path, keyframes):
+        self.cap = cv2.VideoCapture(video_path)
+        self.keyframes = keyframes
+        self.position = 0
+        self.lock = threading.Lock()
+
+    def read(self, frame_number):
+        with self.lock:
+            if frame_number < self.position or (
+                    self.keyframes and _keyframe_before(self.keyframes, frame_number) > self.position):
+                # Backwards, or a keyframe lies between us and the target:
+                # seeking is cheaper than decoding forward
+                seek_to = _keyframe_before(self.keyframes, frame_number) if self.keyframes else frame_number
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, seek_to)
+                self.position = seek_to
+            # Skip forward without converting the frames we don't need
+            while self.position < frame_number:
+                if not self.cap.grab():
+                    return None
+                self.position += 1
+            ret, frame = self.cap.read()
+            if not ret:
+                return None
+            self.position += 1
+            return frame
+
+    def close(self):
+        self.cap.release()
+
+
+class FrameCache:
+    """
+    Decodes frames on demand and keeps encoded frames in an LRU bounded by bytes.
+    """
+
+    def __init__(self, max_bytes=FRAME_CACHE_BYTES, max_readers=MAX_OPEN_READERS, image_format='png'):
+        self.max_bytes = max_bytes
+        self.max_readers = max_readers
+        self.image_format = image_format
+        self._lock = threading.Lock()
+        self._frames = OrderedDict()  # (animation_id, frame_number) -> encoded bytes
+        self._bytes = 0
+        self._readers = OrderedDict()  # animation_id -> _VideoReader
+        self.hits = 0
+        self.misses = 0
+
+    def _get_reader(self, animation_id, index):
+        with self._lock:
+            reader = self._readers.get(animation_id)
+            if reader is not None:
+                self._readers.move_to_end(animation_id)
+                return reader
+            reader = _VideoReader(index['video_path'], index.get('keyframes', []))
+            self._readers[animation_id] = reader
+            while len(self._readers) > self.max_readers:
+                _, evicted = self._readers.popitem(last=False)
+                with evicted.lock:
+                    evicted.close()
+            return reader
+
+    def get_frame(self, animation_id, frame_number, index):
+        """
+        Return the encoded frame as bytes, or None if it could not be decoded.
+
+        Args:
+            animation_id: Animation the frame belongs to
+            frame_number: 0-based frame index in presentation order
+            index: The animation's seek index (see build_seek_index)
+        """
+        key = (animation_id, frame_number)
+        with self._lock:
+            data = self._frames.get(key)
+            if data is not None:
+                self._frames.move_to_end(key)
+                self.hits += 1
+                return data
+            self.misses += 1
+
+        frame = self._get_reader(animation_id, index).read(frame_number)
+        if frame is None:
+            return None
+        ok, encoded = cv2.imencode(f'.{self.image_format}', frame)
+        if not ok:
+            return None
+        data = encoded.tobytes()
+
+        with self._lock:
+            if key not in self._frames and len(data) <= self.max_bytes:
+                self._frames[key] = data
+                self._bytes += len(data)
+                while self._bytes > self.max_bytes:
+                    _, evicted = self._frames.popitem(last=False)
+                    self._bytes -= len(evicted)
+        return data
+
+    def stats(self):
+        with self._lock:
+            return {
+                'cached_frames': len(self._frames),
+                'cached_bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'open_readers': len(self._readers),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
@@ -0,0 +1,194 @@
+"""
+Single-file frame store for extracted video frames.
+
+One container file per animation replaces thousands of PNGs:
+
+    header (64 bytes) | frame 0 | frame 1 | ... | offset index
+
+Frames are either raw BGR arrays of a fixed size or zlib-compressed
+(lossless) blobs. The offset index holds frame_count + 1 uint64 offsets so
+frame n is bytes [offsets[n], offsets[n + 1]). The reader maps the file with
+mmap; raw frames come back as zero-copy NumPy views into the mapping.
+"""
+
+import mmap
+import os
+import struct
+import zlib
+
+import numpy as np
+
+STORE_FILENAME = 'video_frames.bin'
+
+MAGIC = b'MAFRAMES'
+VERSION = 1
+HEADER_FORMAT = '<8sHHIIIIQ'  # magic, version, compression, width, height, channels, frame_count, index_offset
+HEADER_SIZE = 64
+
+COMPRESSION_RAW = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_NAMES = {'raw': COMPRESSION_RAW, 'zlib': COMPRESSION_ZLIB}
+
+
+def store_path(animation_folder):
+    return os.path.join(animation_folder, STORE_FILENAME)
+
+
+class FrameStoreWriter:
+    """
+    Append frames in order, then close() to write the offset index.
+
+    Args:
+        path: Output file path
+        width, height, channels: Frame shape; every frame must match
+        compression: 'raw' (fixed-size, zero-copy reads) or 'zlib' (lossless)
+        level: zlib compression level 1-9
+    """
+
+    def __init__(self, path, width, height, channels=3, compression='raw', level=1):
+        if compression not in COMPRESSION_NAMES:
+            raise ValueError(f"Unknown compression '{compression}'. Allowed: {set(COMPRESSION_NAMES)}")
+        self.path = path
+        self.width = width
+        self.height = height
+        self.channels = channels
+        self.compression = COMPRESSION_NAMES[compression]
+        self.level = level
+        self.frame_size = width * height * channels
+        self._offsets = []
+        # Write to a temp name so readers never see a half-written store
+        self._tmp_path = path + '.tmp'
+        self._file = open(self._tmp_path, 'wb')
+        self._file.write(b'\0' * HEADER_SIZE)
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def encode(self, frame):
+        """Turn a frame into the bytes stored for it (safe to call from worker threads)"""
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        if frame.size != self.frame_size:
+            raise ValueError(f"Frame has {frame.size} bytes, store expects {self.frame_size}")
+        if self.compression == COMPRESSION_ZLIB:
+            return zlib.compress(frame.tobytes(), self.level)
+        return frame.tobytes()
+
+    def append_encoded(self, data):
+        """Append bytes returned by encode()"""
+        self._offsets.append(self._file.tell())
+        self._file.write(data)
+
+    def append(self, frame):
+        self.append_encoded(self.encode(frame))
+
+    def close(self):
+        if self._file is None:
+            return
+        index_offset = self._file.tell()
+        offsets = np.array(self._offsets + [index_offset], dtype='<u8')
+        self._file.write(offsets.tobytes())
+        self._file.seek(0)
+        self._file.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, self.compression, self.width,
+                                     self.height, self.channels, len(self._offsets), index_offset))
+        self._file.close()
+        self._file = None
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        """Discard a partially written store"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class FrameStore:
+    """
+    Memory-mapped reader for a frame store file.
+
+    store[n] returns frame n as an (height, width, channels) uint8 array. For
+    raw stores this is a read-only view into the mapping (no copy); for zlib
+    stores the frame is decompressed into a new array.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.compression, self.width, self.height, self.channels,
+         self.frame_count, index_offset) = struct.unpack_from(HEADER_FORMAT, self._mmap, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a frame store")
+        if version != VERSION:
+            self.close()
+            raise ValueError(f"Unsupported frame store version {version}")
+        self.shape = (self.height, self.width, self.channels)
+        self.offsets = np.frombuffer(self._mmap, dtype='<u8', count=self.frame_count + 1, offset=index_offset)
+
+    def __len__(self):
+        return self.frame_count
+
+    def __getitem__(self, frame_number):
+        if frame_number < 0:
+            frame_number += self.frame_count
+        if not 0 <= frame_number < self.frame_count:
+            raise IndexError(f"Frame {frame_number} out of range (0-{self.frame_count - 1})")
+        start = int(self.offsets[frame_number])
+        if self.compression == COMPRESSION_RAW:
+            return np.frombuffer(self._mmap, dtype=np.uint8, count=self.width * self.height * self.channels,
+                                 offset=start).reshape(self.shape)
+        end = int(self.offsets[frame_number + 1])
+        data = zlib.decompress(self._mmap[start:end])
+        return np.frombuffer(data, dtype=np.uint8).reshape(self.shape)
+
+    def __iter__(self):
+        for frame_number in range(self.frame_count):
+            yield self[frame_number]
+
+    def as_array(self):
+        """
+        Return every frame as one (frame_count, height, width, channels) view.
+
+        Only raw stores are contiguous; zlib stores raise ValueError.
+        """
+        if self.compression != COMPRESSION_RAW:
+            raise ValueError("as_array() needs a raw (uncompressed) frame store")
+        return np.frombuffer(self._mmap, dtype=np.uint8, count=self.frame_count * self.width * self.height * self.channels,
+                             offset=HEADER_SIZE).reshape((self.frame_count,) + self.shape)
+
+    def close(self):
+        # Views returned by __getitem__ keep the mapping alive; mmap.close()
+        # raises BufferError while they exist, so leave it to the GC then
+        self.offsets = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def read_header(path):
+    """Return (frame_count, width, height, channels, compression) without mapping the file"""
+    with open(path, 'rb') as f:
+        (magic, version, compression, width, height, channels,
+         frame_count, _) = struct.unpack(HEADER_FORMAT, f.read(struct.calcsize(HEADER_FORMAT)))
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a frame store")
+    return frame_count, width, height, channels, compression
@@ -0,0 +1,123 @@
+"""
+Background job queue for animation processing.
+
+Uploads are persisted by the request handler, then the slow work (frame
+extraction, audio conversion, DB writes) runs here on a bounded pool of
+worker threads so Flask workers are freed immediately.
+"""
+
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+# Processing stages written to animations.status, in order
+STATUS_QUEUED = 'queued'
+STATUS_EXTRACTING_FRAMES = 'extracting_frames'
+STATUS_CONVERTING_AUDIO = 'converting_audio'
+STATUS_STORING_FRAMES = 'storing_frames'
+STATUS_READY = 'ready'
+STATUS_FAILED = 'failed'
+
+STAGES = [
+    STATUS_QUEUED,
+    STATUS_EXTRACTING_FRAMES,
+    STATUS_CONVERTING_AUDIO,
+    STATUS_STORING_FRAMES,
+    STATUS_READY,
+]
+
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+MAX_PENDING_JOBS = int(os.environ.get('MAX_PENDING_JOBS', 16))
+PROGRESS_TTL_SECONDS = 3600  # Forget progress of finished jobs after an hour
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue already holds MAX_PENDING_JOBS jobs"""
+
+
+class JobQueue:
+    """
+    Bounded background worker pool with per-job progress tracking.
+
+    Progress is kept in memory only; the durable stage lives in the
+    animations.status column and is written by the job itself.
+    """
+
+    def __init__(self, max_workers=JOB_WORKERS, max_pending=MAX_PENDING_JOBS):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='animation-job')
+        self._lock = threading.Lock()
+        self._progress = {}
+        self._active = 0
+        self._running = 0
+
+    def submit(self, job_id, fn, *args, **kwargs):
+        """
+        Enqueue fn(*args, **kwargs) under job_id.
+
+        Raises:
+            QueueFullError: if max_pending jobs are already queued or running
+        """
+        with self._lock:
+            if self._active >= self.max_pending:
+                raise QueueFullError(f"Job queue is full ({self._active} pending)")
+            self._active += 1
+            self._prune_finished()
+            self._progress[job_id] = {
+                'stage': STATUS_QUEUED,
+                'queued_at': time.time(),
+                'started_at': None,
+                'finished_at': None,
+                'error': None,
+            }
+
+        def run():
+            self.update(job_id, started_at=time.time())
+            with self._lock:
+                self._running += 1
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                print(f"Job {job_id} failed: {e}")
+                traceback.print_exc()
+                self.update(job_id, stage=STATUS_FAILED, error=str(e))
+            finally:
+                self.update(job_id, finished_at=time.time())
+                with self._lock:
+                    self._active -= 1
+                    self._running -= 1
+
+        self._executor.submit(run)
+
+    def _prune_finished(self):
+        # Caller must hold self._lock
+        cutoff = time.time() - PROGRESS_TTL_SECONDS
+        stale = [job_id for job_id, progress in self._progress.items()
+                 if progress['finished_at'] is not None and progress['finished_at'] < cutoff]
+        for job_id in stale:
+            del self._progress[job_id]
+
+    def update(self, job_id, **progress):
+        """Merge progress fields into the job's progress record"""
+        with self._lock:
+            if job_id in self._progress:
+                self._progress[job_id].update(progress)
+
+    def get(self, job_id):
+        """Return a copy of the job's progress record, or None if unknown"""
+        with self._lock:
+            progress = self._progress.get(job_id)
+            return dict(progress) if progress is not None else None
+
+    def pending_count(self):
+        """Number of jobs queued or running"""
+        with self._lock:
+            return self._active
+
+    def running_count(self):
+        """Number of jobs currently running on a worker"""
+        with self._lock:
+            return self._running
@@ -0,0 +1,225 @@
+"""
+Mouth-region ingest: keep a fixed-size crop around the mouth per frame.
+
+Compositing only ever touches the area around the mouth, so instead of
+storing whole frames this mode takes per-frame mouth centers (the output of
+estimate_mouth_center.py, or raw OpenFace landmarks), smooths them over time
+so the crop window doesn't jitter, and writes one ROI_WIDTH x ROI_HEIGHT crop
+per frame into a frame store (mouth_roi.bin) plus the crop's top-left offset
+per frame (mouth_roi_offsets.npy). A 192x128 crop of a 1080p frame is about
+1% of its pixels.
+
+Full frames are not stored at all: the animation also gets a seek index, so
+frame_cache decodes any full frame from the source video on demand.
+"""
+
+import csv
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+import frame_store
+
+ROI_STORE_FILENAME = 'mouth_roi.bin'
+ROI_OFFSETS_FILENAME = 'mouth_roi_offsets.npy'
+ROI_META_FILENAME = 'mouth_roi.json'
+
+ROI_WIDTH = int(os.environ.get('MOUTH_ROI_WIDTH', 192))
+ROI_HEIGHT = int(os.environ.get('MOUTH_ROI_HEIGHT', 128))
+SMOOTHING_WINDOW = int(os.environ.get('MOUTH_ROI_SMOOTHING_FRAMES', 7))  # centered moving average, 1 = off
+
+
+def roi_paths(animation_folder):
+    """(store, offsets, metadata) paths for an animation's mouth ROI"""
+    folder = os.path.join(animation_folder, 'video')
+    return (os.path.join(folder, ROI_STORE_FILENAME),
+            os.path.join(folder, ROI_OFFSETS_FILENAME),
+            os.path.join(folder, ROI_META_FILENAME))
+
+
+def load_mouth_centers(csv_path, frame_count):
+    """
+    Read per-frame mouth centers from a CSV.
+
+    Accepts estimate_mouth_center.py output (frame, mouth_center_x,
+    mouth_center_y) or a raw OpenFace landmark CSV, in which case the centers
+    are computed with estimate_mouth_center.estimate_mouth_centers.
+
+    Args:
+        csv_path: Path to the CSV
+        frame_count: Number of video frames
+
+    Returns:
+        (frame_count, 2) float64 array of (x, y); NaN where a frame has no row
+    """
+    centers = np.full((frame_count, 2), np.nan)
+    with open(csv_path, newline='') as f:
+        header = [name.strip() for name in next(csv.reader(f))]
+
+    if 'mouth_center_x' in header:
+        data = np.genfromtxt(csv_path, delimiter=',', skip_header=1, dtype=np.float64, ndmin=2)
+        xs = data[:, header.index('mouth_center_x')]
+        ys = data[:, header.index('mouth_center_y')]
+        frames = data[:, header.index('frame')] if 'frame' in header else None
+    else:
+        # Raw OpenFace landmarks; estimate_mouth_center.py lives in the project root
+        sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        import estimate_mouth_center
+        df = estimate_mouth_center.load_landmarks(csv_path)
+        xs, ys = estimate_mouth_center.estimate_mouth_centers(df)
+        frames = df['frame'].to_numpy(dtype=np.float64) if 'frame' in df.columns else None
+
+    # OpenFace numbers frames from 1; without a frame column rows are frames in order
+    index = (frames.astype(np.int64) - 1) if frames is not None else np.arange(len(xs))
+    valid = (index >= 0) & (index < frame_count)
+    centers[index[valid], 0] = xs[valid]
+    centers[index[valid], 1] = ys[valid]
+    return centers
+
+
+def smooth_centers(centers, window=SMOOTHING_WINDOW, default=(0.0, 0.0)):
+    """
+    Fill missing centers and smooth them over time.
+
+    Gaps (NaN) are linearly interpolated from neighbouring frames (held at the
+    ends); the track is then averaged over a centered window of `window` frames
+    so the crop follows the mouth without per-frame jitter.
+
+    Args:
+        centers: (n, 2) array of (x, y), NaN where unknown
+        window: Moving average length in frames (1 disables smoothing)
+        default: Center used if no frame has one
+    """
+    centers = np.array(centers, dtype=np.float64)
+    n = len(centers)
+    if n == 0:
+        return centers
+    frames = np.arange(n)
+    for axis in range(2):
+        column = centers[:, axis]
+        known = ~np.isnan(column)
+        if not known.any():
+            column[:] = default[axis]
+        elif not known.all():
+            column[~known] = np.interp(frames[~known], frames[known], column[known])
+
+    window = max(1, min(int(window), n))
+    if window > 1:
+        kernel = np.ones(window) / window
+        pad_before, pad_after = window // 2, window - 1 - window // 2
+        padded = np.pad(centers, ((pad_before, pad_after), (0, 0)), mode='edge')
+        centers = np.stack([np.convolve(padded[:, axis], kernel, mode='valid') for axis in range(2)], axis=1)
+    return centers
+
+
+def crop_offsets(centers, frame_width, frame_height, roi_width, roi_height):
+    """Top-left (x, y) of each crop, kept inside the frame; int32 (n, 2)"""
+    offsets = np.rint(centers - [roi_width / 2, roi_height / 2])
+    offsets[:, 0] = np.clip(offsets[:, 0], 0, frame_width - roi_width)
+    offsets[:, 1] = np.clip(offsets[:, 1], 0, frame_height - roi_height)
+    return offsets.astype(np.int32)
+
+
+def extract_mouth_rois(video_path, centers_csv, animation_folder, roi_width=ROI_WIDTH, roi_height=ROI_HEIGHT,
+                       window=SMOOTHING_WINDOW, compression='zlib', progress_callback=None, cancel_event=None):
+    """
+    Decode the video once and store only the smoothed mouth crop of each frame.
+
+    Args:
+        video_path: Source video
+        centers_csv: Mouth centers or OpenFace landmarks CSV (see load_mouth_centers)
+        animation_folder: Animation folder; files go to video/mouth_roi.*
+        roi_width, roi_height: Crop size (clamped to the frame size)
+        window: Temporal smoothing window in frames
+        compression: Frame store compression, 'raw' or 'zlib'
+        progress_callback: Optional callable(frames_done, total_frames)
+        cancel_event: Optional threading.Event; decoding stops early once it is set
+
+    Returns:
+        Number of crops stored (0 on failure)
+    """
+    import cv2
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        print(f"Error: Could not open video file {video_path}")
+        return 0
+
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fps = float(cap.get(cv2.CAP_PROP_FPS))
+    roi_width, roi_height = min(roi_width, frame_width), min(roi_height, frame_height)
+
+    centers = smooth_centers(load_mouth_centers(centers_csv, max(total_frames, 1)), window,
+                             default=(frame_width / 2, frame_height / 2))
+    offsets = crop_offsets(centers, frame_width, frame_height, roi_width, roi_height)
+
+    store_file, offsets_file, meta_file = roi_paths(animation_folder)
+    os.makedirs(os.path.dirname(store_file), exist_ok=True)
+    print(f"Extracting {roi_width}x{roi_height} mouth crops from {frame_width}x{frame_height} video: {video_path}")
+
+    start_time = time.perf_counter()
+    writer = frame_store.FrameStoreWriter(store_file, roi_width, roi_height, 3, compression=compression)
+    used_offsets = []
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret or (cancel_event is not None and cancel_event.is_set()):
+                break
+            n = len(writer)
+            # CAP_PROP_FRAME_COUNT can undercount; extra frames reuse the last window
+            x, y = offsets[min(n, len(offsets) - 1)]
+            writer.append(np.ascontiguousarray(frame[y:y + roi_height, x:x + roi_width]))
+            used_offsets.append((x, y))
+            if progress_callback:
+                progress_callback(len(writer), total_frames)
+        writer.close()
+    except Exception as e:
+        writer.abort()
+        print(f"Error extracting mouth crops: {e}")
+        import traceback
+        traceback.print_exc()
+        return 0
+    finally:
+        cap.release()
+
+    frame_count = len(used_offsets)
+    np.save(offsets_file, np.asarray(used_offsets, dtype=np.int32).reshape(-1, 2))
+    with open(meta_file, 'w') as f:
+        json.dump({
+            'video_path': video_path,
+            'fps': fps,
+            'frame_count': frame_count,
+            'frame_width': frame_width,
+            'frame_height': frame_height,
+            'roi_width': roi_width,
+            'roi_height': roi_height,
+            'smoothing_window': window,
+            'centers_csv': centers_csv,
+        }, f)
+
+    elapsed = time.perf_counter() - start_time
+    stored_mb = os.path.getsize(store_file) / (1024 * 1024)
+    full_mb = frame_count * frame_width * frame_height * 3 / (1024 * 1024)
+    print(f"✓ Stored {frame_count} mouth crops in {store_file} ({stored_mb:.1f} MB, "
+          f"{full_mb:.0f} MB as raw full frames)")
+    print(f"  - Took {elapsed:.2f} seconds ({frame_count / elapsed if elapsed > 0 else 0:.1f} frames/sec)")
+    return frame_count
+
+
+def load_roi_meta(animation_folder):
+    """Return the mouth ROI metadata dict, or None if the animation has none"""
+    meta_file = roi_paths(animation_folder)[2]
+    if not os.path.exists(meta_file):
+        return None
+    with open(meta_file) as f:
+        return json.load(f)
+
+
+def load_offsets(animation_folder):
+    """Per-frame crop offsets as an int32 (n, 2) array of (x, y)"""
+    return np.load(roi_paths(animation_folder)[1])
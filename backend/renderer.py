@@ -0,0 +1,336 @@
+"""
+Streaming mouth compositing renderer.
+
+Renders an animation straight to an encoded video:
+
+1. The user's viseme sprites (frames/frame_NNN.*, where NNN is the viseme
+   code 1-12) are loaded and scaled once into premultiplied BGR plus an
+   alpha channel.
+2. Each video frame gets the sprite of the viseme active at its timestamp,
+   alpha-blended with NumPy around the frame's mouth center. Batches of
+   frames are composited in parallel on a process pool. When the animation
+   has a frame store the workers read frames from the memory-mapped store
+   themselves; otherwise the source video is decoded here and frames are
+   shipped to the workers.
+3. Finished frames are written, in order, as raw BGR into an ffmpeg pipe,
+   which encodes them and muxes the uploaded audio. Nothing is written to
+   disk except the final video.
+
+    python renderer.py ANIMATION_FOLDER VISEMES.npy OUTPUT.mp4 [--mouth-centers CSV]
+"""
+
+import argparse
+import glob
+import multiprocessing
+import os
+import re
+import subprocess
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import frame_store
+import mouth_roi
+
+VISEME_FPS = 24
+SILENCE_VISEME = 12
+RENDER_WORKERS = int(os.environ.get('RENDER_WORKERS', min(4, os.cpu_count() or 1)))
+RENDER_BATCH_FRAMES = int(os.environ.get('RENDER_BATCH_FRAMES', 16))
+# Sprite width as a fraction of the video width when no explicit size is given
+SPRITE_WIDTH_FRACTION = float(os.environ.get('SPRITE_WIDTH_FRACTION', 0.18))
+
+_SPRITE_PATTERN = re.compile(r'frame_(\d+)\.\w+$')
+
+
+def load_sprites(animation_folder, sprite_width):
+    """
+    Load and pre-scale the viseme sprites once.
+
+    Args:
+        animation_folder: Animation folder holding frames/frame_NNN.*
+        sprite_width: Target width in pixels (height keeps the aspect ratio)
+
+    Returns:
+        {viseme: (premultiplied uint16 BGR, uint16 alpha 0-255)} with arrays of shape (h, w, 3) / (h, w, 1)
+    """
+    import cv2
+
+    sprites = {}
+    for path in sorted(glob.glob(os.path.join(animation_folder, 'frames', 'frame_*.*'))):
+        match = _SPRITE_PATTERN.search(os.path.basename(path))
+        image = cv2.imread(path, cv2.IMREAD_UNCHANGED) if match else None
+        if image is None:
+            continue
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGRA)
+        elif image.shape[2] == 3:
+            # No alpha channel: the sprite is opaque
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2BGRA)
+        scale = sprite_width / image.shape[1]
+        size = (max(1, int(round(image.shape[1] * scale))), max(1, int(round(image.shape[0] * scale))))
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+        alpha = image[:, :, 3:4].astype(np.uint16)
+        sprites[int(match.group(1))] = (image[:, :, :3].astype(np.uint16) * alpha, alpha)
+    return sprites
+
+
+def viseme_for_frames(timeline, frame_count, video_fps, viseme_fps=VISEME_FPS):
+    """Viseme code per video frame, taken at each frame's timestamp (silence past the timeline)"""
+    timeline = np.asarray(timeline, dtype=np.uint8)
+    index = np.floor(np.arange(frame_count) / video_fps * viseme_fps + 1e-9).astype(np.int64)
+    visemes = np.full(frame_count, SILENCE_VISEME, dtype=np.uint8)
+    inside = index < len(timeline)
+    visemes[inside] = timeline[index[inside]]
+    return visemes
+
+
+def blend_sprite(frame, sprite, center):
+    """
+    Alpha-blend a premultiplied sprite onto frame (in place), centered at center.
+
+    Integer math: out = (frame * (255 - a) + sprite_bgr * a) / 255, clipped to the frame.
+    The sum can exceed 16 bits, so it is accumulated in uint32.
+    """
+    premultiplied, alpha = sprite
+    h, w = alpha.shape[:2]
+    x0 = int(round(center[0] - w / 2))
+    y0 = int(round(center[1] - h / 2))
+    fx0, fy0 = max(x0, 0), max(y0, 0)
+    fx1, fy1 = min(x0 + w, frame.shape[1]), min(y0 + h, frame.shape[0])
+    if fx1 <= fx0 or fy1 <= fy0:
+        return frame
+    sx0, sy0 = fx0 - x0, fy0 - y0
+    region = frame[fy0:fy1, fx0:fx1]
+    a = alpha[sy0:sy0 + (fy1 - fy0), sx0:sx0 + (fx1 - fx0)]
+    p = premultiplied[sy0:sy0 + (fy1 - fy0), sx0:sx0 + (fx1 - fx0)]
+    region[:] = ((region.astype(np.uint32) * (255 - a) + p + 127) // 255).astype(np.uint8)
+    return frame
+
+
+# --- process pool workers ----------------------------------------------------
+# Each worker receives the scaled sprites once, and opens the frame store
+# itself when there is one, so tasks only carry frame numbers.
+
+_worker_sprites = None
+_worker_store = None
+
+
+def _init_worker(sprites, store_file):
+    global _worker_sprites, _worker_store
+    _worker_sprites = sprites
+    _worker_store = frame_store.FrameStore(store_file) if store_file else None
+
+
+def _composite_batch(start, frames, visemes, centers):
+    """Composite one batch; frames is None when the worker reads them from the store"""
+    out = []
+    for i, (viseme, center) in enumerate(zip(visemes, centers)):
+        frame = np.array(_worker_store[start + i] if frames is None else frames[i])
+        sprite = _worker_sprites.get(int(viseme))
+        if sprite is not None:
+            blend_sprite(frame, sprite, center)
+        out.append(frame)
+    return np.stack(out).tobytes()
+
+
+def _video_frames(video_path):
+    import cv2
+
+    cap = cv2.VideoCapture(video_path)
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield frame
+    finally:
+        cap.release()
+
+
+def _probe_video(video_path):
+    import cv2
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Could not open video file {video_path}")
+    info = (int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), float(cap.get(cv2.CAP_PROP_FPS)) or VISEME_FPS)
+    cap.release()
+    return info
+
+
+def find_source_video(animation_folder):
+    paths = sorted(glob.glob(os.path.join(animation_folder, 'video', 'video.*')))
+    return paths[0] if paths else None
+
+
+def find_audio(animation_folder):
+    """The converted WAV if audio conversion ran, else the original upload"""
+    wav = os.path.join(animation_folder, 'audio', 'audio.wav')
+    if os.path.exists(wav):
+        return wav
+    paths = [p for p in sorted(glob.glob(os.path.join(animation_folder, 'audio', 'audio.*')))
+             if not p.endswith('.npy')]
+    return paths[0] if paths else None
+
+
+def mouth_centers_for(animation_folder, frame_count, width, height, centers_csv=None):
+    """
+    Per-frame mouth centers for positioning the sprites.
+
+    Uses centers_csv if given, else the smoothed crop windows of an roi-mode
+    animation, else a fixed point in the lower middle of the frame.
+    """
+    if centers_csv:
+        return mouth_roi.smooth_centers(mouth_roi.load_mouth_centers(centers_csv, frame_count),
+                                        default=(width / 2, height * 0.7))
+    meta = mouth_roi.load_roi_meta(animation_folder)
+    if meta:
+        offsets = mouth_roi.load_offsets(animation_folder).astype(np.float64)
+        centers = offsets + [meta['roi_width'] / 2, meta['roi_height'] / 2]
+        if len(centers) < frame_count:
+            centers = np.concatenate([centers, np.repeat(centers[-1:], frame_count - len(centers), axis=0)])
+        return centers[:frame_count]
+    print("Warning: no mouth centers; placing the mouth at a fixed position")
+    return np.tile([width / 2, height * 0.7], (frame_count, 1))
+
+
+def render_animation(animation_folder, visemes_path, output_path, audio_path=None, mouth_centers_csv=None,
+                     sprite_width=None, workers=RENDER_WORKERS, batch_frames=RENDER_BATCH_FRAMES,
+                     viseme_fps=VISEME_FPS, crf=20, preset='veryfast'):
+    """
+    Composite viseme sprites onto every frame and stream the result into ffmpeg.
+
+    Args:
+        animation_folder: Animation folder (uploads/<animation_id>)
+        visemes_path: Per-frame viseme timeline (.npy from the aligner)
+        output_path: Encoded video to write (e.g. render.mp4)
+        audio_path: Audio to mux (default: the animation's converted audio)
+        mouth_centers_csv: Mouth centers / OpenFace CSV (default: roi offsets, if any)
+        sprite_width: Sprite width in pixels (default SPRITE_WIDTH_FRACTION of the video width)
+        workers: Compositing processes (0 composites in this process)
+        batch_frames: Frames per pool task
+        viseme_fps: Frame rate of the viseme timeline
+        crf, preset: libx264 quality / speed
+
+    Returns:
+        Number of frames rendered
+    """
+    store_file = frame_store.store_path(animation_folder)
+    if not os.path.exists(store_file):
+        store_file = None
+    video_path = find_source_video(animation_folder)
+    if video_path is None:
+        raise FileNotFoundError(f"No source video in {animation_folder}")
+    frame_count, width, height, fps = _probe_video(video_path)
+    if store_file:
+        with frame_store.FrameStore(store_file) as store:
+            frame_count = len(store)
+            height, width = store.shape[:2]
+    if audio_path is None:
+        audio_path = find_audio(animation_folder)
+
+    sprites = load_sprites(animation_folder, sprite_width or max(1, int(width * SPRITE_WIDTH_FRACTION)))
+    if not sprites:
+        raise FileNotFoundError(f"No viseme sprites in {os.path.join(animation_folder, 'frames')}")
+    visemes = viseme_for_frames(np.load(visemes_path), frame_count, fps, viseme_fps)
+    centers = mouth_centers_for(animation_folder, frame_count, width, height, mouth_centers_csv)
+
+    ffmpeg_cmd = [
+        'ffmpeg', '-y', '-loglevel', 'error', '-nostats',
+        '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}', '-r', f'{fps}',
+        '-i', '-',
+    ]
+    if audio_path:
+        ffmpeg_cmd += ['-i', audio_path, '-map', '0:v', '-map', '1:a', '-c:a', 'aac', '-shortest']
+    ffmpeg_cmd += ['-c:v', 'libx264', '-preset', preset, '-crf', str(crf), '-pix_fmt', 'yuv420p', output_path]
+
+    print(f"Rendering {frame_count} frames ({width}x{height} @ {fps:g} fps) to {output_path}")
+    print(f"  - Frames from {'frame store' if store_file else 'source video'}, "
+          f"{len(sprites)} sprites, {workers} worker(s)")
+    start_time = time.perf_counter()
+    encoder = subprocess.Popen(ffmpeg_cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def batches():
+        """(start, frames or None) covering every frame in order"""
+        if store_file:
+            for start in range(0, frame_count, batch_frames):
+                yield start, None
+            return
+        batch = []
+        start = 0
+        for frame in _video_frames(video_path):
+            batch.append(frame)
+            if len(batch) == batch_frames:
+                yield start, batch
+                start += len(batch)
+                batch = []
+        if batch:
+            yield start, batch
+
+    def task_args(start, frames):
+        count = len(frames) if frames is not None else min(batch_frames, frame_count - start)
+        end = min(start + count, frame_count)
+        # Frames past the probed count (decoders can undercount) reuse the last center
+        vis = np.concatenate([visemes[start:end], np.full(start + count - end, SILENCE_VISEME, np.uint8)])
+        cen = centers[np.minimum(np.arange(start, start + count), frame_count - 1)] if frame_count else \
+            np.tile([width / 2, height * 0.7], (count, 1))
+        return start, frames, vis, cen
+
+    rendered = 0
+    try:
+        if workers > 0:
+            pending = deque()
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                                     initargs=(sprites, store_file)) as executor:
+                for start, frames in batches():
+                    pending.append(executor.submit(_composite_batch, *task_args(start, frames)))
+                    # Keep a bounded number of batches in flight; write finished ones in order
+                    while len(pending) > workers * 2:
+                        data = pending.popleft().result()
+                        encoder.stdin.write(data)
+                        rendered += len(data) // (width * height * 3)
+                while pending:
+                    data = pending.popleft().result()
+                    encoder.stdin.write(data)
+                    rendered += len(data) // (width * height * 3)
+        else:
+            _init_worker(sprites, store_file)
+            for start, frames in batches():
+                data = _composite_batch(*task_args(start, frames))
+                encoder.stdin.write(data)
+                rendered += len(data) // (width * height * 3)
+        encoder.stdin.close()
+    except BrokenPipeError:
+        pass
+    finally:
+        if not encoder.stdin.closed:
+            encoder.stdin.close()
+        stderr = encoder.stderr.read().decode(errors='replace')
+        encoder.wait()
+    if encoder.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to encode {output_path}: {stderr[-2000:]}")
+
+    elapsed = time.perf_counter() - start_time
+    print(f"✓ Rendered {rendered} frames to {output_path}")
+    print(f"  - Took {elapsed:.2f} seconds ({rendered / elapsed if elapsed > 0 else 0:.1f} frames/sec)")
+    return rendered
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render an animation with viseme sprites composited on the mouth')
+    parser.add_argument('animation_folder', help='uploads/<animation_id>')
+    parser.add_argument('visemes', help='Per-frame viseme timeline (.npy)')
+    parser.add_argument('output', help='Output video (e.g. render.mp4)')
+    parser.add_argument('--audio', default=None, help='Audio to mux (default: the animation audio)')
+    parser.add_argument('--mouth-centers', default=None, help='Mouth centers or OpenFace CSV')
+    parser.add_argument('--sprite-width', type=int, default=None, help='Sprite width in pixels')
+    parser.add_argument('--workers', type=int, default=RENDER_WORKERS, help='Compositing processes (0 = inline)')
+    parser.add_argument('--viseme-fps', type=float, default=VISEME_FPS, help='Frame rate of the viseme timeline')
+    args = parser.parse_args()
+    render_animation(args.animation_folder, args.visemes, args.output, audio_path=args.audio,
+                     mouth_centers_csv=args.mouth_centers, sprite_width=args.sprite_width,
+                     workers=args.workers, viseme_fps=args.viseme_fps)
@@ -0,0 +1,132 @@
+"""
+Run the ingest stages of an animation as a small dependency graph.
+
+Stages are plain callables. Each receives a dict holding the results of the
+stages it depends on, and a stage starts on the thread pool as soon as its
+dependencies have finished. Stages with no dependency between them run
+concurrently. If a stage fails, stages that have not started are skipped,
+and the graph's cancel event is set so running stages can stop early. The
+first error is then re-raised to the caller.
+
+Every run records per-stage wall-clock times and the critical path: the
+chain of dependencies that determined when the graph finished.
+"""
+
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+
+class StageCancelled(Exception):
+    """Raised by a stage that stopped because a sibling stage failed"""
+
+
+class StageGraph:
+    """
+    Args:
+        name: Label used in the timing log (e.g. the animation id)
+    """
+
+    def __init__(self, name=''):
+        self.name = name
+        self.cancel_event = threading.Event()
+        self._stages = {}  # name -> (fn, deps), in insertion order
+        self._done = set()
+        self.timings = {}  # name -> (start, end) seconds since run() began
+        self.wall_seconds = 0.0
+
+    def add(self, name, fn, deps=()):
+        """Add stage `name` running fn(results) after every stage in deps"""
+        for dep in deps:
+            if dep not in self._stages:
+                raise ValueError(f"Stage {name!r} depends on unknown stage {dep!r}")
+        self._stages[name] = (fn, tuple(deps))
+        return self
+
+    def is_done(self, name):
+        """True once stage `name` has finished successfully"""
+        return name in self._done
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def run(self, executor):
+        """
+        Execute the graph on executor and return {stage name: result}.
+
+        Raises:
+            The first exception raised by a stage, after the running stages finish
+        """
+        results = {}
+        running = {}  # future -> stage name
+        waiting = dict(self._stages)
+        first_error = None
+        start = time.perf_counter()
+
+        def timed(name, fn, inputs):
+            stage_start = time.perf_counter() - start
+            try:
+                return fn(inputs)
+            finally:
+                self.timings[name] = (stage_start, time.perf_counter() - start)
+
+        while waiting or running:
+            if first_error is None:
+                for name, (fn, deps) in list(waiting.items()):
+                    if all(dep in results for dep in deps):
+                        del waiting[name]
+                        inputs = {dep: results[dep] for dep in deps}
+                        running[executor.submit(timed, name, fn, inputs)] = name
+            else:
+                # Failure: nothing new starts
+                waiting.clear()
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                    self._done.add(name)
+                except BaseException as e:
+                    if first_error is None:
+                        first_error = e
+                        self.cancel_event.set()
+
+        self.wall_seconds = time.perf_counter() - start
+        if first_error is not None:
+            raise first_error
+        return results
+
+    def critical_path(self):
+        """Stage names along the dependency chain that finished last"""
+        if not self.timings:
+            return []
+        path = []
+        name = max(self.timings, key=lambda n: self.timings[n][1])
+        while name is not None:
+            path.append(name)
+            deps = [d for d in self._stages[name][1] if d in self.timings]
+            name = max(deps, key=lambda d: self.timings[d][1]) if deps else None
+        return path[::-1]
+
+    def critical_path_seconds(self):
+        """Summed stage time along critical_path()"""
+        return sum(self.timings[n][1] - self.timings[n][0] for n in self.critical_path())
+
+    def log_timings(self):
+        """Print wall-clock time per stage and for the critical path"""
+        prefix = f"[{self.name}] " if self.name else ''
+        for name in self._stages:
+            if name in self.timings:
+                stage_start, stage_end = self.timings[name]
+                print(f"{prefix}  stage {name}: {stage_end - stage_start:.2f}s "
+                      f"(started +{stage_start:.2f}s)")
+            else:
+                print(f"{prefix}  stage {name}: skipped")
+        path = self.critical_path()
+        if path:
+            print(f"{prefix}Critical path {' -> '.join(path)}: {self.critical_path_seconds():.2f}s "
+                  f"of {self.wall_seconds:.2f}s wall clock")
@@ -0,0 +1,425 @@
+"""
+Disk quota and garbage collection for uploads/, the artifact cache and aligner/data.
+
+A background sweeper thread periodically:
+
+1. writes per-animation last-access times (recorded in memory by touch() on
+   every request) and on-disk sizes to the animations table,
+2. removes orphans: animation folders with no database row (failed submits,
+   abandoned resumable uploads), aligner/data/<id>.wav/.txt files of
+   animations that no longer exist and stale temporary cache entries,
+3. enforces the disk quota by evicting regenerable artifacts, least recently
+   used first, until usage drops below the low watermark.
+
+Only derived files are evicted: extracted frames (video_frames/ or the frame
+store), mouth ROI crops, the decoded audio buffer and converted WAV, the
+aligner's WAV link and artifact cache entries. Source uploads (video, audio,
+face reference, mouth frames, mouth centers) are never touched. An animation
+whose frames were evicted keeps a seek index, so frame requests fall back to
+decoding from the source video on demand (lazy mode). Evicted audio files are
+decoded again from the source upload on the animation's next access.
+
+Usage counts each file once even when it is hard-linked from several
+animations and the artifact cache, so the quota reflects real disk use.
+"""
+
+import calendar
+import os
+import re
+import threading
+import time
+
+import artifact_cache
+import audio_ingest
+import db
+import frame_cache
+import frame_store
+import mouth_roi
+import upload_sessions
+
+STORAGE_QUOTA_BYTES = int(os.environ.get('STORAGE_QUOTA_BYTES', 0))  # 0 disables eviction
+STORAGE_LOW_WATERMARK = float(os.environ.get('STORAGE_LOW_WATERMARK', 0.9))  # evict down to this share of the quota
+STORAGE_SWEEP_SECONDS = float(os.environ.get('STORAGE_SWEEP_SECONDS', 300))
+# Folders younger than this are never orphans: submit_files creates the folder before the row
+ORPHAN_GRACE_SECONDS = float(os.environ.get('ORPHAN_GRACE_SECONDS', 3600))
+# Resumable uploads with no chunk for this long are abandoned
+UPLOAD_SESSION_TTL_SECONDS = float(os.environ.get('UPLOAD_SESSION_TTL_SECONDS', 24 * 3600))
+
+# Animations in these states are finished and may lose their derived files
+EVICTABLE_STATUSES = ('ready', 'failed')
+
+_ANIMATION_ID_RE = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$')
+
+
+def _file_stats(path):
+    """Yield os.lstat results for every file under path"""
+    if os.path.isfile(path):
+        yield os.lstat(path)
+        return
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                yield os.lstat(os.path.join(dirpath, filename))
+            except FileNotFoundError:
+                continue
+
+
+def source_audio_path(audio_folder):
+    """
+    The uploaded audio file (audio.<ext>), or None.
+
+    A converted audio.wav sits next to a non-WAV upload; when audio.wav is the
+    only audio file, it is the upload itself.
+    """
+    if not os.path.isdir(audio_folder):
+        return None
+    names = sorted(name for name in os.listdir(audio_folder)
+                   if name.startswith('audio.') and not name.endswith(('.npy', '.tmp')))
+    uploads = [name for name in names if name != 'audio.wav'] or names
+    return os.path.join(audio_folder, uploads[0]) if uploads else None
+
+
+def _created_epoch(created_at):
+    """animations.created_at (SQLite CURRENT_TIMESTAMP, UTC) as epoch seconds"""
+    try:
+        return calendar.timegm(time.strptime(created_at, '%Y-%m-%d %H:%M:%S'))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class StorageManager:
+    """
+    Args:
+        upload_folder: uploads/ (one folder per animation)
+        artifacts: The ArtifactCache whose entries may be evicted
+        aligner_data_dir: aligner/data, where ingest links <animation_id>.wav/.txt
+        quota_bytes: Disk budget for all three (0 = unlimited)
+        is_busy: Optional callable(animation_id) -> True while a job is processing it
+    """
+
+    def __init__(self, upload_folder, artifacts, aligner_data_dir, quota_bytes=STORAGE_QUOTA_BYTES,
+                 low_watermark=STORAGE_LOW_WATERMARK, sweep_seconds=STORAGE_SWEEP_SECONDS,
+                 orphan_grace_seconds=ORPHAN_GRACE_SECONDS, is_busy=None):
+        self.upload_folder = upload_folder
+        self.artifacts = artifacts
+        self.aligner_data_dir = aligner_data_dir
+        self.quota_bytes = quota_bytes
+        self.low_watermark = low_watermark
+        self.sweep_seconds = sweep_seconds
+        self.orphan_grace_seconds = orphan_grace_seconds
+        self.is_busy = is_busy or (lambda animation_id: False)
+        self._lock = threading.Lock()
+        self._sweep_lock = threading.Lock()
+        self._accessed = {}
+        self._restoring = set()
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_sweep = None
+
+    # --- accounting -----------------------------------------------------------
+
+    def touch(self, animation_id):
+        """Record an access; written to the database by the next sweep, so requests never wait on it"""
+        with self._lock:
+            self._accessed[animation_id] = time.time()
+        self._maybe_restore_audio(animation_id)
+
+    def _aligner_files(self, animation_id):
+        return [os.path.join(self.aligner_data_dir, f'{animation_id}.{ext}') for ext in ('wav', 'txt')]
+
+    def animation_size(self, animation_id):
+        """Bytes referenced by an animation (its folder plus its aligner/data files)"""
+        paths = [os.path.join(self.upload_folder, animation_id)] + self._aligner_files(animation_id)
+        return sum(st.st_size for path in paths if os.path.exists(path) for st in _file_stats(path))
+
+    def record_size(self, animation_id):
+        """Measure an animation and store its size in the database"""
+        size = self.animation_size(animation_id)
+        db.update_animation(animation_id, size_bytes=size)
+        return size
+
+    def disk_usage(self):
+        """Bytes used under all managed roots, counting hard-linked files once"""
+        seen = set()
+        total = 0
+        roots = [self.upload_folder, self.artifacts.root]
+        if os.path.isdir(self.aligner_data_dir):
+            roots += [os.path.join(self.aligner_data_dir, name) for name in os.listdir(self.aligner_data_dir)
+                      if _ANIMATION_ID_RE.match(os.path.splitext(name)[0])]
+        for root in roots:
+            if not os.path.exists(root):
+                continue
+            for st in _file_stats(root):
+                inode = (st.st_dev, st.st_ino)
+                if inode not in seen:
+                    seen.add(inode)
+                    total += st.st_size
+        return total
+
+    # --- orphans ----------------------------------------------------------------
+
+    def cleanup_orphans(self, animation_ids):
+        """
+        Remove files that belong to no animation.
+
+        Returns:
+            Bytes freed
+        """
+        now = time.time()
+        freed = 0
+        if os.path.isdir(self.upload_folder):
+            for name in os.listdir(self.upload_folder):
+                folder = os.path.join(self.upload_folder, name)
+                if name in animation_ids or not os.path.isdir(folder):
+                    continue
+                session_file = os.path.join(folder, upload_sessions.SESSION_FILENAME)
+                # A resumable upload has no row until it is finalized; its state file's
+                # mtime moves with every chunk received
+                if os.path.exists(session_file):
+                    if now - os.path.getmtime(session_file) < UPLOAD_SESSION_TTL_SECONDS:
+                        continue
+                elif now - os.path.getmtime(folder) < self.orphan_grace_seconds:
+                    continue
+                print(f"Storage: removing orphaned folder {folder}")
+                freed += artifact_cache.remove_tree(folder)
+
+        if os.path.isdir(self.aligner_data_dir):
+            for name in os.listdir(self.aligner_data_dir):
+                stem, ext = os.path.splitext(name)
+                path = os.path.join(self.aligner_data_dir, name)
+                # Only files ingest wrote (<uuid>.wav/.txt); sample data like harvard.wav stays
+                if (ext in ('.wav', '.txt') and _ANIMATION_ID_RE.match(stem) and stem not in animation_ids
+                        and now - os.path.getmtime(path) >= self.orphan_grace_seconds):
+                    print(f"Storage: removing orphaned aligner file {path}")
+                    freed += artifact_cache.remove_tree(path)
+
+        # Temporary build / eviction directories left by a crash
+        if os.path.isdir(self.artifacts.root):
+            for kind in os.listdir(self.artifacts.root):
+                kind_dir = os.path.join(self.artifacts.root, kind)
+                if not os.path.isdir(kind_dir):
+                    continue
+                for name in os.listdir(kind_dir):
+                    path = os.path.join(kind_dir, name)
+                    if name.startswith('.tmp-') and now - os.path.getmtime(path) >= self.orphan_grace_seconds:
+                        freed += artifact_cache.remove_tree(path)
+        return freed
+
+    # --- eviction -----------------------------------------------------------------
+
+    def derived_paths(self, row):
+        """Regenerable files of an animation that exist on disk"""
+        animation_folder = os.path.join(self.upload_folder, row['id'])
+        audio_folder = os.path.join(animation_folder, 'audio')
+        paths = [
+            os.path.join(animation_folder, 'video_frames'),
+            frame_store.store_path(animation_folder),
+            *mouth_roi.roi_paths(animation_folder),
+            os.path.join(audio_folder, audio_ingest.AUDIO_BUFFER_FILENAME),
+            self._aligner_files(row['id'])[0],
+        ]
+        wav_path = os.path.join(audio_folder, 'audio.wav')
+        # An uploaded .wav is saved as audio.wav and is the source, not a conversion
+        # (animations.audio_path can't tell: it names audio.wav once conversion ran)
+        source_path = source_audio_path(audio_folder)
+        if source_path is not None and os.path.normpath(source_path) != os.path.normpath(wav_path):
+            paths.append(wav_path)
+        return [path for path in paths if os.path.exists(path)]
+
+    def evict_animation(self, row):
+        """
+        Delete an animation's derived files, keeping the source uploads.
+
+        Frames stay available: the animation gets a seek index (if it has none)
+        and its frames are decoded from the source video on demand.
+
+        Returns:
+            Bytes freed
+        """
+        animation_id = row['id']
+        with self._lock:
+            if animation_id in self._restoring:
+                return 0
+        animation_folder = os.path.join(self.upload_folder, animation_id)
+        paths = self.derived_paths(row)
+        frame_paths = [os.path.join(animation_folder, 'video_frames'), frame_store.store_path(animation_folder),
+                       *mouth_roi.roi_paths(animation_folder)]
+        if any(path in paths for path in frame_paths) and frame_cache.load_seek_index(animation_folder) is None:
+            if not (row['video_path'] and frame_cache.build_seek_index(row['video_path'], animation_folder)):
+                # Without a seek index the frames could not be served again; keep them
+                paths = [path for path in paths if path not in frame_paths]
+        if not paths:
+            return 0
+
+        freed = 0
+        for path in paths:
+            freed += artifact_cache.remove_tree(path)
+        if frame_paths[0] in paths:
+            # The extracted frame rows point into video_frames/
+            db.delete_extracted_frames(animation_id)
+        db.update_animation(animation_id, artifacts_evicted_at=time.time(),
+                            size_bytes=self.animation_size(animation_id))
+        print(f"Storage: evicted derived files of {animation_id} ({freed / (1024 * 1024):.1f} MB freed)")
+        return freed
+
+    def restore_audio(self, animation_id):
+        """
+        Decode evicted audio files again from the source upload.
+
+        Rebuilds whichever of the 16 kHz buffer, the converted WAV and the
+        aligner/data WAV link are missing.
+
+        Returns:
+            True if anything was rebuilt
+        """
+        audio_folder = os.path.join(self.upload_folder, animation_id, 'audio')
+        buffer_path = os.path.join(audio_folder, audio_ingest.AUDIO_BUFFER_FILENAME)
+        wav_path = os.path.join(audio_folder, 'audio.wav')
+        aligner_wav_path = self._aligner_files(animation_id)[0]
+        source_path = source_audio_path(audio_folder)
+        if source_path is None or all(os.path.exists(p) for p in (buffer_path, wav_path, aligner_wav_path)):
+            return False
+
+        if not os.path.exists(buffer_path):
+            audio_ingest.ingest_audio(source_path, audio_folder)
+        audio_ingest.ensure_wav(buffer_path, wav_path)
+        os.makedirs(self.aligner_data_dir, exist_ok=True)
+        audio_ingest.link_or_copy(wav_path, aligner_wav_path)
+        print(f"✓ Restored evicted audio files of {animation_id}")
+        return True
+
+    def _maybe_restore_audio(self, animation_id):
+        """Restore evicted audio in the background when an animation is accessed again"""
+        if (not _ANIMATION_ID_RE.match(animation_id) or os.path.exists(self._aligner_files(animation_id)[0])
+                or self.is_busy(animation_id)):
+            return
+        with self._lock:
+            if animation_id in self._restoring:
+                return
+            self._restoring.add(animation_id)
+
+        def run():
+            try:
+                # Only animations the sweeper evicted; one whose conversion failed stays as it is
+                row = db.get_animation_info(animation_id)
+                if row and row.get('artifacts_evicted_at'):
+                    self.restore_audio(animation_id)
+            except Exception as e:
+                print(f"Storage: restoring audio of {animation_id} failed: {e}")
+            finally:
+                with self._lock:
+                    self._restoring.discard(animation_id)
+
+        threading.Thread(target=run, name=f'restore-audio-{animation_id}', daemon=True).start()
+
+    def enforce_quota(self, rows):
+        """
+        Evict least recently used artifacts until usage is below the low watermark.
+
+        Returns:
+            (usage_before, bytes_freed)
+        """
+        usage = self.disk_usage()
+        if not self.quota_bytes or usage <= self.quota_bytes:
+            return usage, 0
+        target = self.quota_bytes * self.low_watermark
+        print(f"Storage: {usage / (1024 * 1024):.1f} MB used, over the "
+              f"{self.quota_bytes / (1024 * 1024):.1f} MB quota; evicting down to {target / (1024 * 1024):.1f} MB")
+
+        # (last used, kind, item): cache entries by directory mtime, animations by last access
+        candidates = [(last_used, 'artifact', (kind, key))
+                      for kind, key, _, last_used in self.artifacts.entries()]
+        for row in rows:
+            if row['status'] not in EVICTABLE_STATUSES or self.is_busy(row['id']):
+                continue
+            last_used = row['last_accessed_at'] or _created_epoch(row['created_at'])
+            candidates.append((last_used, 'animation', row))
+        candidates.sort(key=lambda c: c[0])
+
+        freed = 0
+        for _, kind, item in candidates:
+            if usage - freed <= target:
+                break
+            try:
+                if kind == 'artifact':
+                    freed += self.artifacts.remove(*item)
+                else:
+                    freed += self.evict_animation(item)
+            except OSError as e:
+                print(f"Storage: eviction failed: {e}")
+        if usage - freed > target:
+            print(f"Warning: storage still over quota after eviction ({(usage - freed) / (1024 * 1024):.1f} MB); "
+                  "only source uploads remain")
+        return usage, freed
+
+    # --- sweeper ----------------------------------------------------------------
+
+    def sweep(self):
+        """
+        One full pass: flush access times, update sizes, remove orphans, enforce the quota.
+
+        Returns:
+            Summary dict, or None if another sweep is already running
+        """
+        if not self._sweep_lock.acquire(blocking=False):
+            return None
+        try:
+            started = time.perf_counter()
+            with self._lock:
+                accessed, self._accessed = self._accessed, {}
+            rows = db.list_storage_rows()
+            known = {row['id'] for row in rows}
+            accessed = {animation_id: t for animation_id, t in accessed.items() if animation_id in known}
+            if accessed:
+                db.set_last_accessed(accessed)
+            for row in rows:
+                if row['id'] in accessed:
+                    row['last_accessed_at'] = accessed[row['id']]
+                if not self.is_busy(row['id']):
+                    size = self.animation_size(row['id'])
+                    if size != row['size_bytes']:
+                        db.update_animation(row['id'], size_bytes=size)
+                        row['size_bytes'] = size
+
+            orphan_bytes = self.cleanup_orphans(known)
+            usage, evicted_bytes = self.enforce_quota(rows)
+            self._last_sweep = {
+                'finished_at': time.time(),
+                'seconds': time.perf_counter() - started,
+                'usage_bytes': usage - evicted_bytes,
+                'orphan_bytes_freed': orphan_bytes,
+                'evicted_bytes_freed': evicted_bytes,
+                'animations': len(rows),
+            }
+            return dict(self._last_sweep)
+        finally:
+            self._sweep_lock.release()
+
+    def _run(self):
+        while not self._stop.wait(self.sweep_seconds):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Storage sweep failed: {e}")
+                import traceback
+                traceback.print_exc()
+            finally:
+                # The sweeper thread's pooled connection isn't needed between sweeps
+                db.close_connection()
+
+    def start(self):
+        """Start the background sweeper (a daemon thread)"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='storage-sweeper', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return {
+            'quota_bytes': self.quota_bytes,
+            'low_watermark': self.low_watermark,
+            'sweep_seconds': self.sweep_seconds,
+            'last_sweep': dict(self._last_sweep) if self._last_sweep else None,
+        }
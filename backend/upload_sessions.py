@@ -0,0 +1,232 @@
+"""
+Resumable, chunked uploads.
+
+A session is opened with the list of files the browser is about to send
+(field, filename, size). Each file gets its final path up front and is
+pre-sized on disk, so chunks can arrive in any order, from parallel
+requests, and are written at their offset straight into place - there is no
+spool file and nothing is copied at the end. A SHA-256 of every file is
+advanced whenever its contiguous prefix grows, so it is normally complete by
+the time the last chunk lands.
+
+Received chunk numbers are persisted next to the files (upload_session.json),
+so after a dropped connection - or a server restart - the browser asks which
+chunks are missing and sends only those.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+SESSION_FILENAME = 'upload_session.json'
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+class UploadError(Exception):
+    """Raised for requests that don't fit the session (bad chunk, incomplete upload, ...)"""
+
+
+class UploadSession:
+    """
+    One resumable upload; the session id is the animation id it will create.
+
+    Args:
+        upload_id: Session / animation id
+        folder: Animation folder the files are written into
+        chunk_size: Size of every chunk except a file's last one
+        files: List of dicts with field, filename, size, path and optional sha256
+    """
+
+    def __init__(self, upload_id, folder, chunk_size, files, finalized=False):
+        self.upload_id = upload_id
+        self.folder = folder
+        self.chunk_size = chunk_size
+        self.files = files
+        self.finalized = finalized
+        self._lock = threading.Lock()
+        # file index -> (hasher, number of leading chunks hashed); in memory only,
+        # rebuilt from the file contents after a restart
+        self._hashers = {}
+        for f in files:
+            f['received'] = set(f.get('received', ()))
+
+    def total_chunks(self, file_id):
+        size = self.files[file_id]['size']
+        return max(1, -(-size // self.chunk_size))
+
+    def missing_chunks(self, file_id):
+        received = self.files[file_id]['received']
+        return [n for n in range(self.total_chunks(file_id)) if n not in received]
+
+    def _chunk_length(self, file_id, chunk_index):
+        size = self.files[file_id]['size']
+        return min(self.chunk_size, size - chunk_index * self.chunk_size)
+
+    def _advance_hash(self, file_id, fd=None, data=None, data_index=None):
+        """Hash every newly contiguous chunk of a file (caller holds the lock)"""
+        entry = self.files[file_id]
+        hasher, hashed = self._hashers.get(file_id, (None, 0))
+        if hasher is None:
+            hasher = hashlib.sha256()
+        close_fd = False
+        try:
+            while hashed in entry['received'] and hashed < self.total_chunks(file_id):
+                if hashed == data_index:
+                    hasher.update(data)
+                else:
+                    if fd is None:
+                        fd = os.open(entry['path'], os.O_RDONLY)
+                        close_fd = True
+                    hasher.update(os.pread(fd, self._chunk_length(file_id, hashed), hashed * self.chunk_size))
+                hashed += 1
+        finally:
+            if close_fd:
+                os.close(fd)
+        self._hashers[file_id] = (hasher, hashed)
+        return hashed == self.total_chunks(file_id)
+
+    def write_chunk(self, file_id, chunk_index, data):
+        """
+        Write one chunk at its offset in the final file.
+
+        Returns:
+            (chunks_received, file_complete)
+        """
+        if self.finalized:
+            raise UploadError('Upload already finalized')
+        if not 0 <= file_id < len(self.files):
+            raise UploadError(f'Unknown file {file_id}')
+        if not 0 <= chunk_index < self.total_chunks(file_id):
+            raise UploadError(f'Chunk {chunk_index} out of range for file {file_id}')
+        expected = self._chunk_length(file_id, chunk_index)
+        if len(data) != expected:
+            raise UploadError(f'Chunk {chunk_index} of file {file_id} is {len(data)} bytes, expected {expected}')
+
+        entry = self.files[file_id]
+        # Writes to different offsets don't need the lock; only bookkeeping does
+        fd = os.open(entry['path'], os.O_RDWR)
+        try:
+            os.pwrite(fd, data, chunk_index * self.chunk_size)
+            with self._lock:
+                entry['received'].add(chunk_index)
+                complete = self._advance_hash(file_id, fd, data, chunk_index)
+                self._save()
+                return len(entry['received']), complete
+        finally:
+            os.close(fd)
+
+    def finish(self):
+        """
+        Check every chunk arrived and every hash matches, and mark the session finalized.
+
+        Returns:
+            List of (field, path, sha256) in session order
+        """
+        with self._lock:
+            if self.finalized:
+                raise UploadError('Upload already finalized')
+            incomplete = [f['filename'] for i, f in enumerate(self.files) if self.missing_chunks(i)]
+            if incomplete:
+                raise UploadError(f"Upload incomplete, missing chunks for: {', '.join(incomplete)}")
+            results = []
+            for i, entry in enumerate(self.files):
+                self._advance_hash(i)
+                digest = self._hashers[i][0].hexdigest()
+                if entry.get('sha256') and entry['sha256'].lower() != digest:
+                    raise UploadError(f"Checksum mismatch for {entry['filename']}")
+                results.append((entry['field'], entry['path'], digest))
+            self.finalized = True
+            self._save()
+            return results
+
+    def reopen(self):
+        """Undo finish() after processing could not be started, so finalize can be retried"""
+        with self._lock:
+            self.finalized = False
+            self._save()
+
+    def to_dict(self):
+        return {
+            'upload_id': self.upload_id,
+            'chunk_size': self.chunk_size,
+            'finalized': self.finalized,
+            'files': [{
+                'file_id': i,
+                'field': f['field'],
+                'filename': f['filename'],
+                'size': f['size'],
+                'total_chunks': self.total_chunks(i),
+                'missing_chunks': self.missing_chunks(i),
+            } for i, f in enumerate(self.files)],
+        }
+
+    def _save(self):
+        state = {
+            'upload_id': self.upload_id,
+            'chunk_size': self.chunk_size,
+            'finalized': self.finalized,
+            'files': [{**f, 'received': sorted(f['received'])} for f in self.files],
+        }
+        path = os.path.join(self.folder, SESSION_FILENAME)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as fh:
+            json.dump(state, fh)
+        os.replace(tmp_path, path)
+
+
+class UploadSessionStore:
+    """
+    Open sessions by id, reloaded from their session file when not in memory.
+
+    Args:
+        root: Folder holding one animation folder per session
+        chunk_size: Chunk size handed out to new sessions
+    """
+
+    def __init__(self, root, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.root = root
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        self._sessions = {}
+
+    def create(self, upload_id, folder, files):
+        """
+        Open a session and pre-size every destination file.
+
+        Args:
+            upload_id: Session / animation id
+            folder: Animation folder
+            files: List of dicts with field, filename, size, path and optional sha256
+        """
+        for f in files:
+            os.makedirs(os.path.dirname(f['path']), exist_ok=True)
+            with open(f['path'], 'wb') as fh:
+                fh.truncate(f['size'])
+        session = UploadSession(upload_id, folder, self.chunk_size, files)
+        with session._lock:
+            session._save()
+        with self._lock:
+            self._sessions[upload_id] = session
+        return session
+
+    def get(self, upload_id):
+        """Return the session, or None if there is no such upload"""
+        with self._lock:
+            session = self._sessions.get(upload_id)
+            if session is not None:
+                return session
+            path = os.path.join(self.root, os.path.basename(upload_id), SESSION_FILENAME)
+            if not os.path.isfile(path):
+                return None
+            with open(path) as fh:
+                state = json.load(fh)
+            session = UploadSession(state['upload_id'], os.path.dirname(path), state['chunk_size'],
+                                    state['files'], state['finalized'])
+            self._sessions[upload_id] = session
+            return session
+
+    def discard(self, upload_id):
+        """Forget a finalized session (its state file stays as a record)"""
+        with self._lock:
+            self._sessions.pop(upload_id, None)
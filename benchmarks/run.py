@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Local benchmark suite for the ingest and alignment pipeline.
+
+    python benchmarks/run.py                      # run, compare with benchmarks/baseline.json
+    python benchmarks/run.py --save-baseline      # run and store the results as the baseline
+    python benchmarks/run.py --quick --only extract
+
+Every benchmark runs on synthetic inputs (see synthetic.py) in a scratch
+directory, is repeated --repeat times and reports the median wall-clock
+time. Results are written as JSON. When a baseline exists, any benchmark
+whose median is more than --max-regression slower (and at least
+--min-delta-ms slower in absolute terms, to ignore noise on tiny cases)
+fails the run with exit code 1.
+
+Baselines are machine specific: save one on the machine you compare on.
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'backend'))
+sys.path.insert(0, os.path.join(ROOT, 'aligner'))
+
+import synthetic
+
+DEFAULT_BASELINE = os.path.join(HERE, 'baseline.json')
+DEFAULT_MAX_REGRESSION = float(os.environ.get('BENCH_MAX_REGRESSION', 0.25))
+
+
+class Skip(Exception):
+    """A benchmark can't run here (missing tool or library)"""
+
+
+def timed(fn, repeat, setup=None):
+    """Median/min wall-clock seconds of fn() over `repeat` runs; setup() runs untimed before each"""
+    samples = []
+    result = None
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), min(samples), result
+
+
+# --- benchmarks -------------------------------------------------------------
+# Each takes (workdir, args) and returns a list of result dicts.
+
+def bench_extract_video_frames(workdir, args):
+    import app
+    if not app.CV2_AVAILABLE:
+        raise Skip('opencv-python not installed')
+    cases = [(320, 240, 2.0), (640, 480, 4.0)] if args.quick else [(320, 240, 5.0), (640, 480, 10.0), (1280, 720, 10.0)]
+    results = []
+    for width, height, seconds in cases:
+        video = synthetic.make_video(os.path.join(workdir, f'clip_{width}x{height}_{seconds:g}s.mp4'),
+                                     width, height, seconds)
+        out = os.path.join(workdir, 'frames_out')
+        median, best, paths = timed(lambda: app.extract_video_frames(video, out),
+                                    args.repeat, setup=lambda: shutil.rmtree(out, ignore_errors=True))
+        results.append({
+            'name': f'extract_video_frames[{width}x{height},{seconds:g}s]',
+            'seconds': median, 'min_seconds': best,
+            'items': len(paths), 'items_per_second': len(paths) / median if median else None,
+        })
+    return results
+
+
+def bench_convert_audio_to_wav(workdir, args):
+    import app
+    if not shutil.which('ffmpeg'):
+        raise Skip('ffmpeg not installed')
+    seconds = 30.0 if args.quick else 180.0
+    source = synthetic.make_speech_audio(os.path.join(workdir, 'speech.wav'), seconds)
+    out = os.path.join(workdir, 'converted.wav')
+    median, best, ok = timed(lambda: app.convert_audio_to_wav(source, out), args.repeat)
+    if not ok:
+        raise Skip('convert_audio_to_wav failed')
+    return [{'name': f'convert_audio_to_wav[{seconds:g}s]', 'seconds': median, 'min_seconds': best,
+             'audio_seconds_per_second': seconds / median if median else None}]
+
+
+def bench_db_inserts(workdir, args):
+    import db
+    user_frames = 100
+    extracted = 2400 if args.quick else 14400  # 100 s / 10 min of video at 24 fps
+    folder = os.path.join(workdir, 'db_frames')
+
+    def insert():
+        animation_id = str(uuid.uuid4())
+        db.insert_animation(animation_id, 'video.mp4', 'audio.wav', 'face.png', 'queued',
+                            frames=[(os.path.join(folder, f'frame_{i + 1:03d}.png'), i) for i in range(user_frames)])
+        db.insert_extracted_frames(animation_id,
+                                   [os.path.join(folder, f'frame_{i + 1:06d}.png') for i in range(extracted)],
+                                   start_order=db.EXTRACTED_FRAME_ORDER_START)
+        return animation_id
+
+    median, best, animation_id = timed(insert, args.repeat)
+    read_median, read_best, rows = timed(lambda: db.get_frames(animation_id), args.repeat)
+    return [
+        {'name': f'db_insert_frames[{user_frames}+{extracted}]', 'seconds': median, 'min_seconds': best},
+        {'name': f'db_get_frames[{user_frames}+{extracted}]', 'seconds': read_median, 'min_seconds': read_best,
+         'items': len(rows)},
+    ]
+
+
+def bench_process_csv(workdir, args):
+    import estimate_mouth_center
+    rows = 20000 if args.quick else 200000
+    source = synthetic.make_landmarks_csv(os.path.join(workdir, 'landmarks.csv'), rows)
+    out = os.path.join(workdir, 'landmarks_mouth.csv')
+    median, best, _ = timed(lambda: estimate_mouth_center.process_csv(source, out), args.repeat)
+    return [{'name': f'process_csv[{rows} rows]', 'seconds': median, 'min_seconds': best,
+             'items': rows, 'items_per_second': rows / median if median else None}]
+
+
+def bench_textgrid_to_visemes(workdir, args):
+    try:
+        import mytextgrid
+        import process
+    except ImportError as e:
+        raise Skip(str(e))
+    seconds = 60.0 if args.quick else 600.0
+    path = synthetic.make_textgrid(os.path.join(workdir, 'speech.TextGrid'), seconds)
+    parse_median, parse_best, tg = timed(lambda: mytextgrid.read_textgrid(path), args.repeat)
+    median, best, timeline = timed(lambda: process.textgrid_to_visemes(tg, fps=process.DEFAULT_FPS), args.repeat)
+    return [
+        {'name': f'read_textgrid[{seconds:g}s]', 'seconds': parse_median, 'min_seconds': parse_best},
+        {'name': f'textgrid_to_visemes[{seconds:g}s]', 'seconds': median, 'min_seconds': best,
+         'items': len(timeline)},
+    ]
+
+
+def bench_submit_end_to_end(workdir, args):
+    import app
+    import jobs
+    if not app.CV2_AVAILABLE:
+        raise Skip('opencv-python not installed')
+    seconds = 2.0 if args.quick else 5.0
+    video = synthetic.make_video(os.path.join(workdir, 'submit.mp4'), 640, 480, seconds)
+    audio = synthetic.make_speech_audio(os.path.join(workdir, 'submit.wav'), seconds)
+    with open(video, 'rb') as f:
+        video_bytes = f.read()
+    with open(audio, 'rb') as f:
+        audio_bytes = f.read()
+    image = b'\x89PNG\r\n\x1a\n' + b'\0' * 1024
+    client = app.app.test_client()
+
+    # process_animation writes into the repo's aligner/data and audionames.txt
+    aligner_data = os.path.join(ROOT, 'aligner', 'data')
+    audionames = os.path.join(ROOT, 'audionames.txt')
+    saved_audionames = open(audionames, 'rb').read() if os.path.exists(audionames) else None
+    created = []
+
+    def submit():
+        response = client.post('/api/submit', content_type='multipart/form-data', data={
+            'video': (io.BytesIO(video_bytes), os.path.basename(video)),
+            'audio': (io.BytesIO(audio_bytes), 'speech.wav'),
+            'face_reference': (io.BytesIO(image), 'face.png'),
+            'frames': [(io.BytesIO(image), f'{i}.png') for i in range(12)],
+        })
+        if response.status_code != 202:
+            raise RuntimeError(f'/api/submit returned {response.status_code}: {response.get_json()}')
+        accepted = time.perf_counter()
+        animation_id = response.get_json()['animation_id']
+        created.append(animation_id)
+        while True:
+            status = client.get(f'/api/animations/{animation_id}/status').get_json()
+            if status['status'] == jobs.STATUS_FAILED:
+                raise RuntimeError(f'Processing failed: {status.get("error")}')
+            if status['done']:
+                return accepted
+            time.sleep(0.01)
+
+    try:
+        request_samples = []
+        total_samples = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            accepted = submit()
+            request_samples.append(accepted - start)
+            total_samples.append(time.perf_counter() - start)
+    finally:
+        for animation_id in created:
+            for ext in ('.wav', '.txt'):
+                path = os.path.join(aligner_data, animation_id + ext)
+                if os.path.exists(path):
+                    os.remove(path)
+        if saved_audionames is not None:
+            with open(audionames, 'wb') as f:
+                f.write(saved_audionames)
+    return [
+        {'name': f'submit_request[{seconds:g}s]', 'seconds': statistics.median(request_samples),
+         'min_seconds': min(request_samples)},
+        {'name': f'submit_to_ready[{seconds:g}s]', 'seconds': statistics.median(total_samples),
+         'min_seconds': min(total_samples)},
+    ]
+
+
+BENCHMARKS = [
+    ('extract_video_frames', bench_extract_video_frames),
+    ('convert_audio_to_wav', bench_convert_audio_to_wav),
+    ('db_inserts', bench_db_inserts),
+    ('process_csv', bench_process_csv),
+    ('textgrid_to_visemes', bench_textgrid_to_visemes),
+    ('submit_end_to_end', bench_submit_end_to_end),
+]
+
+
+# --- baseline comparison ----------------------------------------------------
+
+def compare(results, baseline, max_regression, min_delta_ms):
+    """Return a list of (name, baseline_seconds, seconds, change) for regressed benchmarks"""
+    previous = {r['name']: r for r in baseline.get('results', [])}
+    regressions = []
+    print(f"\n{'benchmark':<44} {'baseline':>10} {'now':>10} {'change':>8}")
+    for result in results:
+        before = previous.get(result['name'])
+        if before is None:
+            print(f"{result['name']:<44} {'-':>10} {result['seconds'] * 1000:>8.1f}ms {'new':>8}")
+            continue
+        change = result['seconds'] / before['seconds'] - 1 if before['seconds'] else 0.0
+        delta_ms = (result['seconds'] - before['seconds']) * 1000
+        regressed = change > max_regression and delta_ms > min_delta_ms
+        marker = '  REGRESSION' if regressed else ''
+        print(f"{result['name']:<44} {before['seconds'] * 1000:>8.1f}ms {result['seconds'] * 1000:>8.1f}ms "
+              f"{change:>+7.1%}{marker}")
+        if regressed:
+            regressions.append((result['name'], before['seconds'], result['seconds'], change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the ingest and alignment pipeline on synthetic data')
+    parser.add_argument('--output', default=None, help='Write results JSON here (default: print only)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline JSON to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='Store these results as the baseline')
+    parser.add_argument('--max-regression', type=float, default=DEFAULT_MAX_REGRESSION,
+                        help='Allowed slowdown as a fraction of the baseline (default 0.25 = 25%%)')
+    parser.add_argument('--min-delta-ms', type=float, default=5.0,
+                        help='Ignore slowdowns smaller than this many milliseconds (default 5)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per benchmark; the median is reported')
+    parser.add_argument('--quick', action='store_true', help='Smaller inputs for a fast smoke run')
+    parser.add_argument('--only', action='append', default=[],
+                        help='Run only benchmarks whose name contains this (repeatable)')
+    parser.add_argument('--keep', action='store_true', help='Keep the scratch directory')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='mouth-animate-bench-')
+    # app.py and db.py use paths relative to the working directory
+    os.environ.setdefault('ANIMATIONS_DB', os.path.join(workdir, 'animations.db'))
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    results = []
+    skipped = {}
+    try:
+        import db
+        db.init_db()
+        for name, bench in BENCHMARKS:
+            if args.only and not any(pattern in name for pattern in args.only):
+                continue
+            print(f"\n=== {name} ===")
+            try:
+                results.extend(bench(workdir, args))
+            except Skip as e:
+                print(f"Skipped: {e}")
+                skipped[name] = str(e)
+    finally:
+        os.chdir(cwd)
+        if args.keep:
+            print(f"\nScratch directory kept at {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'machine': {'platform': platform.platform(), 'python': platform.python_version(),
+                    'cpus': os.cpu_count()},
+        'quick': args.quick,
+        'repeat': args.repeat,
+        'results': results,
+        'skipped': skipped,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults saved to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one")
+        for result in results:
+            print(f"  {result['name']:<44} {result['seconds'] * 1000:>8.1f}ms")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get('quick') != args.quick:
+        print("\nWarning: baseline and this run use different input sizes (--quick); names won't match")
+    regressions = compare(results, baseline, args.max_regression, args.min_delta_ms)
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) regressed by more than {args.max_regression:.0%}")
+        return 1
+    print("\nNo regressions")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+Synthetic inputs for the benchmark suite.
+
+Everything is generated from a seed, so two runs on the same machine
+benchmark identical bytes:
+
+- make_video: a talking-head-ish clip (moving gradient background, a face
+  blob and a mouth that opens and closes) at any resolution and length
+- make_speech_audio: speech-like 16-bit WAV - voiced syllables with a
+  wandering pitch and formant-ish harmonics, separated by short pauses
+- make_landmarks_csv: an OpenFace-style landmark CSV
+- make_textgrid: an MFA-style TextGrid with words and phones tiers
+"""
+
+import os
+import sys
+import wave
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORDS = ("the", "birch", "canoe", "slid", "on", "smooth", "planks", "glue", "sheet", "to",
+         "dark", "blue", "background", "it", "is", "easy", "tell", "depth", "of", "well")
+
+
+def make_video(path, width=640, height=480, seconds=5.0, fps=24, seed=0):
+    """
+    Write a synthetic clip with OpenCV and return the path actually written.
+
+    MP4 (mp4v) is tried first; if the local OpenCV build can't write it the
+    clip is written as MJPG .avi next to the requested path instead.
+    """
+    import cv2
+
+    rng = np.random.default_rng(seed)
+    n_frames = int(round(seconds * fps))
+    candidates = [(path, 'mp4v'), (os.path.splitext(path)[0] + '.avi', 'MJPG')]
+    for out_path, fourcc in candidates:
+        writer = cv2.VideoWriter(out_path, cv2.VideoWriter_fourcc(*fourcc), fps, (width, height))
+        if writer.isOpened():
+            break
+        writer.release()
+    else:
+        raise RuntimeError("OpenCV can't write mp4v or MJPG video here")
+
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    noise = rng.integers(0, 12, size=(height, width, 1), dtype=np.uint8)
+    face_center = (width // 2, height // 2)
+    face_axes = (max(2, width // 6), max(2, height // 4))
+    for i in range(n_frames):
+        t = i / fps
+        background = (xx / width * 120 + yy / height * 60 + t * 40) % 255
+        frame = np.repeat(background[:, :, None], 3, axis=2).astype(np.uint8) + noise
+        # Head sways a little, mouth opens at a syllable-ish rate
+        cx = face_center[0] + int(width * 0.02 * np.sin(2 * np.pi * 0.3 * t))
+        cv2.ellipse(frame, (cx, face_center[1]), face_axes, 0, 0, 360, (150, 170, 210), -1)
+        mouth_open = max(1, int(face_axes[1] * 0.15 * (0.5 + 0.5 * np.sin(2 * np.pi * 4 * t))))
+        mouth_center = (cx, face_center[1] + face_axes[1] // 2)
+        cv2.ellipse(frame, mouth_center, (max(1, face_axes[0] // 3), mouth_open), 0, 0, 360, (40, 30, 90), -1)
+        writer.write(frame)
+    writer.release()
+    return out_path
+
+
+def make_speech_audio(path, seconds=10.0, sample_rate=16000, seed=0):
+    """Write a mono 16-bit WAV of speech-like syllables and pauses"""
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sample_rate)
+    audio = np.zeros(n, dtype=np.float64)
+    pos = 0
+    while pos < n:
+        syllable = int(rng.uniform(0.12, 0.3) * sample_rate)
+        pause = int(rng.choice([0.03, 0.05, 0.25]) * sample_rate)
+        end = min(n, pos + syllable)
+        t = np.arange(end - pos) / sample_rate
+        f0 = rng.uniform(100, 180) * (1 + 0.05 * np.sin(2 * np.pi * 3 * t))
+        phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+        voiced = sum(np.sin(k * phase) / k for k in range(1, 12))
+        # Crude formant emphasis around 500 Hz and 1500 Hz
+        voiced += 0.5 * np.sin(2 * np.pi * rng.uniform(400, 700) * t)
+        voiced += 0.3 * np.sin(2 * np.pi * rng.uniform(1200, 1800) * t)
+        envelope = np.sin(np.pi * np.linspace(0, 1, end - pos)) ** 0.5
+        audio[pos:end] = voiced * envelope
+        pos = end + pause
+    audio += rng.normal(0, 0.01, n)
+    audio /= max(1e-9, np.abs(audio).max()) / 0.8
+    with wave.open(path, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes((audio * 32767).astype('<i2').tobytes())
+    return path
+
+
+def make_landmarks_csv(path, rows=10000, extra_columns=0, seed=0):
+    """
+    Write an OpenFace-style CSV (", " separated) with 68 landmarks per row.
+
+    extra_columns adds filler columns (pose, AUs, ...) to mimic full OpenFace output.
+    """
+    rng = np.random.default_rng(seed)
+    base_x = np.linspace(200, 440, 68)
+    base_y = np.concatenate([np.linspace(200, 420, 17), np.linspace(180, 380, 51)])
+    xs = base_x + rng.normal(0, 2, size=(rows, 68))
+    ys = base_y + rng.normal(0, 2, size=(rows, 68))
+    header = ['frame', 'face_id', 'timestamp', 'confidence', 'success']
+    header += [f'x_{i}' for i in range(68)] + [f'y_{i}' for i in range(68)]
+    header += [f'extra_{i}' for i in range(extra_columns)]
+    frames = np.arange(1, rows + 1)
+    columns = [frames, np.zeros(rows), frames / 24.0, np.full(rows, 0.98), np.ones(rows)]
+    columns += list(xs.T) + list(ys.T)
+    columns += list(rng.random((extra_columns, rows)))
+    data = np.column_stack(columns)
+    np.savetxt(path, data, delimiter=', ', header=', '.join(header), comments='', fmt='%.3f')
+    return path
+
+
+def make_textgrid(path, seconds=60.0, words_per_second=2.5, seed=0):
+    """Write a words/phones TextGrid (one phone per letter) covering `seconds`"""
+    sys.path.insert(0, os.path.join(ROOT, 'aligner'))
+    from stub_mfa import write_textgrid
+
+    rng = np.random.default_rng(seed)
+    words = list(rng.choice(WORDS, size=max(1, int(seconds * words_per_second))))
+    write_textgrid(path, words, seconds)
+    return path
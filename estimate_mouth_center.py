@@ -6,7 +6,7 @@ Uses nose tip, chin, and jaw landmarks to calculate mouth center position.
 
 import pandas as pd
 import numpy as np
-import sys
+import os
 
 
 def estimate_mouth_center(row):
@@ -53,26 +53,110 @@ def estimate_mouth_center(row):
     return x_center, y_center
 
 
-def process_csv(input_csv, output_csv=None):
+# Only these columns are read from OpenFace CSVs (~700 columns wide)
+LANDMARK_COLUMNS = [
+    'x_30', 'y_30',          # nose tip
+    'y_8',                   # chin
+    'x_3', 'x_4', 'x_5',     # left jaw
+    'x_11', 'x_12', 'x_13',  # right jaw
+]
+INTERPOLATION_FACTOR = 0.45
+DEFAULT_CHUNKSIZE = 100000
+
+
+def _wanted_column(column):
+    # OpenFace CSVs have spaces after commas, so header names come with leading whitespace
+    return column.strip() in LANDMARK_COLUMNS or column.strip() == 'frame'
+
+
+def estimate_mouth_centers(df):
+    """
+    Vectorized estimate_mouth_center over every row of a DataFrame.
+    
+    Args:
+        df: DataFrame with (stripped) OpenFace landmark columns
+        
+    Returns:
+        tuple: (x_centers, y_centers) NumPy arrays, one entry per row
+    """
+    nose_tip_x = df['x_30'].to_numpy(dtype=np.float64)
+    nose_tip_y = df['y_30'].to_numpy(dtype=np.float64)
+    chin_y = df['y_8'].to_numpy(dtype=np.float64)
+    left_jaw_x = df[['x_3', 'x_4', 'x_5']].to_numpy(dtype=np.float64).mean(axis=1)
+    right_jaw_x = df[['x_11', 'x_12', 'x_13']].to_numpy(dtype=np.float64).mean(axis=1)
+    
+    x_center = (nose_tip_x + left_jaw_x + right_jaw_x) / 3.0
+    y_center = nose_tip_y + INTERPOLATION_FACTOR * (chin_y - nose_tip_y)
+    return x_center, y_center
+
+
+def load_landmarks(input_csv, all_columns=False, chunksize=None, **read_csv_kwargs):
+    """
+    Read an OpenFace CSV, by default only the frame and landmark columns.
+    
+    Args:
+        input_csv: Path to OpenFace CSV file
+        all_columns: Read every column instead of just LANDMARK_COLUMNS
+        chunksize: If set, return an iterator of DataFrames of this many rows
+        
+    Returns:
+        DataFrame (or iterator of DataFrames) with stripped column names
+    """
+    usecols = None if all_columns else _wanted_column
+    reader = pd.read_csv(input_csv, usecols=usecols, chunksize=chunksize, skipinitialspace=True,
+                         **read_csv_kwargs)
+    if chunksize is None:
+        reader.columns = reader.columns.str.strip()
+        return reader
+    return _strip_chunks(reader)
+
+
+def _strip_chunks(reader):
+    for chunk in reader:
+        chunk.columns = chunk.columns.str.strip()
+        yield chunk
+
+
+def _add_mouth_centers(df):
+    x_center, y_center = estimate_mouth_centers(df)
+    # Concatenate rather than assign: with all_columns the frame has ~700 columns
+    # and per-column inserts trigger pandas fragmentation warnings
+    centers = pd.DataFrame({'mouth_center_x': x_center, 'mouth_center_y': y_center}, index=df.index)
+    return pd.concat([df, centers], axis=1)
+
+
+def _print_mouth_centers(df, start_index=0):
+    frames = df['frame'].to_numpy() if 'frame' in df.columns else np.arange(start_index, start_index + len(df))
+    lines = [f"{frame}, {x:.2f}, {y:.2f}"
+             for frame, x, y in zip(frames, df['mouth_center_x'].to_numpy(), df['mouth_center_y'].to_numpy())]
+    if lines:
+        print("\n".join(lines))
+
+
+def process_csv(input_csv, output_csv=None, chunksize=None, all_columns=False):
     """
     Process OpenFace CSV file and add mouth center estimates.
     
     Args:
         input_csv: Path to input CSV file with OpenFace landmarks
         output_csv: Optional path to output CSV (if None, prints to stdout)
+        chunksize: Stream the file in chunks of this many rows instead of
+            loading it whole (for multi-hour landmark files)
+        all_columns: Keep every OpenFace column in the output instead of
+            only frame, landmark and mouth center columns
+        
+    Returns:
+        DataFrame with mouth_center_x/mouth_center_y columns, or the number of
+        rows processed when streaming with chunksize
     """
-    # Read the CSV file
-    df = pd.read_csv(input_csv)
+    if chunksize:
+        return _process_csv_chunked(input_csv, output_csv, chunksize, all_columns)
     
-    # Strip whitespace from column names (OpenFace CSVs have spaces after commas)
-    df.columns = df.columns.str.strip()
+    # Read the CSV file (column names are stripped by load_landmarks)
+    df = load_landmarks(input_csv, all_columns=all_columns)
     
-    # Calculate mouth center for each frame
-    mouth_centers = df.apply(estimate_mouth_center, axis=1)
-    
-    # Add mouth center columns to dataframe
-    df['mouth_center_x'] = mouth_centers.apply(lambda x: x[0])
-    df['mouth_center_y'] = mouth_centers.apply(lambda x: x[1])
+    # Calculate mouth center for every frame at once
+    df = _add_mouth_centers(df)
     
     # Output results
     if output_csv:
@@ -81,13 +165,68 @@ def process_csv(input_csv, output_csv=None):
     else:
         # Print just the mouth center coordinates
         print("frame, mouth_center_x, mouth_center_y")
-        for idx, row in df.iterrows():
-            frame = row.get('frame', idx)
-            print(f"{frame}, {row['mouth_center_x']:.2f}, {row['mouth_center_y']:.2f}")
+        _print_mouth_centers(df)
     
     return df
 
 
+def _process_csv_chunked(input_csv, output_csv, chunksize, all_columns):
+    rows = 0
+    if not output_csv:
+        print("frame, mouth_center_x, mouth_center_y")
+    for chunk in load_landmarks(input_csv, all_columns=all_columns, chunksize=chunksize):
+        chunk = _add_mouth_centers(chunk)
+        if output_csv:
+            # Header only with the first chunk, then append
+            chunk.to_csv(output_csv, index=False, mode='w' if rows == 0 else 'a', header=rows == 0)
+        else:
+            _print_mouth_centers(chunk, start_index=rows)
+        rows += len(chunk)
+    if output_csv:
+        print(f"Results saved to {output_csv} ({rows} frames)")
+    return rows
+
+
+def _process_file_job(args):
+    input_csv, output_csv, chunksize, all_columns = args
+    # Stream every file when chunksize is given so each worker's memory stays bounded
+    result = process_csv(input_csv, output_csv, chunksize=chunksize, all_columns=all_columns)
+    return input_csv, result if chunksize else len(result)
+
+
+def process_directory(input_dir, output_dir, workers=None, chunksize=None, all_columns=False):
+    """
+    Process every CSV in a directory across a process pool.
+    
+    Args:
+        input_dir: Directory of OpenFace CSV files
+        output_dir: Directory for <name>_mouth.csv outputs
+        workers: Number of processes (default: CPU count)
+        chunksize: Stream each file in chunks of this many rows
+        all_columns: Keep every OpenFace column in the output
+        
+    Returns:
+        dict: input path -> number of frames processed
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = []
+    for name in sorted(os.listdir(input_dir)):
+        if not name.lower().endswith('.csv'):
+            continue
+        stem = os.path.splitext(name)[0]
+        jobs.append((os.path.join(input_dir, name), os.path.join(output_dir, f"{stem}_mouth.csv"),
+                     chunksize, all_columns))
+    
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for input_csv, rows in executor.map(_process_file_job, jobs):
+            results[input_csv] = rows
+    print(f"Processed {len(results)} CSV files into {output_dir}")
+    return results
+
+
 def estimate_single_frame(csv_file, frame_num=0):
     """
     Estimate mouth center for a single frame.
@@ -99,33 +238,44 @@ def estimate_single_frame(csv_file, frame_num=0):
     Returns:
         tuple: (x_center, y_center) coordinates
     """
-    df = pd.read_csv(csv_file)
-    
-    # Strip whitespace from column names
-    df.columns = df.columns.str.strip()
+    # Skip straight to the requested row instead of parsing the whole file
+    df = load_landmarks(csv_file, skiprows=range(1, frame_num + 1), nrows=1)
     
-    if frame_num >= len(df):
-        raise ValueError(f"Frame {frame_num} not found in CSV (only {len(df)} frames)")
+    if len(df) == 0:
+        with open(csv_file) as f:
+            total = sum(1 for _ in f) - 1
+        raise ValueError(f"Frame {frame_num} not found in CSV (only {total} frames)")
     
-    row = df.iloc[frame_num]
-    x_center, y_center = estimate_mouth_center(row)
+    x_centers, y_centers = estimate_mouth_centers(df)
+    x_center, y_center = float(x_centers[0]), float(y_centers[0])
     
     print(f"Frame {frame_num}: Mouth center at ({x_center:.2f}, {y_center:.2f})")
     return x_center, y_center
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python estimate_mouth_center.py <input_csv> [output_csv]")
-        print("   Or: python estimate_mouth_center.py <input_csv> --frame <frame_num>")
-        sys.exit(1)
+    import argparse
     
-    input_file = sys.argv[1]
+    parser = argparse.ArgumentParser(
+        description="Estimate mouth centers from OpenFace landmark CSVs",
+        usage="python estimate_mouth_center.py <input_csv|input_dir> [output_csv|output_dir] "
+              "[--frame N] [--chunksize N] [--workers N] [--all-columns]"
+    )
+    parser.add_argument('input', help="OpenFace CSV, or a directory of CSVs")
+    parser.add_argument('output', nargs='?', help="Output CSV (or directory when input is a directory)")
+    parser.add_argument('--frame', type=int, nargs='?', const=0, help="Only estimate this frame")
+    parser.add_argument('--chunksize', type=int, nargs='?', const=DEFAULT_CHUNKSIZE,
+                        help=f"Stream the CSV in chunks of N rows (default {DEFAULT_CHUNKSIZE})")
+    parser.add_argument('--workers', type=int, help="Processes for directory mode (default: CPU count)")
+    parser.add_argument('--all-columns', action='store_true', help="Keep every OpenFace column in the output")
+    args = parser.parse_args()
     
-    # Check if processing single frame
-    if len(sys.argv) > 2 and sys.argv[2] == '--frame':
-        frame_num = int(sys.argv[3]) if len(sys.argv) > 3 else 0
-        estimate_single_frame(input_file, frame_num)
+    if os.path.isdir(args.input):
+        if not args.output:
+            parser.error("output directory is required when input is a directory")
+        process_directory(args.input, args.output, workers=args.workers, chunksize=args.chunksize,
+                          all_columns=args.all_columns)
+    elif args.frame is not None:
+        estimate_single_frame(args.input, args.frame)
     else:
-        output_file = sys.argv[2] if len(sys.argv) > 2 else None
-        process_csv(input_file, output_file)
+        process_csv(args.input, args.output, chunksize=args.chunksize, all_columns=args.all_columns)
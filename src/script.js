@@ -331,7 +331,155 @@ document.addEventListener('DOMContentLoaded', () => {
     // Submit button functionality
     const submitButton = document.getElementById('submitButton');
     const loadingPage = document.getElementById('loadingPage');
+    const loadingStatus = document.getElementById('loadingStatus');
     const mainContainer = document.querySelector('.container');
+
+    const STATUS_POLL_INTERVAL_MS = 1000;
+    const STAGE_LABELS = {
+        queued: 'Waiting in queue...',
+        extracting_frames: 'Extracting video frames',
+        converting_audio: 'Converting audio',
+        storing_frames: 'Saving frames',
+        ready: 'Done!',
+        failed: 'Processing failed'
+    };
+
+    function showStatus(status) {
+        if (!loadingStatus) return;
+        let text = STAGE_LABELS[status.status] || status.status;
+        const progress = status.progress || {};
+        if (status.status === 'extracting_frames' && progress.frames_extracted) {
+            text += progress.total_frames
+                ? ` (${progress.frames_extracted}/${progress.total_frames})`
+                : ` (${progress.frames_extracted})`;
+        }
+        loadingStatus.textContent = text;
+    }
+
+    // Poll the backend until the animation reaches 'ready' or 'failed'
+    function pollAnimationStatus(animationId) {
+        const STATUS_URL = `http://localhost:5001/api/animations/${animationId}/status`;
+        return new Promise((resolve, reject) => {
+            const poll = () => {
+                fetch(STATUS_URL)
+                    .then(response => {
+                        if (!response.ok) {
+                            throw new Error(`Status check failed: ${response.status}`);
+                        }
+                        return response.json();
+                    })
+                    .then(status => {
+                        console.log('Processing status:', status.status, status.progress);
+                        showStatus(status);
+                        if (status.status === 'failed') {
+                            reject(new Error(status.error || 'Processing failed'));
+                        } else if (status.done) {
+                            resolve(status);
+                        } else {
+                            setTimeout(poll, STATUS_POLL_INTERVAL_MS);
+                        }
+                    })
+                    .catch(reject);
+            };
+            poll();
+        });
+    }
+    
+    const API_BASE = 'http://localhost:5001/api';
+    const UPLOAD_PARALLEL_CHUNKS = 4;
+    const UPLOAD_CHUNK_RETRIES = 3;
+
+    function jsonOrThrow(response) {
+        if (!response.ok) {
+            return response.json()
+                .catch(() => ({}))
+                .then(err => {
+                    throw new Error(err.error || `Server error: ${response.status}`);
+                });
+        }
+        return response.json();
+    }
+
+    function putChunk(uploadId, fileId, chunkIndex, blob, attempt = 0) {
+        return fetch(`${API_BASE}/uploads/${uploadId}/files/${fileId}/chunks/${chunkIndex}`, {
+            method: 'PUT',
+            headers: { 'Content-Type': 'application/octet-stream' },
+            body: blob
+        })
+            .then(jsonOrThrow)
+            .catch(error => {
+                if (attempt >= UPLOAD_CHUNK_RETRIES) throw error;
+                // Back off and resend just this chunk
+                const delay = 500 * 2 ** attempt;
+                return new Promise(resolve => setTimeout(resolve, delay))
+                    .then(() => putChunk(uploadId, fileId, chunkIndex, blob, attempt + 1));
+            });
+    }
+
+    // Send every missing chunk, UPLOAD_PARALLEL_CHUNKS requests at a time
+    function uploadChunks(session, blobs) {
+        const pending = [];
+        let totalBytes = 0;
+        session.files.forEach(file => {
+            totalBytes += file.size;
+            file.missing_chunks.forEach(n => pending.push([file.file_id, n]));
+        });
+        const doneBefore = totalBytes - pending.reduce((sum, [fileId, n]) => {
+            const file = session.files[fileId];
+            return sum + Math.min(session.chunk_size, file.size - n * session.chunk_size);
+        }, 0);
+        let sentBytes = doneBefore;
+
+        const worker = () => {
+            const next = pending.shift();
+            if (!next) return Promise.resolve();
+            const [fileId, n] = next;
+            const start = n * session.chunk_size;
+            const blob = blobs[fileId].slice(start, start + session.chunk_size);
+            return putChunk(session.upload_id, fileId, n, blob).then(() => {
+                sentBytes += blob.size;
+                if (loadingStatus && totalBytes > 0) {
+                    loadingStatus.textContent = `Uploading files (${Math.round(100 * sentBytes / totalBytes)}%)`;
+                }
+                return worker();
+            });
+        };
+        const workers = [];
+        for (let i = 0; i < UPLOAD_PARALLEL_CHUNKS; i++) {
+            workers.push(worker());
+        }
+        return Promise.all(workers);
+    }
+
+    // Resumable upload: open a session, PUT the chunks in parallel, then finalize.
+    // If anything fails, the session is re-read and only the missing chunks are resent.
+    function uploadFiles(entries, resumeAttempts = 2) {
+        const blobs = entries.map(entry => entry.file);
+        const spec = entries.map(entry => ({
+            field: entry.field,
+            filename: entry.file.name,
+            size: entry.file.size
+        }));
+        const finalize = uploadId => fetch(`${API_BASE}/uploads/${uploadId}/finalize`, { method: 'POST' })
+            .then(jsonOrThrow);
+        const send = (session, attemptsLeft) => uploadChunks(session, blobs)
+            .then(() => finalize(session.upload_id))
+            .catch(error => {
+                if (attemptsLeft <= 0) throw error;
+                console.warn('Upload interrupted, resuming:', error);
+                return fetch(`${API_BASE}/uploads/${session.upload_id}`)
+                    .then(jsonOrThrow)
+                    .then(current => send(current, attemptsLeft - 1));
+            });
+
+        return fetch(`${API_BASE}/uploads`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ files: spec })
+        })
+            .then(jsonOrThrow)
+            .then(session => send(session, resumeAttempts));
+    }
     
     if (submitButton) {
         submitButton.addEventListener('click', (e) => {
@@ -359,33 +507,24 @@ document.addEventListener('DOMContentLoaded', () => {
                     loadingPage.classList.add('visible');
                 }
                 
-                // Create FormData and send files to server
-                const formData = new FormData();
-                formData.append('video', videoFile);
-                formData.append('audio', audioFile);
-                formData.append('face_reference', faceReferenceFile);
+                // Upload in resumable chunks; frames keep their selection order
+                const entries = [
+                    { field: 'video', file: videoFile },
+                    { field: 'audio', file: audioFile },
+                    { field: 'face_reference', file: faceReferenceFile }
+                ];
                 for (let i = 0; i < frameFiles.length; i++) {
-                    formData.append('frames', frameFiles[i]);
+                    entries.push({ field: 'frames', file: frameFiles[i] });
                 }
                 
-                // Use the backend server URL - change port here if you changed it in app.py
-                const API_URL = 'http://localhost:5001/api/submit';
-                
-                fetch(API_URL, { 
-                    method: 'POST', 
-                    body: formData 
-                })
-                .then(response => {
-                    if (!response.ok) {
-                        return response.json().then(err => {
-                            throw new Error(err.error || `Server error: ${response.status}`);
-                        });
-                    }
-                    return response.json();
-                })
+                uploadFiles(entries)
                 .then(data => {
                     console.log('Files uploaded successfully:', data);
-                    // Handle success - files uploaded, processing continues
+                    // Server returns 202 and processes in the background - poll until done
+                    return pollAnimationStatus(data.animation_id);
+                })
+                .then(status => {
+                    console.log('Processing finished:', status);
                 })
                 .catch(error => {
                     console.error('Upload error:', error);
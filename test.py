@@ -2,6 +2,7 @@
 import requests
 import os
 import json
+import time
 
 # File paths
 audio_path = os.path.join(os.path.dirname(__file__), "aligner", "data", "harvard.wav")
@@ -79,9 +80,18 @@ try:
         main_response = requests.post(MAIN_API_URL, files=files)
 
     print(f"   Status: {main_response.status_code}")
-    if main_response.status_code == 200:
+    if main_response.status_code in (200, 202):
         main_result = main_response.json()
         print(f"   Response: {json.dumps(main_result, indent=2)}")
+        # Processing runs in the background; poll the job until it finishes
+        job_url = f"{MAIN_API_URL.rsplit('/', 1)[0]}/jobs/{main_result['job_id']}"
+        while True:
+            job = requests.get(job_url).json()
+            print(f"   Job status: {job['status']}")
+            if job["status"] in ("done", "failed"):
+                print(f"   Job: {json.dumps(job, indent=2)}")
+                break
+            time.sleep(2)
     else:
         print(f"   Error: {main_response.text}")
 except Exception as e:
@@ -0,0 +1,118 @@
+"""
+Benchmark the CPU inference profile: fp32 vs int8 dynamic quantization.
+
+For each model and thread count, reports load time, median transcription
+time, real-time factor (transcription time / audio duration; below 1 is
+faster than real time), word error rate against the reference transcript
+and the int8 model's word error drift from the fp32 baseline (WER of the
+int8 transcript measured against the fp32 one).
+
+    python benchmark_cpu.py --models turbo base --threads 4 8
+"""
+
+import argparse
+import gc
+import json
+import os
+import statistics
+import time
+
+import cpu_profile
+from longform import SAMPLE_RATE, word_error_rate
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "aligner", "data")
+
+
+def parameter_bytes(model):
+    """In-memory size of a model's weights, including packed int8 weights"""
+    total = 0
+    for tensor in list(model.parameters()) + list(model.buffers()):
+        total += tensor.numel() * tensor.element_size()
+    for module in model.modules():
+        packed = getattr(module, "_packed_params", None)
+        if packed is not None:
+            weight, bias = packed._weight_bias()
+            total += weight.numel() * weight.element_size()
+            if bias is not None:
+                total += bias.numel() * bias.element_size()
+    return total
+
+
+def run(model_name, quantize, audio, repeat, download_root=None):
+    started = time.perf_counter()
+    model = cpu_profile.load_model(model_name, download_root=download_root, quantize=quantize)
+    load_seconds = time.perf_counter() - started
+
+    # Untimed first pass: lazy kernel initialization shouldn't count against either profile
+    result = model.transcribe(audio, language="en", fp16=False)
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = model.transcribe(audio, language="en", fp16=False)
+        timings.append(time.perf_counter() - started)
+
+    size = parameter_bytes(model)
+    del model
+    gc.collect()
+    return {"load_seconds": load_seconds, "seconds": statistics.median(timings), "text": result["text"].strip(),
+            "model_bytes": size}
+
+
+if __name__ == "__main__":
+    import whisper
+
+    parser = argparse.ArgumentParser(description="Real-time factor and word error drift of int8 vs fp32 on CPU")
+    parser.add_argument("--audio", default=os.path.join(DATA_DIR, "harvard.wav"))
+    parser.add_argument("--reference", default=os.path.join(DATA_DIR, "harvard.txt"),
+                        help="Reference transcript for absolute WER")
+    parser.add_argument("--models", nargs="+", default=["turbo"])
+    parser.add_argument("--threads", type=int, nargs="+", default=[cpu_profile.INTRA_OP_THREADS or os.cpu_count()],
+                        help="Intra-op thread counts to try")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per configuration (median is reported)")
+    parser.add_argument("--download-root", default=None)
+    parser.add_argument("--json", dest="json_path", default=None, help="Also write the results here")
+    args = parser.parse_args()
+
+    audio = whisper.load_audio(args.audio)
+    audio_seconds = len(audio) / SAMPLE_RATE
+    reference = None
+    if args.reference and os.path.exists(args.reference):
+        with open(args.reference) as f:
+            reference = f.read()
+
+    # Inter-op threads can only be set once per process
+    cpu_profile.configure_threads(args.threads[0], cpu_profile.INTER_OP_THREADS)
+    print(f"Audio: {args.audio} ({audio_seconds:.1f}s)")
+
+    results = []
+    for model_name in args.models:
+        for threads in args.threads:
+            cpu_profile.configure_threads(threads, 0)
+            baseline = None
+            for quantize in (cpu_profile.QUANTIZE_NONE, cpu_profile.QUANTIZE_INT8):
+                run_result = run(model_name, quantize, audio, args.repeat, args.download_root)
+                row = {
+                    "model": model_name,
+                    "quantize": quantize,
+                    "threads": threads,
+                    "load_seconds": run_result["load_seconds"],
+                    "seconds": run_result["seconds"],
+                    "rtf": run_result["seconds"] / audio_seconds,
+                    "model_mb": run_result["model_bytes"] / 1e6,
+                    "wer": word_error_rate(reference, run_result["text"]) if reference is not None else None,
+                    "wer_drift": 0.0 if baseline is None else word_error_rate(baseline["text"], run_result["text"]),
+                    "speedup": 1.0 if baseline is None else baseline["seconds"] / run_result["seconds"],
+                    "text": run_result["text"],
+                }
+                if baseline is None:
+                    baseline = run_result
+                results.append(row)
+                wer = f"{row['wer']:.2%}" if row["wer"] is not None else "n/a"
+                print(f"{model_name:>10} {quantize:>4} threads={threads:<3} load {row['load_seconds']:5.1f}s  "
+                      f"transcribe {row['seconds']:6.2f}s  RTF {row['rtf']:.3f}  x{row['speedup']:.2f}  "
+                      f"{row['model_mb']:7.1f} MB  WER {wer}  drift vs fp32 {row['wer_drift']:.2%}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"audio": args.audio, "audio_seconds": audio_seconds, "results": results}, f, indent=2)
+        print(f"Wrote {args.json_path}")
@@ -0,0 +1,125 @@
+"""
+Content-addressed, on-disk transcript cache.
+
+Keys are the SHA-256 of the decoded audio samples plus the model name and
+decode options, so re-submitting the same narration (even re-encoded to a
+different container) skips the model entirely. Entries are small JSON
+files; the cache is bounded by total bytes and evicts least recently used
+entries first. File mtimes double as access times, so LRU order survives
+restarts.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger("whisper-service")
+
+
+def cache_key(audio, model_name, options=None):
+    """Hash decoded audio samples together with the model name and decode options"""
+    h = hashlib.sha256()
+    h.update(audio.tobytes())
+    h.update(b"\0")
+    h.update(model_name.encode("utf-8"))
+    h.update(b"\0")
+    h.update(json.dumps(options or {}, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()
+
+
+class TranscriptCache:
+    """
+    Args:
+        directory: Where entries are stored (<directory>/<key[:2]>/<key>.json)
+        max_bytes: Total size above which least recently used entries are evicted
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size, oldest access first
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _load_index(self):
+        found = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                st = os.stat(os.path.join(root, name))
+                found.append((st.st_mtime, name[:-5], st.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._bytes += size
+        logger.info("Transcript cache: %d entries, %.1f MB in %s",
+                    len(self._entries), self._bytes / (1024 * 1024), self.directory)
+
+    def get(self, key):
+        """Return the cached result dict, or None"""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                result = json.load(f)
+            now = time.time()
+            os.utime(path, (now, now))
+            return result
+        except (OSError, ValueError):
+            # Entry vanished or is corrupt; forget it and treat as a miss
+            with self._lock:
+                self._bytes -= self._entries.pop(key, 0)
+                self.hits -= 1
+                self.misses += 1
+            return None
+
+    def put(self, key, result):
+        """Store a result ({text, segments, ...}) and evict down to max_bytes"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps(result, ensure_ascii=False).encode("utf-8")
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        evicted = []
+        with self._lock:
+            self._bytes -= self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, size = self._entries.popitem(last=False)
+                self._bytes -= size
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,105 @@
+"""
+CPU inference profile for the whisper service.
+
+Transcription nodes are CPU-only, where the fp32 model spends most of its
+time in the encoder and decoder linear layers. This profile:
+
+- quantizes every linear layer to int8 with torch dynamic quantization
+  (weights stored as int8, activations quantized on the fly); the model is
+  roughly 2-4x smaller in memory and matmuls run on int8 kernels,
+- pins torch's intra-op and inter-op thread pools to explicit sizes, so
+  several processes on one node (the service plus long-form workers) don't
+  each start one thread per core,
+- optionally picks a smaller model for long clips, so latency on long audio
+  stays bounded (WHISPER_MODEL_BY_LENGTH="120:small,600:base" transcribes
+  clips of 120 s or more with small and 600 s or more with base).
+
+benchmark_cpu.py measures real-time factor and word error drift of the
+quantized model against fp32.
+"""
+
+import logging
+import os
+
+logger = logging.getLogger("whisper-service")
+
+QUANTIZE_NONE = "none"
+QUANTIZE_INT8 = "int8"
+QUANTIZE = os.environ.get("WHISPER_QUANTIZE", QUANTIZE_NONE)
+INTRA_OP_THREADS = int(os.environ.get("WHISPER_INTRA_OP_THREADS", 0))  # 0 keeps torch's default
+INTER_OP_THREADS = int(os.environ.get("WHISPER_INTER_OP_THREADS", 0))
+MODEL_BY_LENGTH = os.environ.get("WHISPER_MODEL_BY_LENGTH", "")
+
+
+def configure_threads(intra_op=INTRA_OP_THREADS, inter_op=INTER_OP_THREADS):
+    """
+    Size torch's thread pools for this process; call before the first inference.
+
+    Args:
+        intra_op: Threads used inside one op (matmul, conv); 0 leaves the default
+        inter_op: Threads running independent ops concurrently; 0 leaves the default
+    """
+    import torch
+    if intra_op:
+        torch.set_num_threads(intra_op)
+    if inter_op:
+        try:
+            torch.set_num_interop_threads(inter_op)
+        except RuntimeError as e:
+            # Only settable once, before any inter-op parallel work has started
+            logger.warning("Could not set inter-op threads to %d: %s", inter_op, e)
+    return torch.get_num_threads(), torch.get_num_interop_threads()
+
+
+def quantize_model(model):
+    """Quantize a whisper model's linear layers to int8 in place (CPU only)"""
+    import torch
+    import whisper.model
+
+    # whisper's Linear subclass only overrides forward() to cast weights to the
+    # input dtype; quantize_dynamic matches exact module types, so present those
+    # layers as plain nn.Linear (same parameters) before converting them
+    for module in model.modules():
+        if type(module) is whisper.model.Linear:
+            module.__class__ = torch.nn.Linear
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def load_model(model_name, download_root=None, quantize=QUANTIZE):
+    """
+    Load a whisper model, int8-quantized when quantize is "int8".
+
+    Quantized models run on the CPU regardless of available GPUs.
+    """
+    import whisper
+    if quantize == QUANTIZE_INT8:
+        model = whisper.load_model(model_name, device="cpu", download_root=download_root)
+        return quantize_model(model)
+    if quantize != QUANTIZE_NONE:
+        raise ValueError(f"Unknown quantization {quantize!r}; use {QUANTIZE_NONE!r} or {QUANTIZE_INT8!r}")
+    return whisper.load_model(model_name, download_root=download_root)
+
+
+def profile_name(model_name, quantize=QUANTIZE):
+    """Model identity for cache keys: quantized output must not be served for fp32 and vice versa"""
+    return model_name if quantize == QUANTIZE_NONE else f"{model_name}-{quantize}"
+
+
+def parse_length_tiers(spec=MODEL_BY_LENGTH):
+    """Parse "120:small,600:base" into [(120.0, "small"), (600.0, "base")]"""
+    tiers = []
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        seconds, _, model_name = part.partition(":")
+        if not model_name:
+            raise ValueError(f"Bad WHISPER_MODEL_BY_LENGTH entry {part!r}; expected SECONDS:MODEL")
+        tiers.append((float(seconds), model_name.strip()))
+    return sorted(tiers)
+
+
+def model_for_length(audio_seconds, default_model, tiers):
+    """The model of the longest tier the clip reaches, else default_model"""
+    chosen = default_model
+    for min_seconds, model_name in tiers:
+        if audio_seconds >= min_seconds:
+            chosen = model_name
+    return chosen
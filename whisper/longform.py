@@ -0,0 +1,196 @@
+"""
+Chunked, parallel transcription for long voice-over tracks.
+
+The audio is cut at silences found by a simple energy VAD into chunks of
+roughly chunk_seconds, the chunks are transcribed in a process pool (each
+worker loads its own model), and the segments are shifted by their chunk's
+start time and concatenated.
+
+Tolerance vs. a single model.transcribe pass: because cuts land in
+silence, no word is split. Segment timestamps agree with single-pass output
+to within about 0.5 s (Whisper's own timestamp jitter plus the 30 ms VAD
+frame), and the transcript differs by at most a few words around each cut,
+where the previous-text conditioning is reset. word_error_rate() can be used
+to measure the drift on a given file.
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import cpu_profile
+
+SAMPLE_RATE = 16000  # whisper.load_audio output rate
+
+DEFAULT_CHUNK_SECONDS = 60.0
+# How far either side of the target cut point to look for a silence
+DEFAULT_SEARCH_SECONDS = 10.0
+VAD_FRAME_MS = 30
+TIMESTAMP_TOLERANCE_SECONDS = 0.5
+
+
+def frame_energies(audio, frame_ms=VAD_FRAME_MS, sample_rate=SAMPLE_RATE):
+    """RMS energy (dB) of consecutive non-overlapping frames"""
+    frame_len = int(sample_rate * frame_ms / 1000)
+    n_frames = len(audio) // frame_len
+    if n_frames == 0:
+        return np.zeros(0, dtype=np.float32), frame_len
+    frames = audio[:n_frames * frame_len].reshape(n_frames, frame_len)
+    rms = np.sqrt(np.mean(frames.astype(np.float64) ** 2, axis=1))
+    return 20 * np.log10(rms + 1e-10), frame_len
+
+
+def split_on_silence(audio, chunk_seconds=DEFAULT_CHUNK_SECONDS, search_seconds=DEFAULT_SEARCH_SECONDS,
+                     sample_rate=SAMPLE_RATE):
+    """
+    Pick cut points near every chunk_seconds at the quietest VAD frame.
+
+    Returns:
+        List of (start_sample, end_sample) covering the whole clip
+    """
+    total = len(audio)
+    chunk_samples = int(chunk_seconds * sample_rate)
+    if total <= chunk_samples:
+        return [(0, total)]
+
+    energies, frame_len = frame_energies(audio, sample_rate=sample_rate)
+    search_frames = max(1, int(search_seconds * sample_rate / frame_len))
+
+    chunks = []
+    start = 0
+    while total - start > chunk_samples:
+        target = (start + chunk_samples) // frame_len
+        lo = max(start // frame_len + 1, target - search_frames)
+        hi = min(len(energies), target + search_frames + 1)
+        if lo >= hi:
+            cut = start + chunk_samples
+        else:
+            # Quietest frame in the window; its midpoint is the cut
+            quietest = lo + int(np.argmin(energies[lo:hi]))
+            cut = quietest * frame_len + frame_len // 2
+        chunks.append((start, cut))
+        start = cut
+    chunks.append((start, total))
+    return chunks
+
+
+# Per-process model, loaded once by _init_worker
+_worker_model = None
+
+
+def _init_worker(model_name, download_root, threads, quantize, inter_op_threads):
+    global _worker_model
+    cpu_profile.configure_threads(threads, inter_op_threads)
+    _worker_model = cpu_profile.load_model(model_name, download_root=download_root, quantize=quantize)
+
+
+def _transcribe_chunk(args):
+    start_sample, audio, options = args
+    result = _worker_model.transcribe(audio, **options)
+    offset = start_sample / SAMPLE_RATE
+    return [
+        {"start": s["start"] + offset, "end": s["end"] + offset, "text": s["text"]}
+        for s in result.get("segments", [])
+    ], result.get("language")
+
+
+def merge_segments(chunk_results):
+    """Concatenate per-chunk segments (already offset) into one transcribe-style result"""
+    segments = []
+    language = None
+    for chunk_segments, chunk_language in chunk_results:
+        language = language or chunk_language
+        for s in chunk_segments:
+            segments.append({"id": len(segments), "start": s["start"], "end": s["end"], "text": s["text"]})
+    return {
+        "text": "".join(s["text"] for s in segments),
+        "segments": segments,
+        "language": language,
+    }
+
+
+class LongFormTranscriber:
+    """
+    Process pool of whisper models for chunked transcription.
+
+    Args:
+        model_name: whisper model to load in every worker
+        workers: Number of worker processes (each holds a full model)
+        chunk_seconds: Target chunk length
+        download_root: Model cache directory
+        threads_per_worker: torch intra-op threads per worker (default: CPUs / workers)
+        quantize: "int8" to quantize each worker's model (see cpu_profile)
+        inter_op_threads: torch inter-op threads per worker (0 keeps torch's default)
+    """
+
+    def __init__(self, model_name, workers=2, chunk_seconds=DEFAULT_CHUNK_SECONDS, download_root=None,
+                 threads_per_worker=None, quantize=cpu_profile.QUANTIZE_NONE, inter_op_threads=0):
+        self.chunk_seconds = chunk_seconds
+        if threads_per_worker is None:
+            threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+        self._pool = ProcessPoolExecutor(
+            max_workers=workers,
+            # spawn, not fork: the service process already runs torch and scheduler threads
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_name, download_root, threads_per_worker, quantize, inter_op_threads),
+        )
+
+    def transcribe(self, audio, **options):
+        """Transcribe a 16 kHz mono float32 clip; returns a model.transcribe-style dict"""
+        chunks = split_on_silence(audio, self.chunk_seconds)
+        jobs = [(start, audio[start:end], options) for start, end in chunks]
+        return merge_segments(self._pool.map(_transcribe_chunk, jobs))
+
+    def shutdown(self):
+        self._pool.shutdown()
+
+
+def word_error_rate(reference, hypothesis):
+    """Word-level edit distance divided by the reference length (case and punctuation insensitive)"""
+    import string
+    table = str.maketrans('', '', string.punctuation)
+    ref = reference.lower().translate(table).split()
+    hyp = hypothesis.lower().translate(table).split()
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    previous = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (r != h))
+        previous = current
+    return previous[-1] / len(ref)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    import whisper
+
+    parser = argparse.ArgumentParser(description="Compare chunked long-form transcription against a single pass")
+    parser.add_argument("audio_path")
+    parser.add_argument("--model", default="turbo")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--chunk-seconds", type=float, default=DEFAULT_CHUNK_SECONDS)
+    args = parser.parse_args()
+
+    audio = whisper.load_audio(args.audio_path)
+    transcriber = LongFormTranscriber(args.model, workers=args.workers, chunk_seconds=args.chunk_seconds)
+    start = time.perf_counter()
+    merged = transcriber.transcribe(audio)
+    chunked_time = time.perf_counter() - start
+    transcriber.shutdown()
+
+    start = time.perf_counter()
+    single = whisper.load_model(args.model).transcribe(audio)
+    single_time = time.perf_counter() - start
+
+    wer = word_error_rate(single["text"], merged["text"])
+    end_drift = abs(single["segments"][-1]["end"] - merged["segments"][-1]["end"]) if single["segments"] and merged["segments"] else 0.0
+    print(f"Chunks: {len(split_on_silence(audio, args.chunk_seconds))}")
+    print(f"Single pass: {single_time:.1f}s, chunked: {chunked_time:.1f}s")
+    print(f"Word error rate vs single pass: {wer:.3%}")
+    print(f"Last segment end drift: {end_drift:.2f}s (tolerance {TIMESTAMP_TOLERANCE_SECONDS}s)")
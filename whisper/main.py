@@ -1,39 +1,275 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel
 import whisper
+import asyncio
+import numpy as np
 import os
 import logging
 import sys
+import threading
+import time
+
+import cpu_profile
+from cache import TranscriptCache, cache_key
+from longform import LongFormTranscriber, SAMPLE_RATE
+from scheduler import ModelUnavailableError, TranscriptionScheduler
+
+# metrics.py is copied next to main.py in the image and lives in ../shared locally
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shared"))
+import metrics
+
+logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+logger = logging.getLogger("whisper-service")
 
 # Path to the cache where the model is stored
 cache_path = "/root/.cache"
 
-# Load the model from that cache
-model = whisper.load_model("turbo", download_root=cache_path)
+MODEL_NAME = "turbo"
+# Decode options passed to the model; part of the transcript cache key
+DECODE_OPTIONS = {}
+
+# CPU profile: int8 dynamic quantization (WHISPER_QUANTIZE=int8), explicit torch thread
+# pools and smaller models for long clips (WHISPER_MODEL_BY_LENGTH); see cpu_profile.py
+QUANTIZE = cpu_profile.QUANTIZE
+MODEL_TIERS = cpu_profile.parse_length_tiers()
+INTRA_OP_THREADS, INTER_OP_THREADS = cpu_profile.configure_threads()
+
+# One throwaway decode before reporting ready, so the first request doesn't pay first-call costs
+WARMUP = os.environ.get("WHISPER_WARMUP", "1") not in ("0", "false", "no")
+WARMUP_SECONDS = float(os.environ.get("WHISPER_WARMUP_SECONDS", 1))
+
+# Micro-batching: up to BATCH_SIZE concurrent requests share one encoder/decoder pass.
+# The model is loaded in the background (see lifespan); requests queue in the scheduler until then
+BATCH_SIZE = int(os.environ.get("WHISPER_BATCH_SIZE", 8))
+BATCH_WAIT_MS = float(os.environ.get("WHISPER_BATCH_WAIT_MS", 50))
+scheduler = TranscriptionScheduler(max_batch_size=BATCH_SIZE, max_wait_ms=BATCH_WAIT_MS)
+
+MODEL_LOADING = "loading"
+MODEL_WARMING_UP = "warming_up"
+MODEL_READY = "ready"
+MODEL_FAILED = "failed"
+model_state = {"status": MODEL_LOADING, "error": None, "load_seconds": None, "warmup_seconds": None}
+
+# Finished transcripts keyed by audio content + model + options
+TRANSCRIPT_CACHE_DIR = os.environ.get("TRANSCRIPT_CACHE_DIR", os.path.join(cache_path, "transcripts"))
+TRANSCRIPT_CACHE_MAX_BYTES = int(os.environ.get("TRANSCRIPT_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+transcript_cache = TranscriptCache(TRANSCRIPT_CACHE_DIR, TRANSCRIPT_CACHE_MAX_BYTES)
+
+# Clips at least this long are cut at silences and transcribed across a process pool
+LONGFORM_MIN_SECONDS = float(os.environ.get("LONGFORM_MIN_SECONDS", 300))
+LONGFORM_WORKERS = int(os.environ.get("LONGFORM_WORKERS", 2))  # 0 disables long-form mode
+LONGFORM_CHUNK_SECONDS = float(os.environ.get("LONGFORM_CHUNK_SECONDS", 60))
+# Each worker loads its own model, so a pool is only started on first use (one per model)
+longform = {}
+
+# Schedulers of the MODEL_TIERS models, created and loaded on first use
+tier_schedulers = {}
+tier_states = {}
+tier_lock = threading.Lock()
+longform_lock = threading.Lock()
+
 
-app = FastAPI()
+def _load_model(model_name=MODEL_NAME, target=scheduler, state=model_state):
+    """Load (and optionally warm up) a model off the event loop, then start serving it"""
+    started = time.perf_counter()
+    try:
+        logger.info("Loading model %s (quantization: %s)", model_name, QUANTIZE)
+        model = cpu_profile.load_model(model_name, download_root=cache_path, quantize=QUANTIZE)
+        state["load_seconds"] = time.perf_counter() - started
+        logger.info("Model %s loaded in %.1fs", model_name, state["load_seconds"])
+        if WARMUP:
+            state["status"] = MODEL_WARMING_UP
+            warmup_started = time.perf_counter()
+            target.warm_up(model, WARMUP_SECONDS)
+            state["warmup_seconds"] = time.perf_counter() - warmup_started
+        target.set_model(model)
+        state["status"] = MODEL_READY
+        logger.info("Model %s ready after %.1fs", model_name, time.perf_counter() - started)
+    except Exception as e:
+        logger.exception("Loading model %s failed: %s", model_name, e)
+        state.update(status=MODEL_FAILED, error=str(e))
+        target.fail(e)
+
+
+def _scheduler_for(model_name):
+    """The scheduler serving model_name; a tier model starts loading on its first request"""
+    if model_name == MODEL_NAME:
+        return scheduler
+    with tier_lock:
+        tier = tier_schedulers.get(model_name)
+        if tier is None:
+            tier = tier_schedulers[model_name] = TranscriptionScheduler(max_batch_size=BATCH_SIZE,
+                                                                        max_wait_ms=BATCH_WAIT_MS)
+            state = tier_states[model_name] = {"status": MODEL_LOADING, "error": None,
+                                               "load_seconds": None, "warmup_seconds": None}
+            threading.Thread(target=_load_model, args=(model_name, tier, state),
+                             name=f"model-loader-{model_name}", daemon=True).start()
+        return tier
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # uvicorn binds and /health answers right away; /ready flips once the model is in
+    threading.Thread(target=_load_model, name="model-loader", daemon=True).start()
+    yield
 
 
+app = FastAPI(lifespan=lifespan)
+
+TRANSCRIBE_SECONDS = metrics.histogram("transcribe_duration_seconds",
+                                       "Time to produce a transcript by path taken", ["path"])
+AUDIO_SECONDS_TRANSCRIBED = metrics.counter("audio_seconds_transcribed_total",
+                                            "Seconds of audio run through the model (cache hits excluded)")
+TRANSCRIPT_CACHE_LOOKUPS = metrics.counter("transcript_cache_lookups_total", "Transcript cache lookups", ["result"])
+TRANSCRIBE_IN_FLIGHT = metrics.gauge("transcribe_requests_in_flight", "Transcribe requests being handled")
+metrics.gauge("model_ready", "1 once the model is loaded and warmed up", fn=lambda: int(scheduler.ready))
+metrics.gauge("scheduler_queue_depth", "Requests waiting for the model thread",
+              fn=lambda: scheduler.stats()["queue_depth"])
+
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    metrics.HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method,
+                                         endpoint=getattr(route, "path", "unmatched"),
+                                         status=response.status_code)
+    return response
+
 
 class TranscribeRequest(BaseModel):
     audio_path: str
     output_path: str
 
 
+def _load_audio(path):
+    # The backend's audio ingest already decoded the upload to 16 kHz mono float32 (.npy);
+    # read that buffer directly instead of decoding the file again with ffmpeg
+    if path.endswith(".npy"):
+        return np.load(path).astype(np.float32, copy=False)
+    return whisper.load_audio(path)
+
+
+def _write_text(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def _get_longform(model_name):
+    if model_name in longform:
+        return longform[model_name]
+    # Executor threads can race here; a second pool would leak its workers and model copies
+    with longform_lock:
+        if model_name not in longform:
+            logger.info("Starting long-form pool for %s: %d workers, %.0fs chunks",
+                        model_name, LONGFORM_WORKERS, LONGFORM_CHUNK_SECONDS)
+            longform[model_name] = LongFormTranscriber(model_name, workers=LONGFORM_WORKERS,
+                                                       chunk_seconds=LONGFORM_CHUNK_SECONDS, download_root=cache_path,
+                                                       quantize=QUANTIZE, inter_op_threads=INTER_OP_THREADS)
+        return longform[model_name]
+
+
+def _cacheable(result):
+    return {
+        "text": result.get("text", ""),
+        "language": result.get("language"),
+        "segments": [
+            {"id": s.get("id"), "start": s.get("start"), "end": s.get("end"), "text": s.get("text")}
+            for s in result.get("segments", [])
+        ],
+    }
+
+
 @app.post("/transcribe")
-def transcribe(req: TranscribeRequest):
+async def transcribe(req: TranscribeRequest):
     logger.info("Received transcribe request: %s", req.audio_path)
     if not os.path.exists(req.audio_path):
         msg = f"Audio file not found: {req.audio_path}"
         logger.error(msg)
         raise HTTPException(status_code=400, detail=msg)
     try:
-        result = model.transcribe(req.audio_path)
-        text = result.get("text", "")
-        with open(req.output_path, "w", encoding="utf-8") as f:
-            f.write(text)
-        logger.info("Transcription completed, wrote to %s", req.output_path)
-        return {"status": "ok", "text": text}
+        with TRANSCRIBE_IN_FLIGHT.track_inprogress():
+            return await _transcribe(req)
+    except ModelUnavailableError as e:
+        logger.error("%s", e)
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.exception("Transcription failed: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
+
+
+async def _transcribe(req):
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    # ffmpeg decode and file writes run in the default executor, the model on the scheduler thread
+    audio = await loop.run_in_executor(None, _load_audio, req.audio_path)
+    audio_seconds = len(audio) / SAMPLE_RATE
+
+    use_longform = LONGFORM_WORKERS > 0 and audio_seconds >= LONGFORM_MIN_SECONDS
+    # Chunked output can differ slightly from a single pass, so it gets its own cache key
+    key_options = dict(DECODE_OPTIONS, longform_chunk_seconds=LONGFORM_CHUNK_SECONDS) if use_longform else DECODE_OPTIONS
+
+    # Long clips may go to a smaller model; the cache key names the model and its quantization
+    model_name = cpu_profile.model_for_length(audio_seconds, MODEL_NAME, MODEL_TIERS)
+    model_id = cpu_profile.profile_name(model_name, QUANTIZE)
+
+    key = await loop.run_in_executor(None, cache_key, audio, model_id, key_options)
+    result = await loop.run_in_executor(None, transcript_cache.get, key)
+    cached = result is not None
+    TRANSCRIPT_CACHE_LOOKUPS.inc(result="hit" if cached else "miss")
+    if cached:
+        path = "cache"
+    else:
+        if use_longform:
+            path = "longform"
+            logger.info("Using long-form mode for %.0fs of audio (%s)", audio_seconds, model_id)
+            raw = await loop.run_in_executor(None, lambda: _get_longform(model_name).transcribe(audio, **DECODE_OPTIONS))
+        else:
+            path = "scheduler"
+            raw = await _scheduler_for(model_name).transcribe(audio, **DECODE_OPTIONS)
+        AUDIO_SECONDS_TRANSCRIBED.inc(audio_seconds)
+        result = _cacheable(raw)
+        await loop.run_in_executor(None, transcript_cache.put, key, result)
+
+    text = result.get("text", "")
+    await loop.run_in_executor(None, _write_text, req.output_path, text)
+    TRANSCRIBE_SECONDS.observe(time.perf_counter() - started, path=path)
+    logger.info("Transcription %s, wrote to %s", "served from cache" if cached else "completed", req.output_path)
+    return {"status": "ok", "text": text, "cached": cached, "model": model_id}
+
+
+@app.get("/health")
+def health():
+    """Liveness: the process is up and serving HTTP, whether or not the model is loaded yet"""
+    return {"status": "ok", "model": model_state["status"]}
+
+
+@app.get("/ready")
+def ready():
+    """Readiness: 200 once the model is loaded and warmed up, 503 while booting or after a failed load"""
+    body = {"ready": scheduler.ready, **model_state, "queued_requests": scheduler.stats()["queue_depth"]}
+    return JSONResponse(body, status_code=200 if scheduler.ready else 503)
+
+
+@app.get("/stats")
+def stats():
+    return {
+        **scheduler.stats(),
+        "model": model_state,
+        "cpu_profile": {
+            "quantize": QUANTIZE,
+            "intra_op_threads": INTRA_OP_THREADS,
+            "inter_op_threads": INTER_OP_THREADS,
+            "model_by_length": MODEL_TIERS,
+        },
+        "tier_models": {name: {**tier_states[name], **tier.stats()} for name, tier in list(tier_schedulers.items())},
+        "transcript_cache": transcript_cache.stats(),
+    }
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
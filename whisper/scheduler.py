@@ -0,0 +1,214 @@
+"""
+Micro-batching scheduler in front of the Whisper model.
+
+Requests are queued and a single model thread drains them in batches: it
+takes the first waiting request, then keeps collecting for up to
+max_wait_ms or until max_batch_size requests are in hand. Clips that fit in
+one 30s window are stacked into one mel batch and go through the encoder
+and decoder together; longer clips (and short ones whose greedy decode looks
+unreliable) fall back to model.transcribe one at a time.
+
+The scheduler can be created before the model exists: requests queue up
+while the service warms up and start draining once set_model() hands the
+loaded model over.
+"""
+
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+import torch
+import whisper
+from whisper.audio import N_SAMPLES, SAMPLE_RATE
+
+logger = logging.getLogger("whisper-service")
+
+# Same thresholds model.transcribe uses to decide a decode needs a retry
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+
+
+class ModelUnavailableError(Exception):
+    """The model failed to load, so queued and new requests cannot be served"""
+
+
+class _Job:
+    __slots__ = ("audio", "options", "future", "enqueued_at")
+
+    def __init__(self, audio, options):
+        self.audio = audio
+        self.options = options
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class TranscriptionScheduler:
+    """
+    Queue + batching model worker.
+
+    Args:
+        model: Loaded whisper model (only ever used from the worker thread), or
+               None to queue requests until set_model() is called
+        max_batch_size: Most requests decoded in one batch
+        max_wait_ms: How long to wait for more requests after the first one arrives
+    """
+
+    def __init__(self, model=None, max_batch_size=8, max_wait_ms=50):
+        self.model = model
+        self._model_ready = threading.Event()
+        self._load_error = None
+        if model is not None:
+            self._model_ready.set()
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._requests = 0
+        self._batches = 0
+        self._batched_requests = 0
+        self._fallbacks = 0
+        self._max_batch_seen = 0
+        self._batch_sizes = {}
+        self._queue_wait_total = 0.0
+        self._thread = threading.Thread(target=self._run, name="whisper-scheduler", daemon=True)
+        self._thread.start()
+
+    @property
+    def ready(self):
+        """True once a model is loaded and requests are being served"""
+        return self._model_ready.is_set() and self._load_error is None
+
+    def set_model(self, model):
+        """Hand over the loaded model; requests queued during warm-up start draining"""
+        self.model = model
+        self._model_ready.set()
+
+    def fail(self, error):
+        """The model could not be loaded: fail queued and future requests"""
+        self._load_error = error
+        self._model_ready.set()
+
+    def warm_up(self, model, seconds=1.0):
+        """
+        Run one throwaway batch decode before set_model().
+
+        The first pass through the encoder and decoder pays one-time costs
+        (kernel selection, allocator growth, lazy initialisation); paying them
+        here keeps them off the first real request. Runs on the caller's
+        thread, which is safe because the worker doesn't touch the model
+        until set_model().
+        """
+        self.model = model
+        started = time.perf_counter()
+        self._decode_batch([_Job(np.zeros(int(SAMPLE_RATE * seconds), dtype=np.float32), {})])
+        logger.info("Warm-up decode took %.2fs", time.perf_counter() - started)
+
+    async def transcribe(self, audio, **options):
+        """Queue a decoded 16 kHz mono float32 clip and await its result dict"""
+        if self._load_error is not None:
+            raise ModelUnavailableError(f"Model failed to load: {self._load_error}")
+        job = _Job(audio, options)
+        self._queue.put(job)
+        with self._stats_lock:
+            self._requests += 1
+        return await asyncio.wrap_future(job.future)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "requests": self._requests,
+                "batches": self._batches,
+                "batched_requests": self._batched_requests,
+                "fallback_requests": self._fallbacks,
+                "avg_batch_size": self._batched_requests / self._batches if self._batches else 0.0,
+                "max_batch_size_seen": self._max_batch_seen,
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+                "avg_queue_wait_ms": (self._queue_wait_total / self._requests * 1000) if self._requests else 0.0,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+            }
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        # Requests queue up until the model is loaded
+        self._model_ready.wait()
+        while True:
+            batch = self._collect_batch()
+            if self._load_error is not None:
+                for job in batch:
+                    job.future.set_exception(ModelUnavailableError(f"Model failed to load: {self._load_error}"))
+                continue
+            now = time.perf_counter()
+            with self._stats_lock:
+                self._queue_wait_total += sum(now - job.enqueued_at for job in batch)
+            try:
+                self._process(batch)
+            except Exception as e:
+                logger.exception("Batch of %d failed: %s", len(batch), e)
+                for job in batch:
+                    if not job.future.done():
+                        job.future.set_exception(e)
+
+    def _process(self, batch):
+        # Only clips with default options fit one window and can share a decode
+        short = [job for job in batch if len(job.audio) <= N_SAMPLES and not job.options]
+        long = [job for job in batch if job not in short]
+
+        if short:
+            with self._stats_lock:
+                self._batches += 1
+                self._batched_requests += len(short)
+                self._max_batch_seen = max(self._max_batch_seen, len(short))
+                self._batch_sizes[len(short)] = self._batch_sizes.get(len(short), 0) + 1
+            long.extend(self._decode_batch(short))
+
+        for job in long:
+            with self._stats_lock:
+                self._fallbacks += 1
+            try:
+                job.future.set_result(self.model.transcribe(job.audio, **job.options))
+            except Exception as e:
+                job.future.set_exception(e)
+
+    def _decode_batch(self, jobs):
+        """Encode+decode jobs as one mel batch; return jobs that need a full transcribe"""
+        n_mels = self.model.dims.n_mels
+        mel = torch.stack([
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(job.audio), n_mels=n_mels)
+            for job in jobs
+        ]).to(self.model.device)
+        options = whisper.DecodingOptions(fp16=self.model.device.type == "cuda")
+        results = whisper.decode(self.model, mel, options)
+
+        retry = []
+        for job, result in zip(jobs, results):
+            if (result.compression_ratio > COMPRESSION_RATIO_THRESHOLD
+                    or result.avg_logprob < LOGPROB_THRESHOLD):
+                # transcribe() would retry with temperature fallback; let it
+                retry.append(job)
+                continue
+            text = result.text.strip()
+            duration = len(job.audio) / SAMPLE_RATE
+            job.future.set_result({
+                "text": text,
+                "language": result.language,
+                "segments": [{"id": 0, "start": 0.0, "end": duration, "text": text}],
+            })
+        return retry
@@ -1,17 +1,32 @@
 import whisper
 import string
+import sys
 
-with open("audiofilename.txt", "r") as file:
-    filename = file.read()
 
-input_file = "../audiofiles/" + filename + ".mp3"
+def main():
+    with open("audiofilename.txt", "r") as file:
+        filename = file.read()
 
-model = whisper.load_model("turbo")
-result = model.transcribe(input_file)
+    input_file = "../audiofiles/" + filename + ".mp3"
 
-result = result['text'].lower()
-result = result.translate(str.maketrans('', '', string.punctuation)).strip()
+    if "--long" in sys.argv:
+        # Long voice-over tracks: cut at silences and transcribe chunks in parallel
+        from longform import LongFormTranscriber
+        transcriber = LongFormTranscriber("turbo", workers=2)
+        result = transcriber.transcribe(whisper.load_audio(input_file))
+        transcriber.shutdown()
+    else:
+        model = whisper.load_model("turbo")
+        result = model.transcribe(input_file)
 
+    result = result['text'].lower()
+    result = result.translate(str.maketrans('', '', string.punctuation)).strip()
 
-with open("../aligner/data" + filename + ".txt", "w") as file:
-    file.write(result)
\ No newline at end of file
+
+    with open("../aligner/data" + filename + ".txt", "w") as file:
+        file.write(result)
+
+
+# The --long pool spawns workers that re-import this file, so nothing may run on import
+if __name__ == "__main__":
+    main()